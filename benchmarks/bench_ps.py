@@ -0,0 +1,281 @@
+"""
+Бенчмарк /delta и ежедневного обновления PS на локальной заглушке omeda.city.
+
+Для каждого размера команды в отдельном чате создаются игроки, после чего
+измеряются сценарии:
+    delta_cold: ps_data_manager.players_ps_delta со сброшенными кэшами
+    delta_warm: players_ps_delta из готового отчёта (report_cache)
+    daily: ps_data_manager.player_ps_day_db_update по игрокам чата
+
+Для каждого сценария считаются пропускная способность (игроков/сек. и
+запросов к API/сек.), p50/p95/p99 задержки и пиковая память (tracemalloc,
+отдельным прогоном, чтобы не искажать задержки). Результаты сохраняются в
+benchmarks/results/ и могут сравниваться с прошлым прогоном (--compare).
+
+Запуск:
+    python -m benchmarks.bench_ps --sizes 1,10,100,1000 --latency 0.02
+    python -m benchmarks.bench_ps --compare benchmarks/results/<файл>.json
+
+Ответы API можно записать (--record) и воспроизводить без заглушки
+(--replay, задержка ответов из записи с множителем --replay-latency-scale).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_SIZES = "1,10,100,1000,10000"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк /delta и daily update")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+        help="Размеры команд через запятую")
+    parser.add_argument("--iterations", type=int, default=5,
+        help="Повторов каждого сценария")
+    parser.add_argument("--scenarios", default="delta_cold,delta_warm,daily")
+    parser.add_argument("--latency", type=float, default=0.01,
+        help="Задержка заглушки (сек.)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--payload-kb", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=50,
+        help="OMEDA_MAX_CONCURRENCY для прогона")
+    parser.add_argument("--rate", type=float, default=0,
+        help="OMEDA_RATE_LIMIT для прогона (0 - без ограничения)")
+    parser.add_argument("--record", default=None,
+        help="Записать ответы API в cassette-архив")
+    parser.add_argument("--replay", default=None,
+        help="Воспроизводить ответы API из cassette-архива")
+    parser.add_argument("--replay-latency-scale", type=float, default=1.0,
+        help="Множитель записанного времени ответа при --replay")
+    parser.add_argument("--output", default=None,
+        help="Файл результатов (по умолчанию benchmarks/results/<время>-<коммит>.json)")
+    parser.add_argument("--compare", default=None,
+        help="Файл результатов прошлого прогона для сравнения")
+    return parser.parse_args(argv)
+
+
+def configure_env(args: argparse.Namespace, db_path: Path) -> None:
+    """
+    Настройки модулей utils читаются при импорте, поэтому задаются до него
+    """
+    os.environ["PS_DATA_DB_URL"] = f"sqlite:///{db_path}"
+    os.environ["OMEDA_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["OMEDA_POOL_LIMIT_PER_HOST"] = str(args.concurrency)
+    os.environ["OMEDA_RATE_LIMIT"] = str(args.rate)
+
+    if args.record or args.replay:
+        os.environ["OMEDA_CASSETTE_MODE"] = "record" if args.record else "replay"
+        os.environ["OMEDA_CASSETTE_PATH"] = args.record or args.replay
+        os.environ["OMEDA_CASSETTE_LATENCY_SCALE"] = str(args.replay_latency_scale)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies: list[float], size: int, requests: int, peak: int) -> dict:
+    total = sum(latencies)
+    return {
+        'iterations': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'players_per_sec': round(size * len(latencies) / total, 1) if total else None,
+        'api_requests_per_sec': round(requests / total, 1) if total else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+async def seed_players(uc, chat_id: int, size: int) -> None:
+    """
+    Создаёт size игроков в чате одной транзакцией
+    """
+    from utils.users_manager import ChatMembershipModel, PlayerModel
+
+    def _seed():
+        with uc.Session() as session:
+            players = [
+                PlayerModel(omeda_id=f"c{chat_id}-p{i}", player_ps_day=100.0)
+                for i in range(size)
+            ]
+            session.add_all(players)
+            session.flush()
+            session.add_all([
+                ChatMembershipModel(chat_id=chat_id, player_id=player.id, name=f"p{i}")
+                for i, player in enumerate(players)
+            ])
+            session.commit()
+
+    await uc._run(_seed)
+
+
+async def measure(scenario, size: int, iterations: int, stub_config, prepare) -> dict:
+    """
+    Прогоняет сценарий iterations раз, затем ещё раз под tracemalloc
+    """
+    latencies = []
+    requests_before = stub_config.requests
+
+    for _ in range(iterations):
+        await prepare()
+        started = time.perf_counter()
+        await scenario()
+        latencies.append(time.perf_counter() - started)
+
+    requests = stub_config.requests - requests_before
+
+    await prepare()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await scenario()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return summarize(latencies, size, requests, peak)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from benchmarks.stub_omeda import StubConfig, start_stub
+    import utils.ps_data_manager as pdm
+    import utils.ps_parser as ps_parser
+    from utils.ps_http_client import http_client
+
+    stub_config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        payload_kb=args.payload_kb,
+    )
+    runner, base_url = await start_stub(stub_config)
+    ps_parser.BASE_OMEDA_ADRESS = base_url
+    await http_client.start()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    scenarios = args.scenarios.split(",")
+    results = {}
+
+    try:
+        for size in sizes:
+            chat_id = size
+            await seed_players(pdm.uc, chat_id, size)
+            results[str(size)] = {}
+
+            async def clear_caches():
+                pdm.report_cache.clear()
+                ps_parser.response_cache.clear()
+
+            async def warm_report():
+                if pdm.report_cache.get(chat_id) is None:
+                    await pdm.players_ps_delta(chat_id)
+
+            async def delta():
+                await pdm.players_ps_delta(chat_id)
+
+            async def daily():
+                players = {
+                    player['omeda_id']: player
+                    for player in (await pdm.uc.get_users_and_omeda_id(chat_id)).values()
+                }
+                await pdm.player_ps_day_db_update(players)
+
+            plan = {
+                'delta_cold': (delta, clear_caches),
+                'delta_warm': (delta, warm_report),
+                'daily': (daily, clear_caches),
+            }
+
+            for name in scenarios:
+                scenario, prepare = plan[name]
+                summary = await measure(
+                    scenario, size, args.iterations, stub_config, prepare)
+                results[str(size)][name] = summary
+                print(f"size={size:<6} {name:<11} "
+                      f"p50={summary['p50_ms']:>10.2f}ms "
+                      f"p95={summary['p95_ms']:>10.2f}ms "
+                      f"p99={summary['p99_ms']:>10.2f}ms "
+                      f"players/s={summary['players_per_sec']} "
+                      f"peak={summary['peak_memory_kb']}KB")
+    finally:
+        await http_client.close()
+        await pdm.uc.close()
+        await runner.cleanup()
+        if ps_parser.cassette is not None:
+            ps_parser.cassette.close()
+
+    return results
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """
+    Печатает изменение p50/p95 и пропускной способности относительно baseline
+    """
+    print(f"\nСравнение с {baseline['commit']} ({baseline['timestamp']}):")
+    for size, scenarios in current['results'].items():
+        for name, summary in scenarios.items():
+            old = baseline['results'].get(size, {}).get(name)
+            if not old:
+                continue
+
+            diffs = []
+            for metric in ('p50_ms', 'p95_ms', 'players_per_sec', 'peak_memory_kb'):
+                if old.get(metric) and summary.get(metric) is not None:
+                    change = (summary[metric] - old[metric]) / old[metric] * 100
+                    diffs.append(f"{metric} {change:+.1f}%")
+            print(f"size={size:<6} {name:<11} " + ", ".join(diffs))
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_env(args, Path(tmp_dir) / "bench_ps_data.db")
+        results = asyncio.run(run(args))
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'params': vars(args),
+        'results': results,
+    }
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nРезультаты сохранены: {output}")
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Бенчмарк запуска бота: время импорта main и время до первого апдейта.
+
+Каждый замер - отдельный процесс Python (холодный импорт):
+    import: время `import main`, и создал ли импорт файлы БД (импорт не
+    должен трогать диск)
+    first_update: от старта процесса до ответа на первый апдейт (/top):
+    импорт, фаза запуска main.startup() и обработка апдейта диспетчером.
+    Запросы к Telegram уходят в локальную заглушку сессии бота
+
+Результаты сохраняются в benchmarks/results/. С --max-import-ms и
+--max-first-update-ms бенчмарк завершается с кодом 1, если p50 превышает
+бюджет (проверка регрессий в CI).
+
+Запуск:
+    python -m benchmarks.bench_startup --iterations 5
+    python -m benchmarks.bench_startup --max-import-ms 1500 --max-first-update-ms 2500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+from benchmarks.bench_ps import RESULTS_DIR, git_commit, percentile
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Код замера в дочернем процессе: печатает JSON с результатом
+IMPORT_PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'import_s': elapsed,
+    'db_files': sorted(name for name in os.listdir('.') if '.db' in name),
+}))
+"""
+
+FIRST_UPDATE_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import asyncio
+import main
+imported = time.perf_counter()
+
+from datetime import datetime
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+
+
+class StubSession(BaseSession):
+    # Ответы Telegram API без сети: отправленное сообщение или True
+    def __init__(self):
+        super().__init__()
+        self.answered = asyncio.Event()
+
+    async def make_request(self, bot, method, timeout=None):
+        self.answered.set()
+        if getattr(method, '__returning__', None) is types.Message:
+            return types.Message(
+                message_id=1, date=datetime.now(),
+                chat=types.Chat(id=method.chat_id, type='private'),
+                text=getattr(method, 'text', None))
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+async def run():
+    main.bot.session = StubSession()
+    await main.startup()
+    ready = time.perf_counter()
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': int(time.time()), 'text': '/top',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'bench'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 4}],
+        },
+    }
+    await main.dp.feed_raw_update(main.bot, update)
+    await asyncio.wait_for(main.bot.session.answered.wait(), 10)
+    answered = time.perf_counter()
+
+    await main.http_client.close()
+    await main.pdm.uc.close()
+    await main.dp.storage.close()
+    return ready, answered
+
+ready, answered = asyncio.run(run())
+print(json.dumps({
+    'import_s': imported - started,
+    'startup_s': ready - imported,
+    'first_update_s': answered - started,
+}))
+"""
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска бота")
+    parser.add_argument("--iterations", type=int, default=5,
+        help="Процессов на каждый сценарий")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+        help="Бюджет p50 импорта main (мс)")
+    parser.add_argument("--max-first-update-ms", type=float, default=None,
+        help="Бюджет p50 времени до первого апдейта (мс)")
+    parser.add_argument("--output", default=None,
+        help="Файл результатов (по умолчанию benchmarks/results/startup-<время>-<коммит>.json)")
+    return parser.parse_args(argv)
+
+
+def run_probe(code: str) -> dict:
+    """
+    Выполняет замер в новом процессе с пустыми БД во временном каталоге
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ)
+        env.update({
+            'TELEGRAM_BOT_TOKEN': env.get('TELEGRAM_BOT_TOKEN', '1:bench'),
+            'PS_DATA_DB_URL': f"sqlite:///{Path(tmp_dir) / 'ps_data.db'}",
+            'FSM_DB_URL': f"sqlite:///{Path(tmp_dir) / 'fsm_state.db'}",
+            'PYTHONPATH': str(ROOT),
+            'METRICS_PORT': '0',
+            'LOGGING_MODE': 'ERROR',
+        })
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=tmp_dir, env=env, capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        'p50_ms': round(percentile(values, 50) * 1000, 1),
+        'max_ms': round(max(values) * 1000, 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+
+    imports = [run_probe(IMPORT_PROBE) for _ in range(args.iterations)]
+    updates = [run_probe(FIRST_UPDATE_PROBE) for _ in range(args.iterations)]
+
+    results = {
+        'import': summarize([probe['import_s'] for probe in imports]),
+        'startup': summarize([probe['startup_s'] for probe in updates]),
+        'first_update': summarize([probe['first_update_s'] for probe in updates]),
+        'db_files_on_import': imports[-1]['db_files'],
+    }
+    for name in ('import', 'startup', 'first_update'):
+        print(f"{name:<13} p50={results[name]['p50_ms']:>8.1f}ms "
+              f"max={results[name]['max_ms']:>8.1f}ms")
+    if results['db_files_on_import']:
+        print(f"Импорт main создал файлы: {', '.join(results['db_files_on_import'])}")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'params': vars(args),
+        'results': results,
+    }
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"startup-{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nРезультаты сохранены: {output}")
+
+    exceeded = []
+    if args.max_import_ms is not None and results['import']['p50_ms'] > args.max_import_ms:
+        exceeded.append(f"import {results['import']['p50_ms']}ms > {args.max_import_ms}ms")
+    if (args.max_first_update_ms is not None
+            and results['first_update']['p50_ms'] > args.max_first_update_ms):
+        exceeded.append(
+            f"first_update {results['first_update']['p50_ms']}ms > {args.max_first_update_ms}ms")
+    if results['db_files_on_import']:
+        exceeded.append("импорт main создаёт файлы БД")
+    if exceeded:
+        print("Бюджет запуска превышен: " + "; ".join(exceeded))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
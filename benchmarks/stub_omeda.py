@@ -0,0 +1,181 @@
+"""
+Локальная заглушка omeda.city API для бенчмарков.
+
+Отдаёт /players/{omeda_id}/statistics.json и /players/{omeda_id}/matches.json
+с настраиваемыми задержкой, долей ошибок и размером ответа. Ответы
+детерминированы по omeda_id, поэтому прогоны на разных коммитах сравнимы.
+
+Запуск отдельно:
+    python -m benchmarks.stub_omeda --port 8081 --latency 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+
+# Время окончания самого нового матча в ленте каждого игрока
+LAST_MATCH_END = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+class StubConfig:
+    """
+    Класс параметров заглушки.
+    """
+
+    def __init__(self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        payload_kb: float = 0.0,
+        players_per_match: int = 10,
+        seed: int = 0):
+        """
+        Args:
+            latency (float): Средняя задержка ответа (сек.)
+            jitter (float): Случайное отклонение задержки (сек.)
+            error_rate (float): Доля ответов 500
+            throttle_rate (float): Доля ответов 429 (с Retry-After: 0)
+            payload_kb (float): Дополнительный объём ответа (КБ)
+            players_per_match (int): Участников в каждом матче
+            seed (int): Seed генератора случайных чисел
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.payload_kb = payload_kb
+        self.players_per_match = players_per_match
+        self.random = random.Random(seed)
+        self.requests = 0
+
+
+def _player_ps(omeda_id: str, salt: str = "") -> float:
+    digest = hashlib.sha1(f"{omeda_id}{salt}".encode()).digest()
+    return round(50 + int.from_bytes(digest[:2]) / 65535 * 100, 2)
+
+
+async def _shape(config: StubConfig) -> web.Response | None:
+    """
+    Задержка и случайные ошибки. Возвращает ответ-ошибку или None.
+    """
+    config.requests += 1
+    delay = config.latency + config.random.uniform(-config.jitter, config.jitter)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    roll = config.random.random()
+    if roll < config.error_rate:
+        return web.Response(status=500)
+    if roll < config.error_rate + config.throttle_rate:
+        return web.Response(status=429, headers={"Retry-After": "0"})
+
+    return None
+
+
+def _padding(config: StubConfig) -> list[dict]:
+    # Каждый элемент ~100 байт в JSON
+    return [
+        {'hero': f"hero_{i}", 'note': "x" * 64}
+        for i in range(int(config.payload_kb * 1024 / 100))
+    ]
+
+
+async def statistics(request: web.Request) -> web.Response:
+    config: StubConfig = request.app['config']
+    if (error := await _shape(config)) is not None:
+        return error
+
+    omeda_id = request.match_info['omeda_id']
+    return web.json_response({
+        'id': omeda_id,
+        'matches_played': 100,
+        'avg_performance_score': _player_ps(omeda_id),
+        'avg_kda': [5.0, 4.0, 6.0],
+        'padding': _padding(config),
+    })
+
+
+async def matches(request: web.Request) -> web.Response:
+    config: StubConfig = request.app['config']
+    if (error := await _shape(config)) is not None:
+        return error
+
+    omeda_id = request.match_info['omeda_id']
+    per_page = int(request.query.get('per_page', 10))
+    page = int(request.query.get('page', 1))
+
+    matches_list = []
+    for i in range(per_page):
+        number = (page - 1) * per_page + i
+        players = [{'id': omeda_id, 'performance_score': _player_ps(omeda_id, str(number))}]
+        players += [
+            {'id': f"{omeda_id}-mate-{j}", 'performance_score': 100.0}
+            for j in range(config.players_per_match - 1)
+        ]
+        matches_list.append({
+            'id': f"{omeda_id}-match-{number}",
+            'end_time': (LAST_MATCH_END - timedelta(hours=number)).isoformat(),
+            'players': players,
+        })
+
+    return web.json_response({'matches': matches_list, 'padding': _padding(config)})
+
+
+def make_app(config: StubConfig) -> web.Application:
+    """
+    Создаёт aiohttp-приложение заглушки.
+    """
+    app = web.Application()
+    app['config'] = config
+    app.router.add_get('/players/{omeda_id}/statistics.json', statistics)
+    app.router.add_get('/players/{omeda_id}/matches.json', matches)
+    return app
+
+
+async def start_stub(config: StubConfig, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """
+    Запускает заглушку в текущем event loop.
+
+    Returns:
+        tuple[web.AppRunner, str]: Runner (для cleanup) и базовый адрес
+        вида http://host:port/players/
+    """
+    runner = web.AppRunner(make_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/players/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка omeda.city API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--payload-kb", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        payload_kb=args.payload_kb,
+    )
+    web.run_app(make_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
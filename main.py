@@ -13,21 +13,34 @@
     Обеспечивает обработку ошибок и логирование
     """
 import os
+import time
 import logging
 import traceback
+import multiprocessing
+
+from functools import partial
 
 from dotenv import load_dotenv
-import aiocron
 import asyncio
 from aiogram import Bot, Dispatcher, types ,F
-from aiogram.filters.command import Command
+from aiogram.filters.command import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.orm.exc import NoResultFound
 from aiogram.enums import ParseMode 
+from aiogram.exceptions import TelegramBadRequest
+from aiohttp import web
 
 import utils.ps_data_manager as pdm
+import utils.ps_parser as ps_parser
+from utils.ps_fsm_storage import SQLiteStorage
+from utils.ps_http_client import http_client
+from utils.ps_metrics import METRICS_PORT, registry, start_metrics_server
+from utils.ps_middlewares import HandlerMetricsMiddleware, ProfilingMiddleware
+from utils.ps_profiler import format_slow_updates, update_profiler
+from utils.ps_refresh_scheduler import DailyRefreshScheduler
+from utils.webhook_server import UpdateRouter, consume_updates, make_app
 
 
 load_dotenv()
@@ -40,13 +53,49 @@ LOG_LVL = getattr(
 logging.basicConfig(level=LOG_LVL)
 logger = logging.getLogger(__name__)
 
+# Параметры ежедневного обновления PS
+REFRESH_HOUR = int(os.getenv("REFRESH_HOUR", "4"))
+REFRESH_WINDOW = float(os.getenv("REFRESH_WINDOW", "1800"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "20"))
+
+# Режим получения апдейтов: polling (разработка) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Параметры webhook: публичный адрес, локальный сервер и число процессов-воркеров
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "2"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+# Максимальный размер CSV-файла для /import (байт)
+IMPORT_MAX_FILE_SIZE = int(os.getenv("IMPORT_MAX_FILE_SIZE", str(64 * 1024)))
+
+# Telegram ID администраторов бота через запятую (команда /slow)
+ADMIN_IDS = {
+    int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",")
+    if admin_id.strip()
+}
+
+STARTUP_SECONDS = registry.gauge(
+    "bot_startup_seconds",
+    "Длительность фаз запуска бота (БД, FSM, HTTP-клиент, рейтинг)",
+    ("phase",))
+
 # Объект бота
 bot = Bot(token=TG_TOKEN)
 
 # Диспетчер 
 # объект, занимающийся получением апдейтов от Telegram с 
 # последующим выбором хэндлера для обработки принятого апдейта.
-dp = Dispatcher()
+# Состояния FSM хранятся в SQLite: переживают перезапуск и общие для воркеров
+dp = Dispatcher(storage=SQLiteStorage())
+# Время обработки апдейтов целиком и отчёты по медленным апдейтам (/slow)
+dp.update.outer_middleware(ProfilingMiddleware(update_profiler))
+# Время выполнения хэндлеров (команды и шаги FSM) -> /metrics
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
 
 # Хэндлер на команду 
 # асинхронная функция, которая получает от диспетчера/роутера 
@@ -57,36 +106,262 @@ dp = Dispatcher()
 # колбэк, инлайн-запрос, платёж, добавление 
 # бота в группу и т.д. 
 
-@aiocron.crontab('* 4 * * *')
-async def daily_update():
+# Ежедневный апдейт значений player_ps_day в ps_data.db
+refresh_scheduler = DailyRefreshScheduler(
+    pdm.uc,
+    pdm.player_ps_day_db_update,
+    run_hour=REFRESH_HOUR,
+    window=REFRESH_WINDOW,
+    batch_size=REFRESH_BATCH_SIZE,
+)
+
+# Фоновые задачи, дописывающие частичные ответы /delta (ссылки держатся
+# до завершения задачи)
+delta_finishers: set[asyncio.Task] = set()
+
+DELTA_SORT_TITLES = {'avg': "avg", 'delta': "delta", 'last': "last"}
+
+def get_delta_keyboard(sort: str, page: int, pages: int):
+    """Создает inline-клавиатуру листания и сортировки отчёта /delta"""
+    builder = InlineKeyboardBuilder()
+    if pages > 1:
+        builder.button(text="◀", callback_data=f"delta:{sort}:{max(page - 1, 0)}")
+        builder.button(text=f"{page + 1}/{pages}", callback_data=f"delta:{sort}:{page}")
+        builder.button(text="▶", callback_data=f"delta:{sort}:{min(page + 1, pages - 1)}")
+    for key, title in DELTA_SORT_TITLES.items():
+        builder.button(
+            text=f"✓ {title}" if key == sort else title,
+            callback_data=f"delta:{key}:0")
+    builder.adjust(*([3] if pages > 1 else []), len(DELTA_SORT_TITLES))
+    return builder.as_markup()
+
+@dp.message(Command("delta"))
+async def cmd_delta(message: types.Message):
     """
-    Ежедневный апдейт значений player_ps_day в ps_data.db
+    Возвращает сообщение c измененеием PS для участников чата.
+    Если отчёт не собран за DELTA_DEADLINE сек., отправляется частичный
+    отчёт, который редактируется после сборки полного (finish_delta_reply)
     """
     try:
-        await pdm.player_ps_day_db_update()
+        delta_data, build = await pdm.players_ps_delta_within(message.chat.id)
+        if delta_data is None:
+            await message.answer("Нет зарегистрированных пользователей. Используйте команду /add_player")
+            return
+
+        text, pages = delta_data
+        reply = await message.answer(text,
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+        # Частичный отчёт не листается: его страниц нет в кэше отчётов
+        reply_markup=get_delta_keyboard('avg', 0, pages) if build is None else None)
+
+        if build is not None:
+            task = asyncio.create_task(finish_delta_reply(reply, message.chat.id, build))
+            delta_finishers.add(task)
+            task.add_done_callback(delta_finishers.discard)
     
     except Exception as e:
-        logger.error(f"daily_update(): {e}")
+        logger.error(f"cmd_delta(): {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await message.answer("Ошибка дельты PS. Убедитесь, что добавлен хотя бы один игрок")
 
-@dp.message(Command("delta"))
-async def cmd_delta(message: types.Message):
+async def finish_delta_reply(reply: types.Message, chat_id: int, build) -> None:
     """
-    Возвращает сообщение c измененеием PS для участников чата
+    Заменяет частичный отчёт /delta полным, когда он собран, или отчётом
+    с последними известными данными по жёсткому таймауту
     """
     try:
-        delta_data = await pdm.players_ps_delta(message.chat.id)
+        delta_data = await pdm.finish_delta(chat_id, build)
         if delta_data is None:
+            await reply.edit_text("Нет зарегистрированных пользователей. Используйте команду /add_player")
+            return
+
+        text, pages = delta_data
+        # После жёсткого таймаута полного отчёта в кэше ещё нет - листать нечего
+        collected = pdm.report_cache.peek(chat_id) is not None
+        await reply.edit_text(
+            text,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True,
+            reply_markup=get_delta_keyboard('avg', 0, pages) if collected else None)
+
+    except TelegramBadRequest as e:
+        # Сообщение удалено или текст не изменился
+        logger.info(f"finish_delta_reply(): {e}")
+    except Exception as e:
+        logger.error(f"finish_delta_reply(): {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        try:
+            await reply.edit_text("Ошибка дельты PS. Попробуйте /delta ещё раз")
+        except Exception as e:
+            # Задача ответа выполняется в фоне: исключение здесь некому получить
+            logger.error(f"finish_delta_reply(): не удалось сообщить об ошибке: {e}")
+
+@dp.callback_query(F.data.startswith("delta:"))
+async def delta_page_handler(callback: types.CallbackQuery):
+    """
+    Листание и сортировка отчёта /delta из уже собранного отчёта, без запросов к API
+    """
+    _, sort, page = callback.data.split(":")
+    if sort not in DELTA_SORT_TITLES or not page.isdigit():
+        await callback.answer()
+        return
+
+    delta_data = pdm.cached_delta_page(callback.message.chat.id, sort, int(page))
+    if delta_data is None:
+        await callback.answer("Отчёт устарел, запросите /delta", show_alert=True)
+        return
+
+    text, pages = delta_data
+    try:
+        await callback.message.edit_text(
+            text,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True,
+            reply_markup=get_delta_keyboard(sort, min(int(page), pages - 1), pages))
+    except TelegramBadRequest:
+        # Нажата кнопка текущей страницы - сообщение не изменилось
+        pass
+
+    await callback.answer()
+
+@dp.message(Command("history"))
+async def cmd_history(message: types.Message, command: CommandObject):
+    """
+    Возвращает историю PS игрока чата: /history <nick> [days]
+    """
+    args = (command.args or "").split()
+    if not args:
+        await message.answer("Использование: /history <никнейм> [дней]")
+        return
+
+    days = 7
+    if len(args) > 1 and args[-1].isdigit():
+        days = int(args.pop())
+    player_name = " ".join(args)
+
+    try:
+        history = await pdm.player_ps_history(player_name, message.chat.id, days)
+        await message.answer(history, parse_mode=ParseMode.HTML)
+
+    except NoResultFound:
+        await message.answer(f"Игрок {player_name} не найден в базе")
+
+    except Exception as e:
+        logger.error(f"cmd_history(): {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await message.answer("Ошибка получения истории PS")
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: types.Message, command: CommandObject):
+    """
+    Возвращает статистику игроков чата по истории PS: /stats [days]
+    """
+    args = (command.args or "").split()
+    days = int(args[0]) if args and args[0].isdigit() else 7
+
+    try:
+        stats = await pdm.players_team_stats(message.chat.id, days)
+        if stats is None:
+            await message.answer("Нет зарегистрированных пользователей. Используйте команду /add_player")
+            return
+
+        await message.answer(stats, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+
+    except Exception as e:
+        logger.error(f"cmd_stats(): {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await message.answer("Ошибка получения статистики PS")
+
+@dp.message(Command("trend"))
+async def cmd_trend(message: types.Message, command: CommandObject):
+    """
+    Возвращает средний PS команды по дням: /trend [days]
+    """
+    args = (command.args or "").split()
+    days = int(args[0]) if args and args[0].isdigit() else 30
+
+    try:
+        trend = await pdm.team_ps_trend(message.chat.id, days)
+        if trend is None:
             await message.answer("Нет зарегистрированных пользователей. Используйте команду /add_player")
             return
 
-        await message.answer((delta_data),
+        await message.answer(trend, parse_mode=ParseMode.HTML)
+
+    except Exception as e:
+        logger.error(f"cmd_trend(): {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        await message.answer("Ошибка получения динамики PS")
+
+@dp.message(Command("top"))
+async def cmd_top(message: types.Message, command: CommandObject):
+    """
+    Общий рейтинг игроков всех чатов: /top [n] или место игрока чата: /top <nick>
+    """
+    args = (command.args or "").strip()
+
+    if args and not args.isdigit():
+        try:
+            await message.answer(await pdm.player_rank(args, message.chat.id))
+        except NoResultFound:
+            await message.answer(f"Игрок {args} не найден в базе")
+        except Exception as e:
+            logger.error(f"cmd_top(): {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            await message.answer("Ошибка получения места в рейтинге")
+        return
+
+    await message.answer(
+        await pdm.top_players(int(args) if args else 10, message.chat.id),
         parse_mode=ParseMode.HTML,
         disable_web_page_preview=True)
-    
+
+@dp.message(Command("import"))
+async def cmd_import(message: types.Message, command: CommandObject, bot: Bot):
+    """
+    Добавляет список игроков: /import и строки "имя,omeda_id" в том же
+    сообщении или CSV-файл с подписью /import
+    """
+    text = command.args or ""
+
+    if message.document is not None:
+        if (message.document.file_size or 0) > IMPORT_MAX_FILE_SIZE:
+            await message.answer(f"Файл больше {IMPORT_MAX_FILE_SIZE // 1024} КБ")
+            return
+        content = await bot.download(message.document)
+        text = content.read().decode("utf-8-sig", errors="replace")
+
+    if not text.strip():
+        await message.answer(
+            "Использование: /import, затем с новой строки игроки в формате "
+            "имя,omeda_id (или CSV-файл с подписью /import)")
+        return
+
+    try:
+        pages = await pdm.import_players(text, message.chat.id)
+        for page in pages:
+            await message.answer(page, parse_mode=ParseMode.HTML)
+
     except Exception as e:
-        logger.error(f"cmd_delta(): {e}")
+        logger.error(f"cmd_import(): {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        await message.answer("Ошибка дельты PS. Убедитесь, что добавлен хотя бы один игрок")
+        await message.answer("Ошибка импорта игроков")
+
+@dp.message(Command("slow"))
+async def cmd_slow(message: types.Message, command: CommandObject):
+    """
+    Список самых медленных недавних апдейтов: /slow [n]. Только для администраторов
+    """
+    if message.from_user is None or message.from_user.id not in ADMIN_IDS:
+        return
+
+    limit = 10
+    if command.args and command.args.strip().isdigit():
+        limit = max(1, min(int(command.args), 20))
+
+    report = format_slow_updates(update_profiler.slowest(limit))
+    await message.answer(report[:4096])
 
 class DelPlayerStates(StatesGroup):
     """
@@ -133,7 +408,7 @@ async def process_del_player_name(
     chat_id = data['chat_id']
 
     try:
-        pdm.del_player_from_db(player_name, chat_id)
+        await pdm.del_player_from_db(player_name, chat_id)
         
         await message.answer(
             f"Игрок {player_name} успешно удалён из команды!"
@@ -252,7 +527,18 @@ async def process_add_player_omeda_id(message: types.Message, state: FSMContext,
     """
     data = await state.get_data()
 
-    if not await pdm.is_valid_omeda_id(message.text):
+    # Ответ проверки omeda_id сразу даёт начальный PS игрока
+    try:
+        player_ps = await ps_parser.get_valid_player_ps(message.text.strip())
+    except Exception as e:
+        # Цепь разомкнута (CircuitOpenError), ошибка сети или таймаут
+        logger.error(f"process_add_player_omeda_id: {e!r}")
+        await remove_inline_buttons(message.chat.id, data['messages'], bot)
+        await state.clear()
+        await message.answer("omeda.city недоступен, попробуйте позже")
+        return
+
+    if player_ps is None:
         await message.answer("Не корректный Omeda_id. Введите корректный или отмените операцию")
         return
     
@@ -265,7 +551,7 @@ async def process_add_player_omeda_id(message: types.Message, state: FSMContext,
 
     try:
         # Ваш метод добавления в БД
-        await pdm.add_player_to_db(player_name, omeda_id, chat_id)
+        await pdm.add_player_to_db(player_name, omeda_id, chat_id, player_ps)
         
         await message.answer(
             f"Игрок {player_name} успешно добавлен в команду!"
@@ -273,19 +559,155 @@ async def process_add_player_omeda_id(message: types.Message, state: FSMContext,
     except Exception as e:
         logger.error(f"process_add_player_omeda_id: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
-        #TODO добавить валидацию на omeda_id и выдать соответсвующую ошибку в чат
         await message.answer("Ошибка при добавлении игрока")
     finally:
         await state.clear()
 
-# Запуск процесса поллинга новых апдейтов
+async def startup(create_schema: bool = True) -> None:
+    """
+    Явная фаза запуска: импорт модулей не трогает диск и сеть, БД, хранилище
+    FSM и HTTP-клиент создаются здесь (или при первом обращении).
+    Длительность каждой фазы пишется в лог и в метрику bot_startup_seconds
+
+    Args:
+        create_schema (bool): Создать таблицы и мигрировать схему БД. Воркеры
+        webhook только открывают БД, схему готовит фронтовой процесс
+    """
+    phases = (
+        ("db", partial(pdm.uc.startup, create_schema)),
+        ("fsm", partial(dp.storage.startup, create_schema)),
+        # Один HTTP-клиент с пулом соединений на всё время работы бота
+        ("http", http_client.start),
+        # Общий рейтинг /top строится из БД один раз и дальше обновляется в памяти
+        ("leaderboard", pdm.load_leaderboard),
+    )
+    started = time.perf_counter()
+    for name, step in phases:
+        phase_started = time.perf_counter()
+        await step()
+        STARTUP_SECONDS.set(time.perf_counter() - phase_started, phase=name)
+
+    total = time.perf_counter() - started
+    STARTUP_SECONDS.set(total, phase="total")
+    timings = ", ".join(
+        f"{name} {STARTUP_SECONDS.value(phase=name):.3f}" for name, _ in phases)
+    logger.info(f"Запуск: {total:.3f} с ({timings})")
+
+async def serve(worker_index: int = 0, updates_queue=None) -> None:
+    """
+    Запускает обработку апдейтов: поллинг, если очередь не передана,
+    иначе апдейты из очереди воркера webhook.
+
+    Args:
+        worker_index (int): Номер воркера. Ежедневное обновление PS
+        запускается только в воркере 0
+        updates_queue: Очередь апдейтов воркера (multiprocessing.Queue)
+    """
+    await startup(create_schema=updates_queue is None)
+    # Эндпоинт /metrics (METRICS_PORT, по умолчанию выключен),
+    # у каждого воркера свой порт: METRICS_PORT + номер воркера
+    metrics_runner = await start_metrics_server(
+        port=METRICS_PORT + worker_index if METRICS_PORT else 0)
+    background_tasks = []
+    if worker_index == 0:
+        background_tasks.append(asyncio.create_task(refresh_scheduler.run_forever()))
+    if updates_queue is not None:
+        # Изменения рейтинга из других воркеров подхватываются перестроением
+        background_tasks.append(asyncio.create_task(pdm.rebuild_leaderboard_forever()))
+    try:
+        if updates_queue is None:
+            await dp.start_polling(bot)
+        else:
+            await consume_updates(
+                updates_queue, lambda update: dp.feed_raw_update(bot, update))
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await http_client.close()
+        await pdm.uc.close()
+        if ps_parser.cassette is not None:
+            ps_parser.cassette.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if updates_queue is not None:
+            # В поллинге хранилище FSM закрывает dp при остановке
+            await dp.storage.close()
+            await bot.session.close()
+
+# Запуск процесса поллинга новых апдейтов (фаза запуска - в serve)
 async def main():
-    await dp.start_polling(bot)
+    await serve()
+
+def run_worker(worker_index: int, updates_queue) -> None:
+    """
+    Точка входа процесса-воркера webhook
+    """
+    try:
+        asyncio.run(serve(worker_index, updates_queue))
+    except KeyboardInterrupt:
+        pass
+
+async def webhook_front(router: UpdateRouter) -> None:
+    """
+    Регистрирует webhook в Telegram и принимает апдейты до остановки процесса
+    """
+    await bot.set_webhook(
+        WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        )
+    await bot.session.close()
+
+    runner = web.AppRunner(make_app(router, WEBHOOK_PATH), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(
+        f"Webhook: {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, воркеров {WEBHOOK_WORKERS}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def run_webhook() -> None:
+    """
+    Webhook-режим: фронтовой процесс с aiohttp-сервером и WEBHOOK_WORKERS
+    процессов-воркеров, апдейты распределяются по chat_id
+    """
+    # Схема БД и хранилища FSM создаётся (и мигрируется) один раз до запуска
+    # воркеров, чтобы они не выполняли create_all и миграции одновременно
+    pdm.uc.create_schema()
+    dp.storage.create_schema()
+
+    # spawn: воркеры не наследуют потоки и соединения с БД родителя
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(maxsize=WEBHOOK_QUEUE_SIZE) for _ in range(WEBHOOK_WORKERS)]
+    workers = [
+        context.Process(
+            target=run_worker, args=(index, queue), name=f"bot-worker-{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        asyncio.run(webhook_front(UpdateRouter(queues, workers, WEBHOOK_SECRET)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Воркеры дорабатывают принятые апдейты и завершаются
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join(timeout=30)
 
 
 # Тело бота
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if BOT_MODE == "webhook":
+            run_webhook()
+        else:
+            asyncio.run(main())
     except Exception as e:
         logger.info(f"Бот остановлен: {e}")
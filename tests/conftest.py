@@ -1,4 +1,5 @@
 import pytest
+import pytest_asyncio
 
 
 @pytest.fixture
@@ -13,3 +14,14 @@ def sample_player_data():
             'omeda_id': '304a359b-2329-4ea7-8007-095e292f382e',}
         }
     }
+
+
+@pytest_asyncio.fixture
+async def users_controller(tmp_path):
+    from utils.users_manager import UsersController
+
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{tmp_path / 'ps_data.db'}")
+    yield uc
+    await uc.close()
+    UsersController._instance = None
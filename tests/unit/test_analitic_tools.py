@@ -12,4 +12,65 @@ def test_difference_players_score_records_success(sample_player_data):
     assert "player1" in result # nick
     assert "100.00" in result # avg
     assert "110.70" in result # last
-    assert "1.00" in result # delta
\ No newline at end of file
+    assert "1.00" in result # delta
+
+def test_player_history_records():
+    result = Analitic.player_history_records(
+        'player1', 7, [(0, 100.0, 110.7), (86400, 101.5, None)])
+
+    assert "player1" in result
+    assert "01.01.70 | 100.00 | 110.70" in result
+    assert "02.01.70 | 101.50" in result
+
+
+def test_player_history_records_empty():
+    assert "Нет истории" in Analitic.player_history_records('player1', 7, [])
+
+
+def make_team(size):
+    start = {f"p{i}": {'player_ps_day': 100.0} for i in range(size)}
+    end = {
+        f"p{i}": {'omeda_id': f"omeda-{i}", 'player_ps_day': 100.0 + i % 7 - 3,
+                  'last_match_ps': float(i)}
+        for i in range(size)
+    }
+    return start, end
+
+
+def test_delta_rows_sorting():
+    start, end = make_team(10)
+
+    by_delta = Analitic.delta_rows(start, end, 'delta')
+    by_last = Analitic.delta_rows(start, end, 'last')
+
+    assert by_delta[0].startswith("100.00 | 🟢 3.00")
+    assert 'omeda-9' in by_last[0] and 'omeda-0' in by_last[-1]
+    with pytest.raises(ValueError):
+        Analitic.delta_rows(start, end, 'name')
+
+
+def test_paginate_splits_at_row_boundaries():
+    start, end = make_team(300)
+    header = Analitic.delta_header()
+    rows = Analitic.delta_rows(start, end)
+
+    pages = Analitic.paginate(rows, header)
+
+    assert len(pages) > 1
+    assert all(len(page) <= Analitic.PAGE_LIMIT for page in pages)
+    assert all(page.startswith(header) for page in pages)
+    assert "".join(page.removeprefix(header) for page in pages) == "".join(rows)
+
+
+def test_delta_rows_mark_pending_and_stale_players():
+    start, end = make_team(3)
+    end['p1']['pending'] = True
+    end['p2']['stale'] = True
+
+    rows = Analitic.delta_rows(start, end)
+
+    assert not rows[0].rstrip().endswith((Analitic.PENDING_MARK, Analitic.STALE_MARK))
+    assert rows[1].rstrip().endswith(Analitic.PENDING_MARK)
+    assert rows[2].rstrip().endswith(Analitic.STALE_MARK)
+    assert "1 игр." in Analitic.pending_line(1)
+    assert Analitic.pending_line(0) == ""
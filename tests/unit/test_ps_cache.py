@@ -0,0 +1,64 @@
+import pytest
+from utils.ps_cache import TTLCache
+
+
+def test_ttl_cache_hit_and_miss():
+    cache = TTLCache(maxsize=10, ttl={'s': 60})
+
+    assert cache.get('id1', 's') is None
+    cache.set('id1', 's', {'avg_performance_score': 100.0})
+
+    assert cache.get('id1', 's') == {'avg_performance_score': 100.0}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttl_cache_expiration(mocker):
+    now = mocker.patch('utils.ps_cache.time.monotonic', return_value=1000.0)
+    cache = TTLCache(maxsize=10, ttl={'s': 60, 'm': 10})
+
+    cache.set('id1', 's', 's_data')
+    cache.set('id1', 'm', 'm_data')
+    now.return_value = 1030.0
+
+    assert cache.get('id1', 's') == 's_data'
+    assert cache.get('id1', 'm') is None
+    assert cache.stats()['expirations'] == 1
+    # Устаревший ответ остаётся последним известным значением
+    assert cache.get_stale('id1', 'm') == 'm_data'
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl={'s': 60})
+
+    cache.set('id1', 's', 1)
+    cache.set('id2', 's', 2)
+    cache.get('id1', 's')  # id1 теперь самый свежий
+    cache.set('id3', 's', 3)
+
+    assert cache.get('id2', 's') is None
+    assert cache.get('id1', 's') == 1
+    assert cache.get('id3', 's') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_cache_skips_none():
+    cache = TTLCache(maxsize=2, ttl={'s': 60})
+    cache.set('id1', 's', None)
+
+    assert len(cache) == 0
+
+
+def test_ttl_cache_observer_and_peek():
+    events = []
+    cache = TTLCache(maxsize=1, ttl={'s': 60}, observer=lambda *event: events.append(event))
+
+    cache.set('id1', 's', 1)
+    assert cache.peek('id1', 's') == 1
+    assert cache.peek('id2', 's') is None
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 0
+
+    cache.get('id1', 's')
+    cache.set('id2', 's', 2)
+
+    assert events == [('store', 's'), ('hit', 's'), ('store', 's'), ('eviction', 's')]
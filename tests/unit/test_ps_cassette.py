@@ -0,0 +1,54 @@
+import json
+import pytest
+import utils.ps_parser as ps_parser
+from utils.ps_cassette import Cassette
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_in_order(tmp_path):
+    path = tmp_path / "cassette.jsonl.gz"
+
+    recorder = Cassette(str(path), "record", flush_every=1)
+    recorder.record("omeda-1", "/statistics.json", b'{"avg_performance_score": 1}', 0.1)
+    recorder.record("omeda-1", "/statistics.json", b'{"avg_performance_score": 2}', 0.1)
+    recorder.record("omeda-2", "/statistics.json", b'{"avg_performance_score": 3}', 0.1)
+    recorder.close()
+
+    player = Cassette(str(path), "replay")
+
+    assert await player.replay("omeda-1", "/statistics.json") == b'{"avg_performance_score": 1}'
+    assert await player.replay("omeda-1", "/statistics.json") == b'{"avg_performance_score": 2}'
+    # Последний ответ повторяется
+    assert await player.replay("omeda-1", "/statistics.json") == b'{"avg_performance_score": 2}'
+    assert await player.replay("omeda-3", "/statistics.json") is None
+
+
+@pytest.mark.asyncio
+async def test_replay_shapes_latency(tmp_path, mocker):
+    path = tmp_path / "cassette.jsonl.gz"
+    recorder = Cassette(str(path), "record")
+    recorder.record("omeda-1", "/statistics.json", b'{}', 0.2)
+    recorder.close()
+
+    sleep = mocker.patch("utils.ps_cassette.asyncio.sleep")
+    player = Cassette(str(path), "replay", latency=0.05, latency_scale=0.5)
+    await player.replay("omeda-1", "/statistics.json")
+
+    sleep.assert_awaited_once_with(pytest.approx(0.15))
+
+
+@pytest.mark.asyncio
+async def test_parser_replays_without_network(tmp_path, mocker):
+    path = tmp_path / "cassette.jsonl.gz"
+    recorder = Cassette(str(path), "record")
+    recorder.record("omeda-1", "/statistics.json",
+                    json.dumps({'avg_performance_score': 123.456}).encode(), 0.0)
+    recorder.close()
+
+    mocker.patch.object(ps_parser, 'cassette', Cassette(str(path), "replay"))
+    get_session = mocker.patch.object(ps_parser.http_client, 'get_session')
+
+    assert await ps_parser.fetch_api_data("omeda-1", use_cache=False) == {
+        'avg_performance_score': 123.456}
+    assert await ps_parser.fetch_api_data("omeda-2", use_cache=False) is None
+    get_session.assert_not_called()
@@ -0,0 +1,98 @@
+import pytest
+
+from utils.ps_circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def test_breaker_opens_on_failures_and_slow_calls(mocker):
+    now = mocker.patch('utils.ps_circuit_breaker.time.monotonic', return_value=1000.0)
+    states = []
+    breaker = CircuitBreaker(
+        failure_threshold=3, slow_call_threshold=2.0, reset_timeout=30.0,
+        on_state_change=states.append)
+
+    breaker.record(False, 0.1)
+    breaker.record(True, 0.1)  # успех сбрасывает счётчик
+    breaker.record(False, 0.1)
+    breaker.record(True, 5.0)  # всплеск задержки - неудача
+    assert breaker.closed
+    breaker.record(False, 0.1)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30.0
+
+    now.return_value = 1030.0
+    # Полуоткрытая цепь пропускает один пробный запрос
+    assert breaker.allow()
+    assert not breaker.allow()
+    # Поздний успех запроса, начатого до размыкания, цепь не замыкает
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.allow()
+    breaker.record(False, 0.1, probe=True)
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    now.return_value = 1060.0
+    assert breaker.allow()
+    breaker.record(True, 0.1, probe=True)
+    breaker.release_probe()
+    assert breaker.closed
+    assert states == ['open', 'half_open', 'open', 'half_open', 'closed']
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_serves_last_known_values(mocker):
+    import utils.ps_parser as ps_parser
+
+    mocker.patch.object(ps_parser, 'circuit_breaker', CircuitBreaker(failure_threshold=1))
+    ps_parser.circuit_breaker.record(False, 0.1)
+    ps_parser.response_cache.clear()
+    ps_parser.response_cache.set('omeda-1', 's', {'avg_performance_score': 101.234})
+
+    with pytest.raises(CircuitOpenError):
+        await ps_parser.fetch_api_data('omeda-1', use_cache=False)
+
+    team = {
+        'cached': {'omeda_id': 'omeda-1', 'player_ps_day': 90.0},
+        'from_db': {'omeda_id': 'omeda-2', 'player_ps_day': 80.0},
+    }
+    await ps_parser.get_players_score_from_api(team, last_match_ps=False, stale_fallback=True)
+
+    # Свежий ответ из кэша не помечается, без кэша берётся player_ps_day из БД
+    assert team['cached']['player_ps'] == 101.23 and 'stale' not in team['cached']
+    assert team['from_db']['player_ps'] == 80.0 and team['from_db']['stale']
+    ps_parser.response_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_releases_half_open_breaker(mocker):
+    import asyncio
+    import utils.ps_parser as ps_parser
+
+    now = mocker.patch('utils.ps_circuit_breaker.time.monotonic', return_value=1000.0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    mocker.patch.object(ps_parser, 'circuit_breaker', breaker)
+    mocker.patch.object(ps_parser, 'cassette', None)
+    breaker.record(False, 0.1)
+    now.return_value = 1030.0
+
+    # Пробный запрос отменяется, не дождавшись слота планировщика
+    started = asyncio.Event()
+
+    async def get(session, url, handler):
+        started.set()
+        await asyncio.sleep(60)
+
+    mocker.patch.object(ps_parser.http_client, 'get_session', mocker.AsyncMock())
+    mocker.patch.object(ps_parser.fetch_scheduler, 'get', get)
+    probe = asyncio.ensure_future(ps_parser._get_json(
+        f"{ps_parser.BASE_OMEDA_ADRESS}omeda-1/statistics.json"))
+    await started.wait()
+    assert not breaker.allow()
+
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+import utils.ps_data_manager as pdm
+import utils.ps_parser as ps_parser
+from utils.ps_analitic_tools import Analitic
+from utils.ps_cache import TTLCache
+from utils.ps_report_cache import DeltaReport, DeltaReportCache
+from utils.ps_singleflight import SingleFlight
+
+
+TEAM = {
+    'Fast': {'bd_id': 1, 'omeda_id': 'omeda-1', 'player_ps_day': 100.0},
+    'Slow': {'bd_id': 2, 'omeda_id': 'omeda-2', 'player_ps_day': 90.0},
+}
+
+
+@pytest.fixture
+def slow_build(mocker):
+    """
+    Сборка отчёта /delta, которая ждёт release: к дедлайну omeda.city
+    ответил только для игрока Fast (ответ лежит в кэше API)
+    """
+    mocker.patch.object(pdm.uc, 'get_users_and_omeda_id', mocker.AsyncMock(
+        side_effect=lambda chat_id: {name: dict(player) for name, player in TEAM.items()}))
+    mocker.patch.object(pdm.uc, 'get_last_match_ps', mocker.AsyncMock(return_value={}))
+    mocker.patch.object(pdm, 'report_cache', DeltaReportCache(max_age=60))
+    mocker.patch.object(pdm, 'report_builds', SingleFlight())
+
+    cache = TTLCache(10, {'s': 60})
+    cache.set('omeda-1', 's', {ps_parser.DATA_FOR_EXTRACTION: 105.0})
+    mocker.patch.object(ps_parser, 'response_cache', cache)
+
+    release = asyncio.Event()
+    state = {'cancelled': False}
+
+    async def build_delta_report(chat_id):
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            state['cancelled'] = True
+            raise
+
+        data_end = {name: dict(player, last_match_ps=0) for name, player in TEAM.items()}
+        report = DeltaReport("", TEAM, data_end)
+        pdm.report_cache.set(chat_id, report)
+        return report
+
+    mocker.patch.object(pdm, 'build_delta_report', build_delta_report)
+    return release, state
+
+
+@pytest.mark.asyncio
+async def test_delta_partial_reply_then_full_report(slow_build):
+    release, state = slow_build
+
+    (text, _), build = await pdm.players_ps_delta_within(1, deadline=0.01)
+
+    assert build is not None and not build.done()
+    assert f"Slow</a>{Analitic.PENDING_MARK}" in text
+    assert "Fast</a>\n" in text
+    assert text.endswith(Analitic.pending_line(1))
+
+    release.set()
+    text, _ = await pdm.finish_delta(1, build, timeout=1)
+
+    assert Analitic.PENDING_MARK not in text
+    assert pdm.report_cache.peek(1) is build.result()
+    assert not state['cancelled']
+
+
+@pytest.mark.asyncio
+async def test_delta_hard_timeout_falls_back_without_cancelling_build(slow_build):
+    release, state = slow_build
+
+    _, build = await pdm.players_ps_delta_within(1, deadline=0.01)
+    text, _ = await pdm.finish_delta(1, build, timeout=0.01)
+
+    assert f"Slow</a>{Analitic.STALE_MARK}" in text
+    assert text.endswith(Analitic.stale_line(1))
+    assert pdm.report_cache.peek(1) is None
+
+    # Сборка продолжается после таймаута, и её отчёт попадает в кэш
+    assert not build.cancelled()
+    release.set()
+    await build
+    assert not state['cancelled']
+    assert pdm.report_cache.peek(1) is build.result()
+
+
+@pytest.mark.asyncio
+async def test_top_shows_only_requesting_chat_names(mocker):
+    from utils.ps_leaderboard import Leaderboard
+
+    board = Leaderboard()
+    board.set(1, 'omeda-1', 120.0)
+    board.set(2, 'omeda-2', 100.0)
+    mocker.patch.object(pdm, 'leaderboard', board)
+    mocker.patch.object(pdm.uc, 'get_users_and_omeda_id', mocker.AsyncMock(
+        return_value={'Mine': {'bd_id': 2, 'omeda_id': 'omeda-2', 'player_ps_day': 100.0}}))
+
+    text = await pdm.top_players(10, chat_id=1)
+
+    assert ">omeda-1</a>" in text and ">Mine</a>" in text
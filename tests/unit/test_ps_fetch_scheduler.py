@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from utils.ps_fetch_scheduler import FetchScheduler, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status, headers=None, payload=None):
+        self.status = status
+        self.headers = headers or {}
+        self.payload = payload
+
+    async def json(self):
+        return self.payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    def __init__(self, responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        session = self
+
+        class _Ctx:
+            async def __aenter__(self):
+                session.calls += 1
+                session.in_flight += 1
+                session.max_in_flight = max(session.max_in_flight, session.in_flight)
+                await asyncio.sleep(session.delay)
+                return session.responses.pop(0)
+
+            async def __aexit__(self, *args):
+                session.in_flight -= 1
+                return False
+
+        return _Ctx()
+
+
+async def read_json(response):
+    return await response.json()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_fetch_scheduler_retries_on_429():
+    session = FakeSession([
+        FakeResponse(429, {"Retry-After": "0"}),
+        FakeResponse(200, payload={'avg_performance_score': 100.0}),
+    ])
+    scheduler = FetchScheduler(rate=0)
+
+    result = await scheduler.get(session, "url", read_json)
+
+    assert result == {'avg_performance_score': 100.0}
+    assert session.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_fetch_scheduler_gives_up_after_max_retries():
+    session = FakeSession([FakeResponse(503, {"Retry-After": "0"})] * 3)
+    scheduler = FetchScheduler(rate=0, max_retries=2)
+
+    assert await scheduler.get(session, "url", read_json) is None
+    assert session.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_scheduler_limits_concurrency():
+    session = FakeSession([FakeResponse(200, payload={})] * 20, delay=0.01)
+    scheduler = FetchScheduler(max_concurrency=3, rate=0)
+
+    await asyncio.gather(*(scheduler.get(session, "url", read_json) for _ in range(20)))
+
+    assert session.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_fetch_scheduler_reports_each_attempt():
+    session = FakeSession([
+        FakeResponse(429, {"Retry-After": "0"}),
+        FakeResponse(200, payload={}),
+    ])
+    observed = []
+    scheduler = FetchScheduler(
+        rate=0, observer=lambda url, status, elapsed: observed.append((url, status)))
+
+    await scheduler.get(session, "url", read_json)
+
+    assert observed == [("url", "429"), ("url", "200")]
@@ -0,0 +1,63 @@
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from utils.ps_fsm_storage import SQLiteStorage
+
+
+class AddPlayerStates(StatesGroup):
+    waiting_for_name = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=-100, user_id=7)
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'fsm.db'}"
+    storage = SQLiteStorage(db_url)
+
+    await storage.update_data(KEY, {'user_id': 7, 'messages': [10]})
+    await storage.set_state(KEY, AddPlayerStates.waiting_for_name)
+    await storage.update_data(KEY, {'player_name': 'Nick'})
+    # Незаписанные изменения видны сразу
+    assert await storage.get_state(KEY) == AddPlayerStates.waiting_for_name.state
+    await storage.close()
+
+    restarted = SQLiteStorage(db_url)
+    assert await restarted.get_state(KEY) == AddPlayerStates.waiting_for_name.state
+    assert await restarted.get_data(KEY) == {
+        'user_id': 7, 'messages': [10], 'player_name': 'Nick'}
+
+    await restarted.set_state(KEY, None)
+    await restarted.set_data(KEY, {})
+    await restarted.flush()
+    assert await restarted.get_state(KEY) is None
+    assert await restarted.get_data(KEY) == {}
+    await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_of_one_step_are_batched(tmp_path, mocker):
+    storage = SQLiteStorage(f"sqlite:///{tmp_path / 'fsm.db'}", flush_interval=10)
+    write = mocker.spy(storage, '_write')
+
+    await storage.update_data(KEY, {'messages': [1]})
+    await storage.set_state(KEY, AddPlayerStates.waiting_for_name)
+    await storage.update_data(KEY, {'messages': [1, 2]})
+    await storage.flush()
+
+    assert write.call_count == 1
+    assert await storage.get_data(KEY) == {'messages': [1, 2]}
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_flow_expires(tmp_path, mocker):
+    storage = SQLiteStorage(f"sqlite:///{tmp_path / 'fsm.db'}", ttl=60)
+    await storage.set_state(KEY, AddPlayerStates.waiting_for_name)
+    await storage.flush()
+
+    mocker.patch('utils.ps_fsm_storage.time.time', return_value=10**10)
+
+    assert await storage.get_state(KEY) is None
+    await storage.close()
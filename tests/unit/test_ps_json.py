@@ -0,0 +1,44 @@
+import json
+
+import pytest
+import utils.ps_parser as ps_parser
+from utils import ps_json
+
+
+def test_projections_keep_only_needed_fields():
+    statistics = {'avg_performance_score': 101.5, 'hero_statistics': [{'x': 1}] * 100}
+    matches = {'matches': [{
+        'id': 'm1', 'end_time': '2025-06-01T10:00:00Z', 'game_mode': 'ranked',
+        'players': [
+            {'id': 'omeda-2', 'performance_score': 80.0, 'inventory': [1, 2, 3]},
+            {'id': 'omeda-1', 'performance_score': 120.456, 'inventory': [1, 2, 3]},
+        ],
+    }]}
+
+    assert ps_parser.project_statistics(statistics, 'omeda-1') == {'avg_performance_score': 101.5}
+    assert ps_parser.project_last_match(matches, 'omeda-1') == {'performance_score': 120.456}
+    assert ps_parser.project_last_match({'matches': []}, 'omeda-1') == {'performance_score': None}
+    assert ps_parser.project_matches_page(matches)['matches'][0]['players'][1] == {
+        'id': 'omeda-1', 'performance_score': 120.456}
+
+
+@pytest.mark.asyncio
+async def test_large_payload_is_decoded_off_loop(mocker):
+    to_thread = mocker.spy(ps_json.asyncio, 'to_thread')
+    body = json.dumps({'avg_performance_score': 1.0, 'padding': 'x' * 100}).encode()
+
+    small = await ps_json.decode(body, lambda doc: doc['avg_performance_score'])
+    large = await ps_json.decode(body, lambda doc: doc['avg_performance_score'], offload_bytes=10)
+
+    assert small == large == 1.0
+    assert to_thread.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_last_match_ps_from_projection(mocker):
+    mocker.patch.object(ps_parser, 'fetch_api_data', side_effect=[
+        {'performance_score': 99.999}, {'performance_score': None}, None])
+
+    assert await ps_parser.get_last_match_ps_from_json('omeda-1') == 100.0
+    assert await ps_parser.get_last_match_ps_from_json('omeda-1') == 0
+    assert await ps_parser.get_last_match_ps_from_json('omeda-1') == 0
@@ -0,0 +1,53 @@
+import random
+
+from utils.ps_leaderboard import Leaderboard
+
+
+def test_incremental_updates_match_full_sort():
+    rng = random.Random(1)
+    board = Leaderboard()
+    scores = {}
+
+    for step in range(500):
+        player_id = rng.randrange(60)
+        if rng.random() < 0.2:
+            board.remove(player_id)
+            scores.pop(player_id, None)
+        else:
+            score = round(rng.uniform(50, 150), 1)
+            board.set(player_id, f'omeda-{player_id}', score)
+            scores[player_id] = score
+
+    # Пачка из большинства игроков применяется пересортировкой
+    batch = {player_id: score + rng.uniform(-5, 5) for player_id, score in scores.items()}
+    board.update_scores({**batch, 999: 1.0})
+    scores.update(batch)
+
+    expected = sorted(scores, key=lambda player_id: (-scores[player_id], player_id))
+    assert [player_id for _, player_id, *_ in board.top(len(expected) + 5)] == expected
+    assert all(board.rank(player_id) == place for place, player_id in enumerate(expected, 1))
+    assert board.rank(999) is None
+
+
+def test_build_index_and_ties():
+    board = Leaderboard()
+    board.replace(Leaderboard.build_index(
+        iter([(3, 'o-3', 100.0), (1, 'o-1', 100.0), (2, 'o-2', 120.0)])))
+
+    assert board.top(2) == [(1, 2, 'o-2', 120.0), (2, 1, 'o-1', 100.0)]
+    assert board.rank(3) == 3
+
+    board.update_scores({3: 130.0})
+    assert board.rank(3) == 1 and len(board) == 3
+
+
+def test_build_index_does_not_touch_current_board():
+    board = Leaderboard()
+    board.set(1, 'o-1', 100.0)
+
+    index = Leaderboard.build_index(iter([(2, 'o-2', 120.0), (3, 'o-3', 90.0)]))
+    assert board.top(5) == [(1, 1, 'o-1', 100.0)]
+
+    board.replace(index)
+    assert board.top(5) == [(1, 2, 'o-2', 120.0), (2, 3, 'o-3', 90.0)]
+    assert 1 not in board
@@ -0,0 +1,145 @@
+import pytest
+import utils.ps_parser as ps_parser
+from utils.ps_match_ingest import MatchIngestor
+
+
+def make_match(match_id, end_time, players):
+    return {
+        'id': match_id,
+        'end_time': end_time,
+        'players': [{'id': pid, 'performance_score': ps} for pid, ps in players],
+    }
+
+
+def test_extract_matches():
+    api_data = {'matches': [
+        make_match('m2', '2025-06-02T10:00:00Z', [('omeda-1', 101.234), ('omeda-2', 90.0)]),
+        {'players': []},
+    ]}
+
+    matches = ps_parser.extract_matches(api_data)
+
+    assert matches == [{
+        'match_id': 'm2',
+        'ended_at': 1748858400,
+        'players': [('omeda-1', 101.234), ('omeda-2', 90.0)],
+    }]
+    assert ps_parser.extract_matches(None) == []
+
+
+@pytest.mark.asyncio
+async def test_sync_stops_at_known_match(users_controller, mocker):
+    feed = [
+        make_match(f'm{i}', f'2025-06-{i:02d}T10:00:00Z', [('omeda-1', 100.0 + i)])
+        for i in range(9, 0, -1)
+    ]
+    requested_pages = []
+
+    async def fetch_page(omeda_id, page, per_page, cursor):
+        requested_pages.append(page)
+        return {'matches': feed[(page - 1) * per_page: page * per_page]}
+
+    mocker.patch.object(ps_parser, 'fetch_matches_page', side_effect=fetch_page)
+    ingestor = MatchIngestor(users_controller, per_page=3)
+
+    # Первая синхронизация: вся лента (3 страницы)
+    await ingestor.sync_players(['omeda-1'])
+    assert requested_pages == [1, 2, 3, 4]
+    assert await users_controller.get_last_match_ps(['omeda-1']) == {'omeda-1': 109.0}
+
+    # Новый матч: достаточно первой страницы
+    feed.insert(0, make_match('m10', '2025-06-10T10:00:00Z', [('omeda-1', 120.0)]))
+    requested_pages.clear()
+    await ingestor.sync_players(['omeda-1'], force=True)
+
+    assert requested_pages == [1]
+    assert await users_controller.get_last_match_ps(['omeda-1']) == {'omeda-1': 120.0}
+
+
+@pytest.mark.asyncio
+async def test_fill_last_match_ps_respects_sync_ttl(users_controller, mocker):
+    fetch = mocker.patch.object(ps_parser, 'fetch_matches_page', return_value={
+        'matches': [make_match('m1', '2025-06-01T10:00:00Z',
+                               [('omeda-1', 100.0), ('omeda-2', 80.5)])]})
+    ingestor = MatchIngestor(users_controller, sync_ttl=600)
+    team = {'Nick': {'omeda_id': 'omeda-1'}, 'Other': {'omeda_id': 'omeda-3'}}
+
+    await ingestor.fill_last_match_ps(team)
+    await ingestor.fill_last_match_ps(team)
+
+    assert fetch.call_count == 2  # по одному разу на игрока
+    assert team['Nick']['last_match_ps'] == 100.0
+    assert team['Other']['last_match_ps'] == 0
+    # Участник чужого матча тоже сохранён
+    assert await users_controller.get_last_match_ps(['omeda-2']) == {'omeda-2': 80.5}
+
+
+@pytest.mark.asyncio
+async def test_interrupted_sync_resumes_without_losing_matches(users_controller, mocker):
+    feed = [
+        make_match(f'm{i}', f'2025-06-{i:02d}T10:00:00Z', [('omeda-1', 100.0 + i)])
+        for i in range(3, 0, -1)
+    ]
+    failing_pages = set()
+    requested_pages = []
+
+    async def fetch_page(omeda_id, page, per_page, cursor):
+        requested_pages.append(page)
+        if page in failing_pages:
+            return None
+        return {'matches': feed[(page - 1) * per_page: page * per_page]}
+
+    mocker.patch.object(ps_parser, 'fetch_matches_page', side_effect=fetch_page)
+    ingestor = MatchIngestor(users_controller, per_page=2, max_pages=2)
+    await ingestor.sync_players(['omeda-1'])
+
+    # 7 новых матчей: вторая страница не отвечает, затем кончается лимит страниц
+    for i in range(4, 11):
+        feed.insert(0, make_match(
+            f'm{i}', f'2025-06-{i:02d}T10:00:00Z', [('omeda-1', 100.0 + i)]))
+    failing_pages.add(2)
+    requested_pages.clear()
+    assert await ingestor.sync_player('omeda-1', (
+        await users_controller.get_match_sync(['omeda-1']))['omeda-1']) == 2
+
+    sync = (await users_controller.get_match_sync(['omeda-1']))['omeda-1']
+    assert sync['last_match_id'] == 'm3' and sync['resume_page'] == 2
+    assert await users_controller.get_last_match_ps(['omeda-1']) == {'omeda-1': 110.0}
+
+    failing_pages.clear()
+    requested_pages.clear()
+    await ingestor.sync_players(['omeda-1'], force=True)
+    assert requested_pages == [2, 3]
+    sync = (await users_controller.get_match_sync(['omeda-1']))['omeda-1']
+    assert sync['last_match_id'] == 'm3' and sync['resume_page'] == 4
+
+    requested_pages.clear()
+    await ingestor.sync_players(['omeda-1'], force=True)
+    assert requested_pages == [4]
+    sync = (await users_controller.get_match_sync(['omeda-1']))['omeda-1']
+    assert sync['last_match_id'] == 'm10' and sync['resume_page'] is None
+
+    # Все матчи ленты сохранены
+    matches = ps_parser.extract_matches({'matches': feed})
+    assert await users_controller.save_matches('omeda-1', matches) == 0
+
+
+@pytest.mark.asyncio
+async def test_last_match_ps_without_timestamps(users_controller):
+    matches = [
+        {'match_id': 'm2', 'ended_at': None, 'players': [('omeda-1', 120.0)]},
+        {'match_id': 'm1', 'ended_at': None, 'players': [('omeda-1', 100.0)]},
+    ]
+    await users_controller.save_matches('omeda-1', matches)
+
+    assert await users_controller.get_last_match_ps(['omeda-1']) == {'omeda-1': 120.0}
+
+
+@pytest.mark.asyncio
+async def test_matches_page_cursor_is_url_encoded(mocker):
+    get_json = mocker.patch.object(ps_parser, '_get_json', mocker.AsyncMock(return_value={}))
+
+    await ps_parser.fetch_matches_page('omeda-1', 2, 10, 'a&b=c d')
+
+    assert get_json.call_args.args[0].endswith(
+        '/omeda-1/matches.json?per_page=10&cursor=a%26b%3Dc+d')
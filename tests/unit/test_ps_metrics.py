@@ -0,0 +1,48 @@
+import pytest
+from types import SimpleNamespace
+from utils.ps_metrics import MetricsRegistry
+from utils.ps_middlewares import HANDLER_SECONDS, HandlerMetricsMiddleware
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    requests.inc(endpoint="/statistics.json")
+    requests.inc(2, endpoint="/statistics.json")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = registry.render()
+
+    assert 'requests_total{endpoint="/statistics.json"} 3' in text
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert 'latency_seconds_count 3' in text
+
+
+def test_registry_returns_existing_metric():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("in_flight", "In flight")
+
+    assert registry.gauge("in_flight", "In flight") is gauge
+    with pytest.raises(ValueError):
+        registry.counter("in_flight", "In flight")
+
+
+@pytest.mark.asyncio
+async def test_handler_middleware_records_handler_name():
+    async def cmd_delta(event, data):
+        raise RuntimeError("boom")
+
+    data = {'handler': SimpleNamespace(callback=cmd_delta)}
+    before = HANDLER_SECONDS.count(handler="cmd_delta", status="error")
+
+    with pytest.raises(RuntimeError):
+        await HandlerMetricsMiddleware()(cmd_delta, object(), data)
+
+    assert HANDLER_SECONDS.count(handler="cmd_delta", status="error") == before + 1
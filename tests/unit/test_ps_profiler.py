@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+import utils.ps_profiler as profiler
+from utils.ps_middlewares import ProfilingMiddleware
+
+
+@pytest.mark.asyncio
+async def test_parallel_phase_counted_once():
+    profile = profiler.UpdateProfile(1, "message", 42)
+    token = profiler.start_update(profile)
+
+    async def api_call():
+        with profiler.phase("api"):
+            await asyncio.sleep(0.05)
+
+    try:
+        await asyncio.gather(*(api_call() for _ in range(5)))
+    finally:
+        profiler.stop_update(token)
+
+    assert 0.04 < profile.phases['api'] < 0.15
+    assert profile.phases['db'] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_slow_updates_are_recorded_and_rotated(tmp_path):
+    update_profiler = profiler.UpdateProfiler(
+        slow_threshold=0.0, sample_rate=1.0, profile_dir=str(tmp_path), max_files=2)
+    middleware = ProfilingMiddleware(update_profiler)
+
+    async def handler(event, data):
+        profiler.set_handler("cmd_delta")
+        with profiler.phase("render"):
+            sum(range(1000))
+
+    for _ in range(3):
+        await middleware(handler, object(), {})
+
+    slowest = update_profiler.slowest(5)
+    assert len(slowest) == 3
+    assert slowest[0].handler == "cmd_delta"
+    assert len(list(tmp_path.glob("*.txt"))) == 2
+    latest = update_profiler.slow_updates[-1]
+    assert "cProfile" in (tmp_path / latest.profile_path).read_text(encoding="utf-8")
+    assert "cmd_delta" in profiler.format_slow_updates(slowest)
+
+
+@pytest.mark.asyncio
+async def test_cprofile_is_opt_in_and_limited_to_update(tmp_path):
+    update_profiler = profiler.UpdateProfiler(slow_threshold=0.0, profile_dir=str(tmp_path))
+    assert update_profiler.start_cprofile() is None
+
+    def other_update_work():
+        return sum(range(1000))
+
+    async def other_update():
+        for _ in range(5):
+            other_update_work()
+            await asyncio.sleep(0)
+
+    def measured_work():
+        return sum(range(1000))
+
+    async def handler(event, data):
+        for _ in range(5):
+            measured_work()
+            await asyncio.sleep(0)
+
+    update_profiler.sample_rate = 1.0
+    middleware = ProfilingMiddleware(update_profiler)
+    await asyncio.gather(middleware(handler, object(), {}), other_update())
+
+    report = (tmp_path / update_profiler.slow_updates[-1].profile_path).read_text(encoding="utf-8")
+    assert "measured_work" in report
+    assert "other_update_work" not in report
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+from utils.ps_refresh_scheduler import DAILY_UPDATE_SECONDS, DailyRefreshScheduler
+
+
+def make_refresh(uc, failing: set[str], calls: list[set[str]]):
+    async def refresh(players):
+        calls.append(set(players))
+        for omeda_id, player in players.items():
+            player['player_ps'] = 0 if omeda_id in failing else 100.0
+        await uc.update_player_ps_day(players)
+        return sum(1 for omeda_id in players if omeda_id in failing)
+
+    return refresh
+
+
+def test_due_run_date_and_next_run():
+    scheduler = DailyRefreshScheduler(None, None, run_hour=4)
+
+    assert scheduler.due_run_date(datetime(2025, 6, 2, 3, 59)) == "2025-06-01"
+    assert scheduler.due_run_date(datetime(2025, 6, 2, 4, 0)) == "2025-06-02"
+    assert scheduler.seconds_until_next_run(datetime(2025, 6, 2, 3, 0)) == 3600
+    assert scheduler.seconds_until_next_run(datetime(2025, 6, 2, 4, 0)) == 24 * 3600
+
+
+@pytest.mark.asyncio
+async def test_run_once_resumes_only_pending_players(users_controller):
+    for i in range(5):
+        await users_controller.add_player(f'Nick{i}', f'omeda-{i}', 1, 90.0)
+
+    calls = []
+    failing = {'omeda-3'}
+    refresh = make_refresh(users_controller, failing, calls)
+    scheduler = DailyRefreshScheduler(
+        users_controller, refresh, window=0, batch_size=2, retry_delay=0, max_attempts=2)
+
+    # "Перезапуск" после первого прохода: продолжаем тот же запуск только
+    # для необновлённого игрока
+    await users_controller.start_refresh_run("2025-06-02")
+    await users_controller.add_refresh_attempt("2025-06-02")
+    await refresh(await users_controller.get_players_pending_refresh(0))
+
+    failing.clear()
+    calls.clear()
+    assert await scheduler.run_once("2025-06-02") is True
+    assert calls == [{'omeda-3'}]
+
+    run = await users_controller.get_refresh_run("2025-06-02")
+    assert run['finished_at'] is not None
+    assert run['attempts'] == 2
+    assert run['failed'] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_once_finishes_after_max_attempts(users_controller):
+    for i in range(3):
+        await users_controller.add_player(f'Nick{i}', f'omeda-{i}', 1, 90.0)
+
+    calls = []
+    scheduler = DailyRefreshScheduler(
+        users_controller, make_refresh(users_controller, {'omeda-1'}, calls),
+        window=0, batch_size=10, retry_delay=0, max_attempts=2)
+
+    # Игрок, который не обновляется никогда (например, 404), не держит
+    # запуск открытым до следующего дня
+    runs = DAILY_UPDATE_SECONDS.count()
+    assert await scheduler.run_once("2025-06-02") is True
+    assert DAILY_UPDATE_SECONDS.count() == runs + 1
+    assert calls == [{'omeda-0', 'omeda-1', 'omeda-2'}, {'omeda-1'}]
+
+    run = await users_controller.get_refresh_run("2025-06-02")
+    assert run['finished_at'] is not None
+    assert run['attempts'] == 2
+    assert run['failed'] == 1
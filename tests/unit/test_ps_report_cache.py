@@ -0,0 +1,35 @@
+import pytest
+from utils.ps_report_cache import DeltaReport, DeltaReportCache
+
+
+def test_report_cache_get_and_invalidate():
+    cache = DeltaReportCache(max_age=60)
+    cache.set(1, DeltaReport("html", {}, {}))
+
+    assert cache.get(1).html == "html"
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_report_cache_staleness(mocker):
+    now = mocker.patch('utils.ps_report_cache.time.time', return_value=1000.0)
+    cache = DeltaReportCache(max_age=60)
+    cache.set(1, DeltaReport("html", {}, {}))
+
+    now.return_value = 1061.0
+    assert cache.get(1) is None
+
+
+def test_report_cache_skips_report_outdated_during_build():
+    cache = DeltaReportCache(max_age=60)
+
+    version = cache.version(1)
+    cache.invalidate(1)  # /add_player во время сборки отчёта
+    cache.set(1, DeltaReport("old", {}, {}), version)
+    assert cache.get(1) is None
+
+    version = cache.version(2)
+    cache.clear()  # ежедневное обновление во время сборки отчёта
+    cache.set(2, DeltaReport("old", {}, {}), version)
+    assert cache.get(2) is None
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from utils.ps_singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_calls():
+    sf = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {'avg_performance_score': 100.0}
+
+    results = await asyncio.gather(*(sf.do('id1', fetch) for _ in range(5)))
+
+    assert calls == 1
+    assert all(r == {'avg_performance_score': 100.0} for r in results)
+    assert sf.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_error_reaches_every_waiter():
+    sf = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(sf.do('id1', fetch) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_waiter_cancel_keeps_shared_fetch():
+    sf = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return 42
+
+    first = asyncio.create_task(sf.do('id1', fetch))
+    second = asyncio.create_task(sf.do('id1', fetch))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    release.set()
+
+    assert await second == 42
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,59 @@
+import numpy as np
+
+from utils.ps_analitic_tools import Analitic
+from utils.ps_team_analytics import DAY, PsHistoryFrame, team_stats, team_trend
+
+
+def _frame(history: dict[int, list[float | None]]) -> PsHistoryFrame:
+    """
+    История {player_id: [avg_ps по дням, None - нет записи]}
+    """
+    columns = ([], [], [], [])
+    for day in range(max(len(values) for values in history.values())):
+        for player_id, values in history.items():
+            if day < len(values) and values[day] is not None:
+                for column, value in zip(columns, (player_id, day * DAY + 60, values[day], None)):
+                    column.append(value)
+    return PsHistoryFrame.from_columns(*columns)
+
+
+def test_team_stats_vectorized():
+    frame = _frame({
+        1: [100.0, 101.0, 102.0, 103.0],
+        2: [120.0, 110.0, 100.0, 90.0],
+        3: [None, None, 95.0, 95.0],
+        # Не в команде - учитывается только в перцентиле
+        4: [50.0, 50.0, 50.0, 50.0],
+    })
+
+    stats = team_stats(frame, [1, 2, 3, 99], days=2)
+
+    np.testing.assert_array_equal(stats['avg'][:3], [103.0, 90.0, 95.0])
+    assert np.isnan(stats['avg'][3])
+    np.testing.assert_array_equal(stats['rank'], [1, 3, 2, 4])
+    np.testing.assert_array_equal(stats['percentile'][:3], [75.0, 25.0, 50.0])
+    np.testing.assert_array_equal(stats['change'][:3], [2.0, -20.0, 0.0])
+    np.testing.assert_array_equal(stats['streak'], [3, -3, 0, 0])
+    assert stats['zscore'][0] > 0 > stats['zscore'][1]
+
+
+def test_team_trend_skips_days_without_records():
+    frame = _frame({1: [100.0, None, 104.0], 2: [110.0, None, 100.0], 3: [1.0, 1.0, 1.0]})
+
+    days, means, rolling = team_trend(frame, [1, 2], days=30, window=2)
+
+    np.testing.assert_array_equal(days, [0, 2])
+    np.testing.assert_array_equal(means, [105.0, 102.0])
+    # Окно из двух дней, в одном из которых нет записей
+    np.testing.assert_array_equal(rolling, [105.0, 102.0])
+
+
+def test_team_stats_rows_render_by_rank():
+    stats = team_stats(_frame({1: [100.0, 90.0], 2: [100.0, 110.0]}), [1, 2, 3], days=7)
+
+    rows = Analitic.team_stats_rows([('Slow', 'o-1'), ('Fast', 'o-2'), ('New', 'o-3')], stats)
+
+    assert [row.split('>')[-2].split('<')[0] for row in rows] == ['Fast', 'Slow', 'New']
+    assert rows[0].startswith("  1 | 110.00 | +10.00 |")
+    assert "нет истории" in rows[2]
+
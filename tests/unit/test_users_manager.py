@@ -0,0 +1,253 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm.exc import NoResultFound
+
+
+@pytest.mark.asyncio
+async def test_add_and_get_players(users_controller):
+    await users_controller.add_player('player1', 'omeda-1', 1, 100.0)
+    await users_controller.add_player('player2', 'omeda-2', 2, 90.0)
+
+    team = await users_controller.get_users_and_omeda_id(1)
+
+    assert list(team) == ['player1']
+    assert team['player1']['omeda_id'] == 'omeda-1'
+    assert team['player1']['player_ps_day'] == 100.0
+
+
+@pytest.mark.asyncio
+async def test_del_player_not_found(users_controller):
+    with pytest.raises(NoResultFound):
+        await users_controller.del_player_from_db('nobody', 1)
+
+
+@pytest.mark.asyncio
+async def test_add_player_validates_name(users_controller):
+    with pytest.raises(ValueError):
+        await users_controller.add_player('x' * 26, 'omeda-1', 1, 100.0)
+
+
+@pytest.mark.asyncio
+async def test_same_player_in_two_chats_is_one_player(users_controller):
+    await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+    await users_controller.add_player('Nick', 'omeda-1', 2, 100.0)
+    await users_controller.add_player('Nick', 'omeda-2', 3, 80.0)
+
+    players = await users_controller.get_tracked_players()
+
+    assert set(players) == {'omeda-1', 'omeda-2'}
+
+
+@pytest.mark.asyncio
+async def test_add_players_in_one_transaction(users_controller):
+    await users_controller.add_player('Taken', 'omeda-1', 1, 100.0)
+
+    added = await users_controller.add_players(1, [
+        ('New', 'omeda-1', 50.0), ('Taken', 'omeda-2', 70.0), ('Other', 'omeda-3', 80.0)])
+
+    # Существующий игрок сохраняет общий player_ps_day, занятое имя пропущено
+    assert [player and player['player_ps_day'] for player in added] == [100.0, None, 80.0]
+    team = await users_controller.get_users_and_omeda_id(1)
+    assert {name: player['omeda_id'] for name, player in team.items()} == {
+        'Taken': 'omeda-1', 'New': 'omeda-1', 'Other': 'omeda-3'}
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_scan_and_untracked_player(users_controller):
+    first = await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+    second = await users_controller.add_player('Alias', 'omeda-1', 2, 50.0)
+    await users_controller.add_player('Other', 'omeda-2', 1, 80.0)
+
+    assert first == second == {'bd_id': first['bd_id'], 'omeda_id': 'omeda-1', 'player_ps_day': 100.0}
+    assert sorted(await users_controller.scan_player_scores(list)) == [
+        (first['bd_id'], 'omeda-1', 100.0), (first['bd_id'] + 1, 'omeda-2', 80.0)]
+
+    # Игрок ещё отслеживается во втором чате
+    assert await users_controller.del_player_from_db('Nick', 1) is None
+    assert await users_controller.del_player_from_db('Alias', 2) == first['bd_id']
+
+
+@pytest.mark.asyncio
+async def test_update_player_ps_day_is_shared_across_chats(users_controller):
+    await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+    await users_controller.add_player('Other', 'omeda-1', 2, 100.0)
+
+    players = await users_controller.get_tracked_players()
+    players['omeda-1']['player_ps'] = 105.5
+    await users_controller.update_player_ps_day(players)
+
+    assert (await users_controller.get_users_and_omeda_id(1))['Nick']['player_ps_day'] == 105.5
+    assert (await users_controller.get_users_and_omeda_id(2))['Other']['player_ps_day'] == 105.5
+
+
+@pytest.mark.asyncio
+async def test_update_player_ps_day_skips_failed_fetch(users_controller):
+    await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+
+    players = await users_controller.get_tracked_players()
+    players['omeda-1']['player_ps'] = 0
+    await users_controller.update_player_ps_day(players)
+
+    assert (await users_controller.get_users_and_omeda_id(1))['Nick']['player_ps_day'] == 100.0
+
+
+@pytest.mark.asyncio
+async def test_database_is_created_on_first_use(tmp_path):
+    from utils.users_manager import UsersController
+
+    db_path = tmp_path / 'lazy.db'
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{db_path}")
+    try:
+        assert not db_path.exists()
+        await uc.startup()
+        assert db_path.exists()
+        assert await uc.get_users_and_omeda_id(1) == {}
+    finally:
+        await uc.close()
+        UsersController._instance = None
+
+
+@pytest.mark.asyncio
+async def test_controller_after_close_is_new_instance(tmp_path):
+    from utils.users_manager import UsersController
+
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{tmp_path / 'closed.db'}")
+    await uc.close()
+
+    reopened = UsersController(f"sqlite:///{tmp_path / 'reopened.db'}")
+    try:
+        assert reopened is not uc
+        assert await reopened.get_users_and_omeda_id(1) == {}
+    finally:
+        await reopened.close()
+        UsersController._instance = None
+
+
+def test_legacy_users_table_migration(tmp_path):
+    import sqlite3
+    from utils.users_manager import UsersController
+
+    db_path = tmp_path / 'ps_data.db'
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, chat_id BIGINT, "
+            "name VARCHAR(25), omeda_id VARCHAR(40), player_ps_day FLOAT)")
+        conn.executemany(
+            "INSERT INTO users (chat_id, name, omeda_id, player_ps_day) VALUES (?, ?, ?, ?)",
+            [(1, 'Nick', 'omeda-1', 100.0),
+             (2, 'Nick', 'omeda-2', 90.0),
+             (2, 'Nick1', 'omeda-1', 101.0)])
+
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{db_path}")
+    try:
+        players = uc._get_tracked_players()
+        assert players['omeda-1']['player_ps_day'] == 101.0
+        assert set(uc._get_users_and_omeda_id(2)) == {'Nick', 'Nick1'}
+
+        with sqlite3.connect(db_path) as conn:
+            tables = {r[0] for r in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'")}
+        assert 'users' not in tables and 'users_legacy' in tables
+    finally:
+        uc.engine.dispose()
+        uc._executor.shutdown()
+        UsersController._instance = None
+
+
+
+@pytest.mark.asyncio
+async def test_schema_is_created_once_before_workers(tmp_path):
+    import sqlite3
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.users_manager import UsersController
+
+    db_path = tmp_path / 'ps_data.db'
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, chat_id BIGINT, "
+            "name VARCHAR(25), omeda_id VARCHAR(40), player_ps_day FLOAT)")
+        conn.execute(
+            "INSERT INTO users (chat_id, name, omeda_id, player_ps_day) "
+            "VALUES (1, 'Nick', 'omeda-1', 100.0)")
+
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{db_path}")
+    try:
+        # Одновременные вызовы сериализуются BEGIN IMMEDIATE: перенос
+        # выполняется один раз, второй вызов видит уже мигрированную схему
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(lambda _: uc.create_schema(), range(2)))
+
+        # Воркер только открывает БД
+        await uc.startup(create_schema=False)
+        players = await uc.get_users_and_omeda_id(1)
+        assert players['Nick']['omeda_id'] == 'omeda-1'
+        assert players['Nick']['player_ps_day'] == 100.0
+    finally:
+        await uc.close()
+        UsersController._instance = None
+
+@pytest.mark.asyncio
+async def test_update_player_ps_day_appends_history(users_controller):
+    await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+
+    for recorded_at, ps in ((1000, 101.0), (2000, 102.0), (3000, 103.0)):
+        players = await users_controller.get_tracked_players()
+        players['omeda-1'].update(player_ps=ps, last_match_ps=110.0)
+        await users_controller.update_player_ps_day(players, recorded_at)
+
+    history = await users_controller.get_player_history('Nick', 1, since=2000)
+
+    assert history == [(2000, 102.0, 110.0), (3000, 103.0, 110.0)]
+
+
+@pytest.mark.asyncio
+async def test_get_player_history_unknown_player(users_controller):
+    with pytest.raises(NoResultFound):
+        await users_controller.get_player_history('nobody', 1, since=0)
+
+
+@pytest.mark.asyncio
+async def test_get_history_columns(users_controller):
+    await users_controller.add_player('Nick', 'omeda-1', 1, 100.0)
+    for recorded_at, ps in ((1000, 101.0), (2000, 102.0)):
+        players = await users_controller.get_tracked_players()
+        players['omeda-1'].update(player_ps=ps, last_match_ps=None)
+        await users_controller.update_player_ps_day(players, recorded_at)
+
+    player_ids, recorded_at, avg_ps, last_match_ps = await users_controller.get_history_columns(1500)
+
+    assert recorded_at == [2000] and avg_ps == [102.0] and last_match_ps == [None]
+    assert len(player_ids) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_groups_commits_and_reads_see_queued_writes(tmp_path):
+    from utils.users_manager import DB_COMMIT_SECONDS, UsersController
+
+    UsersController._instance = None
+    uc = UsersController(f"sqlite:///{tmp_path / 'wb.db'}", write_behind=True, flush_interval=60)
+    try:
+        commits = DB_COMMIT_SECONDS.count()
+        acks = [await uc.add_player(f'Nick{i}', f'omeda-{i}', 1, 100.0 + i, durable=False)
+            for i in range(5)]
+        missing = await uc.del_player_from_db('nobody', 1, durable=False)
+
+        # Чтение отправляет накопленную пачку в поток БД раньше себя
+        assert len(await uc.get_users_and_omeda_id(1)) == 5
+        await asyncio.gather(*acks)
+        assert DB_COMMIT_SECONDS.count() == commits + 1
+        with pytest.raises(NoResultFound):
+            await missing
+
+        *untracked, _ = await asyncio.gather(
+            uc.del_player_from_db('Nick0', 1), uc.del_player_from_db('Nick1', 1), uc.flush())
+        assert untracked == [acks[0].result()['bd_id'], acks[1].result()['bd_id']]
+    finally:
+        await uc.close()
+        UsersController._instance = None
+
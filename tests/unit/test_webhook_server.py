@@ -0,0 +1,42 @@
+import queue
+
+import pytest
+from utils.webhook_server import UpdateRouter, consume_updates, extract_chat_id
+
+
+def message_update(update_id, chat_id):
+    return {'update_id': update_id,
+            'message': {'chat': {'id': chat_id}, 'from': {'id': 7}, 'text': '/delta'}}
+
+
+def test_extract_chat_id():
+    assert extract_chat_id(message_update(1, -1001)) == -1001
+    assert extract_chat_id({'update_id': 2, 'callback_query': {
+        'from': {'id': 7}, 'message': {'chat': {'id': -1002}}}}) == -1002
+    assert extract_chat_id({'update_id': 3, 'inline_query': {'from': {'id': 7}}}) == 7
+    assert extract_chat_id({'update_id': 4}) == 0
+
+
+def test_router_keeps_chat_on_one_worker():
+    router = UpdateRouter([queue.Queue() for _ in range(4)])
+
+    workers = {router.route(message_update(i, -1001)) for i in range(10)}
+
+    assert len(workers) == 1
+    assert 0 <= workers.pop() < 4
+
+
+@pytest.mark.asyncio
+async def test_consume_updates_stops_after_pending_updates():
+    updates = queue.Queue()
+    for i in range(3):
+        updates.put(message_update(i, -1001))
+    updates.put(None)
+    handled = []
+
+    async def feed(update):
+        handled.append(update['update_id'])
+
+    await consume_updates(updates, feed, poll_interval=0.01)
+
+    assert sorted(handled) == [0, 1, 2]
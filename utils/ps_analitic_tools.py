@@ -10,11 +10,21 @@
     Сравнивает performance scores игроков между начальным и текущим наборами данных
     Формирует строку с разницей показателей и ссылками на игроков
     Использует эмодзи-индикаторы для отображения динамики изменений (зеленый/красный/желтый)
+    Формирует строку с историей PS игрока по дням
+    Помечает в отчёте /delta игроков с устаревшими данными (API недоступен)
+    и игроков, данные которых ещё загружаются (ответ по дедлайну)
+    Разбивает отчёт /delta на страницы в пределах лимита сообщения Telegram
+    Формирует таблицу статистики команды (/stats) и динамику её PS (/trend)
+    Формирует общий рейтинг игроков (/top)
+    Формирует отчёт об импорте игроков (/import)
 """
 
+import html
 import logging
 import traceback
 
+from datetime import datetime, timezone
+
 import utils.ps_parser as ps_parser
 logger = logging.getLogger(__name__)
 
@@ -23,6 +33,16 @@ class Analitic:
     Класс для аналитики данных и рссчёта разницы в PS.
     """
 
+    # Порядок строк отчёта /delta
+    DELTA_SORTS = ('avg', 'delta', 'last')
+    # Пометка строки /delta с последними известными данными вместо ответа API
+    STALE_MARK = "*"
+    # Пометка строки /delta, данные которой ещё загружаются
+    PENDING_MARK = "⏳"
+    # Лимит сообщения Telegram - 4096 символов, часть оставлена под строку
+    # возраста данных и номер страницы
+    PAGE_LIMIT = 3800
+
     @staticmethod
     def difference_players_score_records(
         data_start: dict[str, dict[str, str| int |float]],
@@ -48,41 +68,326 @@ class Analitic:
         Raises:
             Exception: При возникновении проблем с доступом к данным игроков
         """
-        
-        result_string = (f"<u>#{'avg':^7}|{'delta':^13}|{'last':^11}|{'nick':^10}#</u>\n")
+        return Analitic.delta_header() + "".join(
+            Analitic.delta_rows(data_start, data_end))
+
+    @staticmethod
+    def delta_header() -> str:
+        """
+        Заголовок таблицы /delta
+        """
+        return f"<u>#{'avg':^7}|{'delta':^13}|{'last':^11}|{'nick':^10}#</u>\n"
+
+    @staticmethod
+    def delta_rows(
+        data_start: dict[str, dict[str, str| int |float]],
+        data_end: dict[str, dict[str, str| int |float]],
+        sort: str = 'avg',
+    ) -> list[str]:
+        """
+        Строит строки таблицы /delta за один проход по игрокам.
+
+        Args:
+            data_start (dict): Начальные данные PS игроков из базы данных
+            data_end (dict): Текущие данные PS игроков (порядок для sort='avg')
+            sort (str): Порядок строк: 'avg' - порядок data_end, 'delta' -
+            по изменению PS, 'last' - по PS последнего матча (по убыванию)
+
+        Returns:
+            list[str]: Строки таблицы, каждая заканчивается переводом строки
+
+        Raises:
+            Exception: При возникновении проблем с доступом к данным игроков
+        """
+        if sort not in Analitic.DELTA_SORTS:
+            raise ValueError(f"Неизвестный порядок сортировки: {sort}")
 
         up_down_neutral_emoji = ("🟢","🔴","🟡")
-        compare_index : int = None
-        compare_difference : float = None
+        records = []
 
         for player, player_data in data_end.items():
-            
+
             try:
                 current_ps = data_start[player]['player_ps_day']
                 next_ps = player_data['player_ps_day']
                 last_match_ps = player_data['last_match_ps']
 
             except Exception as e:
-                logger.error(f"difference_players_score_records: {e}")
+                logger.error(f"delta_rows: {e}")
                 logger.error(traceback.format_exc())
                 raise
-            
-            compare_difference = abs(next_ps - current_ps)
+
+            difference = next_ps - current_ps
 
             if next_ps > current_ps:
                 compare_index = 0
             elif next_ps < current_ps:
                 compare_index = 1
-            elif next_ps == current_ps:
+            else:
                 compare_index = 2
 
-            result_string += (
-                f"{current_ps:0>6.2f} | " +
-                f"{up_down_neutral_emoji[compare_index]} {compare_difference:0>4.2f} | " +
-                f"{last_match_ps:0>6.2f} | " +
-                f'''<a href="{ps_parser.BASE_OMEDA_ADRESS}{player_data['omeda_id']}">{player[:7]}</a>\n'''
+            if player_data.get('pending'):
+                mark = Analitic.PENDING_MARK
+            elif player_data.get('stale'):
+                mark = Analitic.STALE_MARK
+            else:
+                mark = ""
+
+            row = (
+                f"{current_ps:0>6.2f} | "
+                f"{up_down_neutral_emoji[compare_index]} {abs(difference):0>4.2f} | "
+                f"{last_match_ps:0>6.2f} | "
+                f'<a href="{ps_parser.BASE_OMEDA_ADRESS}{player_data["omeda_id"]}">{player[:7]}</a>'
+                f'{mark}\n'
                 )
-        return  result_string
+            records.append((difference, last_match_ps, row))
+
+        if sort == 'delta':
+            records.sort(key=lambda record: record[0], reverse=True)
+        elif sort == 'last':
+            records.sort(key=lambda record: record[1], reverse=True)
+
+        return [row for _, _, row in records]
+
+    @staticmethod
+    def paginate(rows: list[str], header: str, limit: int = PAGE_LIMIT) -> list[str]:
+        """
+        Разбивает таблицу на страницы не длиннее limit символов по границам строк.
+
+        Args:
+            rows (list[str]): Строки таблицы
+            header (str): Заголовок, повторяется на каждой странице
+            limit (int): Максимальная длина страницы
+
+        Returns:
+            list[str]: Страницы (минимум одна - только заголовок)
+        """
+        pages = []
+        page = [header]
+        length = len(header)
+
+        for row in rows:
+            if length + len(row) > limit and len(page) > 1:
+                pages.append("".join(page))
+                page = [header]
+                length = len(header)
+
+            page.append(row)
+            length += len(row)
+
+        pages.append("".join(page))
+        return pages
+
+    @staticmethod
+    def report_age_line(age: float) -> str:
+        """
+        Формирует строку с возрастом данных отчёта.
+
+        Args:
+            age (float): Возраст данных в секундах
+
+        Returns:
+            str: Строка вида "Данные обновлены N мин. назад"
+        """
+        if age < 60:
+            return "\n<i>Данные обновлены только что</i>"
+
+        return f"\n<i>Данные обновлены {int(age // 60)} мин. назад</i>"
+
+    @staticmethod
+    def stale_line(stale: int) -> str:
+        """
+        Формирует сноску к строкам /delta с устаревшими данными.
+
+        Args:
+            stale (int): Количество игроков с устаревшими данными
+
+        Returns:
+            str: Сноска, пустая строка если таких игроков нет
+        """
+        if not stale:
+            return ""
+
+        return (f"\n<i>{Analitic.STALE_MARK} omeda.city не ответил: последние известные "
+                f"данные ({stale} игр.)</i>")
+
+    @staticmethod
+    def pending_line(pending: int) -> str:
+        """
+        Формирует сноску к строкам /delta, данные которых ещё загружаются.
+
+        Args:
+            pending (int): Количество игроков без ответа API к дедлайну
+
+        Returns:
+            str: Сноска, пустая строка если таких игроков нет
+        """
+        if not pending:
+            return ""
+
+        return (f"\n<i>{Analitic.PENDING_MARK} данные {pending} игр. ещё загружаются, "
+                f"сообщение обновится</i>")
+
+    @staticmethod
+    def player_history_records(
+        player_name: str,
+        days: int,
+        history: list[tuple[int, float, float | None]],
+    ) -> str:
+        """
+        Формирует строку с историей PS игрока.
+
+        Args:
+            player_name (str): Имя игрока
+            days (int): Глубина истории в днях
+            history (list[tuple[int, float, float | None]]): Список
+            (recorded_at, avg_ps, last_match_ps), отсортированный по времени
+
+        Returns:
+            str: Форматированная строка с историей PS
+        """
+        if not history:
+            return f"Нет истории PS для {player_name} за {days} дн."
+
+        lines = [
+            f"История PS {player_name} за {days} дн.\n",
+            f"<u>#{'date':^10}|{'avg':^9}|{'last':^9}#</u>\n",
+        ]
+
+        for recorded_at, avg_ps, last_match_ps in history:
+            date = datetime.fromtimestamp(recorded_at, timezone.utc)
+            last = f"{last_match_ps:0>6.2f}" if last_match_ps else f"{'-':^6}"
+            lines.append(f"{date:%d.%m.%y} | {avg_ps:0>6.2f} | {last}\n")
+
+        return "".join(lines)
+
+    @staticmethod
+    def team_stats_header(days: int) -> str:
+        """
+        Заголовок таблицы /stats
+        """
+        return (
+            f"Статистика команды, изменение за {days} дн.\n"
+            f"<u>#{'#':^3}|{'avg':^8}|{'delta':^8}|{'pct':^6}|{'z':^6}|{'ser':^4}|{'nick':^9}#</u>\n"
+            )
+
+    @staticmethod
+    def team_stats_rows(
+        players: list[tuple[str, str]],
+        stats: dict,
+    ) -> list[str]:
+        """
+        Строит строки таблицы /stats в порядке места в команде.
+
+        Args:
+            players (list[tuple[str, str]]): Список (имя, omeda_id)
+            stats (dict): Массивы статистики в порядке players
+            (см. ps_team_analytics.team_stats)
+
+        Returns:
+            list[str]: Строки таблицы, игроки без истории - в конце
+        """
+        records = []
+        for (name, omeda_id), rank, avg, change, percentile, zscore, streak in zip(
+                players, stats['rank'], stats['avg'], stats['change'],
+                stats['percentile'], stats['zscore'], stats['streak']):
+            link = f'<a href="{ps_parser.BASE_OMEDA_ADRESS}{omeda_id}">{name[:7]}</a>\n'
+
+            if avg != avg:  # NaN - в истории нет записей игрока
+                records.append((rank, f"{'-':>3} | {'нет истории':^30} | {link}"))
+                continue
+
+            delta = f"{change:+6.2f}" if change == change else f"{'-':^6}"
+            records.append((rank, (
+                f"{rank:>3} | {avg:0>6.2f} | {delta} | {percentile:>3.0f}% | "
+                f"{zscore:+4.1f} | {streak:+3d} | {link}"
+                )))
+
+        records.sort(key=lambda record: record[0])
+        return [row for _, row in records]
+
+    @staticmethod
+    def team_trend_records(days: int, trend: tuple) -> str:
+        """
+        Формирует строку со средним PS команды по дням.
+
+        Args:
+            days (int): Глубина в днях
+            trend (tuple): (номера дней, средний PS, скользящее среднее)
+            (см. ps_team_analytics.team_trend)
+
+        Returns:
+            str: Форматированная строка с динамикой PS команды
+        """
+        day_numbers, means, rolling = trend
+        if not len(day_numbers):
+            return f"Нет истории PS команды за {days} дн."
+
+        lines = [
+            f"Средний PS команды за {days} дн.\n",
+            f"<u>#{'date':^10}|{'avg':^9}|{'avg 7':^9}#</u>\n",
+        ]
+
+        for day, mean, smooth in zip(day_numbers, means, rolling):
+            date = datetime.fromtimestamp(int(day) * 24 * 60 * 60, timezone.utc)
+            lines.append(f"{date:%d.%m.%y} | {mean:0>6.2f} | {smooth:0>6.2f}\n")
+
+        return "".join(lines)
+
+    @staticmethod
+    def leaderboard_records(
+        top: list[tuple[int, str, str | None, float]],
+        total: int,
+    ) -> str:
+        """
+        Формирует таблицу общего рейтинга игроков.
+
+        Args:
+            top (list[tuple]): Записи (место, omeda_id, имя в запросившем
+            чате или None - тогда показывается omeda_id, PS)
+            total (int): Количество игроков в рейтинге
+
+        Returns:
+            str: Форматированная строка с рейтингом
+        """
+        if not top:
+            return "Рейтинг пуст. Используйте команду /add_player"
+
+        lines = [
+            f"Рейтинг игроков всех чатов: топ {len(top)} из {total}\n",
+            f"<u>#{'#':^5}|{'avg':^9}|{'nick':^10}#</u>\n",
+        ]
+
+        for place, omeda_id, name, score in top:
+            lines.append(
+                f"{place:>4} | {score:0>6.2f} | "
+                f'<a href="{ps_parser.BASE_OMEDA_ADRESS}{omeda_id}">'
+                f'{html.escape((name or omeda_id)[:10])}</a>\n'
+                )
+
+        return "".join(lines)
+
+    @staticmethod
+    def import_summary(results: list[tuple[int, str, str]]) -> tuple[str, list[str]]:
+        """
+        Формирует отчёт об импорте игроков.
+
+        Args:
+            results (list[tuple[int, str, str]]): Список (номер строки, имя, результат)
+
+        Returns:
+            tuple[str, list[str]]: Заголовок и строки отчёта (для paginate)
+        """
+        if not results:
+            return "Список пуст. Формат: /import и строки имя,omeda_id\n", []
+
+        added = sum(status.startswith("✅") for _, _, status in results)
+        header = f"Импорт: добавлено {added} из {len(results)}\n"
+        lines = [
+            f"{line_no}. {html.escape(name[:30])} - {status}\n"
+            for line_no, name, status in results]
+
+        return header, lines
 
 def main():
     pass
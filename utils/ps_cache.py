@@ -0,0 +1,186 @@
+"""
+In-process кэш ответов omeda.city API.
+
+Ответы хранятся по ключу (omeda_id, endpoint). Для каждого endpoint задаётся
+своё время жизни записи (TTL), а размер кэша ограничен: при переполнении
+вытесняется запись, к которой дольше всего не обращались (LRU).
+
+Ключевые особенности:
+    TTL на уровне endpoint ('s' - /statistics.json, 'm' - /matches.json)
+    Ограниченный размер с LRU-вытеснением
+    Счётчики попаданий, промахов и вытеснений, передаются в observer
+    (метрики, см. ps_parser)
+    peek - чтение без учёта в счётчиках (внутренние проверки кэша)
+    Устаревшие записи остаются до вытеснения и доступны через get_stale
+    (ответ при недоступности API)
+"""
+import logging
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Класс LRU-кэша с TTL для ответов API.
+    """
+
+    def __init__(self,
+        maxsize: int,
+        ttl: dict[str, float],
+        default_ttl: float = 60.0,
+        observer: Callable[[str, str], None] | None = None):
+        """
+        Args:
+            maxsize (int): Максимальное количество записей
+            ttl (dict[str, float]): TTL (сек.) для каждого endpoint
+            default_ttl (float): TTL для endpoint, не указанных в ttl
+            observer (Callable | None): Вызывается с (событие, endpoint) на
+            каждое событие кэша: 'hit', 'miss', 'expired', 'eviction', 'store'
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize должен быть больше 0")
+
+        self.maxsize = maxsize
+        self.ttl = dict(ttl)
+        self.default_ttl = default_ttl
+        self.observer = observer
+        # key: (omeda_id, endpoint) -> (expires_at, value)
+        self._data: OrderedDict[tuple[str, str], tuple[float, Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _ttl_for(self, endpoint: str) -> float:
+        return self.ttl.get(endpoint, self.default_ttl)
+
+    def _observe(self, event: str, endpoint: str) -> None:
+        if self.observer is not None:
+            self.observer(event, endpoint)
+
+    def get(self, omeda_id: str, endpoint: str) -> Any | None:
+        """
+        Возвращает значение из кэша или None, если записи нет или она устарела.
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            endpoint (str): Ключ endpoint ('s', 'm', ...)
+        Returns:
+            Any | None: Закэшированный ответ
+        """
+        key = (omeda_id, endpoint)
+        item = self._data.get(key)
+
+        if item is None:
+            self.misses += 1
+            self._observe('miss', endpoint)
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            self.expirations += 1
+            self.misses += 1
+            self._observe('expired', endpoint)
+            self._observe('miss', endpoint)
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        self._observe('hit', endpoint)
+        return value
+
+    def peek(self, omeda_id: str, endpoint: str) -> Any | None:
+        """
+        Возвращает неустаревшее значение из кэша, не меняя счётчики и порядок
+        LRU (проверка кэша без запроса к API, например частичный отчёт /delta).
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            endpoint (str): Ключ endpoint ('s', 'm', ...)
+        Returns:
+            Any | None: Закэшированный ответ, None если записи нет или она устарела
+        """
+        item = self._data.get((omeda_id, endpoint))
+        if item is None or item[0] <= time.monotonic():
+            return None
+
+        return item[1]
+
+    def get_stale(self, omeda_id: str, endpoint: str) -> Any | None:
+        """
+        Возвращает значение из кэша, даже если оно устарело (последний
+        известный ответ API). Счётчики и порядок LRU не меняются.
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            endpoint (str): Ключ endpoint ('s', 'm', ...)
+        Returns:
+            Any | None: Закэшированный ответ, None если записи нет
+        """
+        item = self._data.get((omeda_id, endpoint))
+        return item[1] if item is not None else None
+
+    def set(self, omeda_id: str, endpoint: str, value: Any) -> None:
+        """
+        Кладёт значение в кэш. None не кэшируется.
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            endpoint (str): Ключ endpoint ('s', 'm', ...)
+            value (Any): Ответ API
+        """
+        ttl = self._ttl_for(endpoint)
+        if value is None or ttl <= 0:
+            return
+
+        key = (omeda_id, endpoint)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        self._observe('store', endpoint)
+
+        while len(self._data) > self.maxsize:
+            evicted_key, _ = self._data.popitem(last=False)
+            self.evictions += 1
+            self._observe('eviction', evicted_key[1])
+            logger.debug(f"TTLCache: evicted {evicted_key}")
+
+    def invalidate(self, omeda_id: str, endpoint: str | None = None) -> None:
+        """
+        Удаляет записи игрока: для одного endpoint или для всех.
+        """
+        if endpoint is not None:
+            self._data.pop((omeda_id, endpoint), None)
+            return
+
+        for key in [key for key in self._data if key[0] == omeda_id]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        """
+        Очищает кэш. Счётчики не сбрасываются.
+        """
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает счётчики кэша.
+
+        Returns:
+            dict[str, int]: {'size', 'hits', 'misses', 'evictions', 'expirations'}
+        """
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,164 @@
+"""
+Запись и воспроизведение ответов omeda.city API (cassette).
+
+Режим record сохраняет успешные ответы API в компактный архив (gzip, JSON
+Lines): omeda_id, endpoint, время записи, время ответа и тело ответа.
+Режим replay отдаёт ответы из архива без обращения к сети, с
+необязательной имитацией задержки. Это позволяет прогонять ежедневное
+обновление и сессии чатов на одинаковых данных и сравнивать
+производительность между коммитами.
+
+Ответы одного (omeda_id, endpoint) воспроизводятся в порядке записи,
+последний ответ повторяется. Запросов, которых нет в архиве, в режиме
+replay "не существует": они ведут себя как ответ API со статусом,
+отличным от 200.
+
+Настройки (переменные окружения):
+    OMEDA_CASSETTE_MODE: off | record | replay
+    OMEDA_CASSETTE_PATH: путь к архиву
+    OMEDA_CASSETTE_LATENCY: фиксированная задержка ответа в replay (сек.)
+    OMEDA_CASSETTE_LATENCY_SCALE: множитель записанного времени ответа в replay
+"""
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+
+from collections import defaultdict
+
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+
+
+class Cassette:
+    """
+    Класс архива ответов API.
+    """
+
+    def __init__(self,
+        path: str,
+        mode: str,
+        latency: float = 0.0,
+        latency_scale: float = 0.0,
+        flush_every: int = 200):
+        """
+        Args:
+            path (str): Путь к архиву
+            mode (str): "record" или "replay"
+            latency (float): Фиксированная задержка ответа в replay (сек.)
+            latency_scale (float): Множитель записанного времени ответа в replay
+            flush_every (int): Сколько записей копить перед записью на диск
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Неизвестный режим cassette: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.flush_every = flush_every
+
+        self._buffer: list[dict] = []
+        # (omeda_id, endpoint) -> записи в порядке записи
+        self._records: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        self._positions: dict[tuple[str, str], int] = defaultdict(int)
+
+        if mode == "replay":
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "Cassette | None":
+        """
+        Создаёт cassette по переменным окружения, None если режим off
+        """
+        mode = os.getenv("OMEDA_CASSETTE_MODE", "off").lower()
+        if mode not in MODES:
+            raise ValueError(f"OMEDA_CASSETTE_MODE должен быть одним из {MODES}")
+        if mode == "off":
+            return None
+
+        return cls(
+            os.getenv("OMEDA_CASSETTE_PATH", "omeda_cassette.jsonl.gz"),
+            mode,
+            latency=float(os.getenv("OMEDA_CASSETTE_LATENCY", "0")),
+            latency_scale=float(os.getenv("OMEDA_CASSETTE_LATENCY_SCALE", "0")),
+        )
+
+    def _load(self) -> None:
+        count = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                record = json.loads(line)
+                self._records[(record['omeda_id'], record['endpoint'])].append(record)
+                count += 1
+
+        logger.info(f"Cassette {self.path}: загружено {count} ответов")
+
+    def record(self, omeda_id: str, endpoint: str, body: bytes, elapsed: float) -> None:
+        """
+        Добавляет ответ API в архив.
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            endpoint (str): Endpoint с параметрами запроса
+            body (bytes): Тело ответа
+            elapsed (float): Время ответа (сек.)
+        """
+        self._buffer.append({
+            'omeda_id': omeda_id,
+            'endpoint': endpoint,
+            'ts': round(time.time(), 3),
+            'elapsed': round(elapsed, 4),
+            'body': body.decode("utf-8"),
+        })
+
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Дописывает накопленные ответы в архив (gzip допускает дозапись).
+        """
+        if not self._buffer:
+            return
+
+        with gzip.open(self.path, "at", encoding="utf-8") as archive:
+            for record in self._buffer:
+                archive.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        logger.debug(f"Cassette {self.path}: записано {len(self._buffer)} ответов")
+        self._buffer.clear()
+
+    async def replay(self, omeda_id: str, endpoint: str) -> bytes | None:
+        """
+        Возвращает следующий записанный ответ для (omeda_id, endpoint).
+
+        Returns:
+            bytes | None: Тело ответа, None если такого запроса нет в архиве
+        """
+        key = (omeda_id, endpoint)
+        records = self._records.get(key)
+        if not records:
+            logger.debug(f"Cassette: нет записи для {key}")
+            return None
+
+        position = self._positions[key]
+        record = records[min(position, len(records) - 1)]
+        self._positions[key] = position + 1
+
+        delay = self.latency + self.latency_scale * record['elapsed']
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        return record['body'].encode("utf-8")
+
+    def close(self) -> None:
+        """
+        Сохраняет несохранённые ответы
+        """
+        if self.mode == "record":
+            self.flush()
@@ -0,0 +1,140 @@
+"""
+Circuit breaker для запросов к omeda.city API.
+
+Пока API отвечает, цепь замкнута и запросы идут как обычно. После
+failure_threshold неудачных попыток подряд (ошибка соединения, таймаут,
+статус 5xx или ответ дольше slow_call_threshold секунд) цепь размыкается:
+запросы сразу получают CircuitOpenError, и /delta отвечает последними
+известными данными вместо ожидания таймаутов.
+
+Через reset_timeout секунд цепь полуоткрывается и пропускает один пробный
+запрос: успех замыкает цепь, неудача снова размыкает её на reset_timeout.
+
+Ключевые особенности:
+    Медленный ответ (всплеск задержки) считается неудачей
+    В полуоткрытом состоянии одновременно выполняется только один пробный запрос;
+    вызывающий код освобождает его release_probe в finally, поэтому отменённый
+    или упавший до ответа пробный запрос не блокирует цепь
+    Результаты запросов, начатых до размыкания цепи, не влияют на её состояние
+    Переходы состояний передаются в on_state_change (метрики, логи)
+"""
+import logging
+import time
+
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    Запрос не выполнялся: цепь разомкнута (omeda.city недоступен)
+    """
+
+
+class CircuitBreaker:
+    """
+    Класс circuit breaker: closed -> open -> half_open -> closed.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self,
+        failure_threshold: int = 5,
+        slow_call_threshold: float = 5.0,
+        reset_timeout: float = 30.0,
+        on_state_change: Callable[[str], None] | None = None):
+        """
+        Args:
+            failure_threshold (int): Неудачных попыток подряд до размыкания
+            slow_call_threshold (float): Ответ дольше этого (сек.) - неудача
+            reset_timeout (float): Время до пробного запроса (сек.)
+            on_state_change (Callable | None): Вызывается с новым состоянием
+        """
+        self.failure_threshold = max(failure_threshold, 1)
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def retry_in(self) -> float:
+        """
+        Сколько секунд осталось до пробного запроса (0 - запросы разрешены)
+        """
+        if self.state != self.OPEN:
+            return 0.0
+
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос сейчас. В полуоткрытом состоянии
+        разрешает один пробный запрос до release_probe
+        """
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if self.retry_in() > 0:
+                return False
+            self._set_state(self.HALF_OPEN)
+
+        if self._probe_in_flight:
+            return False
+
+        self._probe_in_flight = True
+        return True
+
+    def release_probe(self) -> None:
+        """
+        Завершает пробный запрос (в т.ч. отменённый или не дошедший до API):
+        следующий allow в полуоткрытом состоянии разрешит новый
+        """
+        self._probe_in_flight = False
+
+    def record(self, ok: bool, elapsed: float, probe: bool = False) -> None:
+        """
+        Учитывает результат попытки запроса.
+
+        Args:
+            ok (bool): API ответил (не ошибка соединения и не 5xx)
+            elapsed (float): Время попытки (сек.)
+            probe (bool): Попытка пробного запроса. При разомкнутой цепи
+            учитываются только они: остальные начаты до размыкания
+        """
+        if self.state != self.CLOSED and not probe:
+            return
+
+        if ok and elapsed < self.slow_call_threshold:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+            return
+
+        self._failures += 1
+        if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self._failures >= self.failure_threshold):
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        if state == self.OPEN:
+            logger.warning(
+                f"omeda.city: цепь разомкнута после {self._failures} неудач подряд, "
+                f"пробный запрос через {self.reset_timeout:.0f} сек.")
+        else:
+            logger.info(f"omeda.city: цепь {state}")
+
+        if self.on_state_change is not None:
+            self.on_state_change(state)
@@ -7,38 +7,150 @@
     Добавление и удаление игроков из базы данных
     Получение информации о команде и performance scores
     Анализ изменений performance scores игроков
+    Статистика и динамика PS команды по истории в массивах NumPy
+    Общий рейтинг игроков всех чатов
+    Импорт списка игроков в чат (/import)
 
 Модуль обрабатывает парсинг данных игроков из внешнего API, управление 
 записями пользователей и выполнение различных аналитических операций 
 с performance scores игроков.
 """
+import os
+import csv
+import time
+import asyncio
 import logging
 import traceback
 
+from typing import TYPE_CHECKING
+from sqlalchemy.orm.exc import NoResultFound
+
 from utils.ps_analitic_tools import Analitic
-from utils.users_manager import UsersModel, UsersController
+from utils.ps_leaderboard import Leaderboard
+from utils.ps_match_ingest import MatchIngestor
+from utils.ps_metrics import registry
+from utils.ps_profiler import phase
+from utils.ps_report_cache import DeltaReport, DeltaReportCache
+from utils.ps_singleflight import SingleFlight
+from utils.users_manager import ChatMembershipModel, PlayerModel, UsersController
 import utils.ps_parser as ps_parser
 
+# NumPy (ps_team_analytics) импортируется при первом /stats или /trend,
+# а не при запуске бота
+if TYPE_CHECKING:
+    from utils.ps_team_analytics import PsHistoryFrame
+
 
 logger = logging.getLogger(__name__)
 uc = UsersController()
 
-async def player_ps_day_db_update():
+# Ограничение глубины /history: строка на день, сообщение Telegram <= 4096 символов
+MAX_HISTORY_DAYS = 90
+
+# Матчи игроков хранятся локально; лента матчей игрока запрашивается не чаще
+# MATCH_SYNC_TTL секунд (ежедневное обновление синхронизирует всех)
+MATCH_SYNC_TTL = float(os.getenv("MATCH_SYNC_TTL", "600"))
+match_ingestor = MatchIngestor(uc, sync_ttl=MATCH_SYNC_TTL)
+
+# Готовые отчёты /delta по чатам и окно их свежести (сек.)
+DELTA_REPORT_MAX_AGE = float(os.getenv("DELTA_REPORT_MAX_AGE", "120"))
+report_cache = DeltaReportCache(DELTA_REPORT_MAX_AGE)
+# Одновременные /delta в одном чате собирают отчёт один раз
+report_builds = SingleFlight()
+
+# Бюджет ответа /delta (сек.): к дедлайну отправляется отчёт из уже
+# полученных данных, остальные игроки помечаются как загружающиеся, и
+# сообщение редактируется, когда отчёт собран целиком, но не позже
+# DELTA_HARD_TIMEOUT сек. от начала запроса. Запросы к API не отменяются
+DELTA_DEADLINE = float(os.getenv("DELTA_DEADLINE", "3"))
+DELTA_HARD_TIMEOUT = float(os.getenv("DELTA_HARD_TIMEOUT", "30"))
+
+# Чаты, отчёт /delta которых собран из последних известных данных, пока
+# omeda.city был недоступен: chat_id -> omeda_id для пробного запроса.
+# Отчёты пересобираются фоновым обновлением после полуоткрытия цепи
+_stale_reports: dict[int, str] = {}
+_revalidation: asyncio.Task | None = None
+
+# История PS всех игроков в массивах NumPy для /stats и /trend. Меняется
+# только ежедневным обновлением, которое её сбрасывает; максимальный возраст
+# нужен воркерам webhook-режима, в которых обновление не запускается
+HISTORY_FRAME_MAX_AGE = float(os.getenv("HISTORY_FRAME_MAX_AGE", "3600"))
+_history_frame: tuple[float, "PsHistoryFrame"] | None = None
+_history_generation = 0
+history_loads = SingleFlight()
+# Окно скользящего среднего в /trend (дней с записями)
+TREND_WINDOW = 7
+
+# Общий рейтинг отслеживаемых игроков всех чатов (/top): строится из БД при
+# запуске (load_leaderboard) и дальше обновляется вместе с БД
+leaderboard = Leaderboard()
+TOP_LIMIT = 50
+# Период перестроения рейтинга в воркерах webhook-режима: изменения из
+# других процессов (добавление игроков, ежедневное обновление) видны с
+# задержкой не больше этого периода
+LEADERBOARD_REBUILD_INTERVAL = float(os.getenv("LEADERBOARD_REBUILD_INTERVAL", "600"))
+
+# /import: максимум строк за один импорт и одновременных проверок omeda_id
+# (остальные запросы к API не ждут, пока проверится весь список)
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "200"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "5"))
+
+DELTA_PARTIAL_REPLIES = registry.counter(
+    "ps_delta_partial_replies_total",
+    "Ответы /delta, отправленные к дедлайну до получения данных всех игроков",
+    ("result",))
+
+DAILY_UPDATE_PLAYERS = registry.counter(
+    "ps_daily_update_players_total",
+    "Игроки, обработанные ежедневным обновлением")
+# Без метки omeda_id: её значения не ограничены, игроки пишутся в лог
+DAILY_UPDATE_FAILURES = registry.counter(
+    "ps_daily_update_failures_total",
+    "Игроки, для которых не удалось получить PS при ежедневном обновлении")
+
+async def player_ps_day_db_update(
+    players_dict: dict[str, dict[str, str | int | float]] | None = None
+) -> int:
     """
     Сборная функция для ежедневного обновления PS в датабазе.
+    Каждый omeda_id запрашивается один раз, сколько бы чатов его ни отслеживало.
+
+    Args:
+        players_dict (dict | None): Игроки для обновления {omeda_id: {...}}
+        (см. UsersController.get_tracked_players). None - все отслеживаемые
+    Returns:
+        int: Количество игроков, для которых не удалось получить PS
     """
-    
-    users_dict = uc.get_users_and_omeda_id()
-    new_ps = await ps_parser.get_players_score_from_api(
-        users_dict,
-        last_match_ps=False
+    if players_dict is None:
+        players_dict = await uc.get_tracked_players()
+    # last_match_ps нужен для записи в историю PS: берём его из локально
+    # сохранённых матчей после принудительной синхронизации
+    new_ps, _ = await asyncio.gather(
+        ps_parser.get_players_score_from_api(players_dict, last_match_ps=False),
+        match_ingestor.fill_last_match_ps(players_dict, force=True),
         )
     
     await uc.update_player_ps_day(new_ps)
-
-    return None
-
-async def add_player_to_db(player_name: str, omeda_id: str, chat_id: int) -> None:
+    # player_ps_day изменился - старые отчёты /delta неактуальны
+    report_cache.clear()
+    invalidate_history_frame()
+    leaderboard.update_scores({
+        player['bd_id']: player['player_ps']
+        for player in new_ps.values() if player.get('player_ps')})
+
+    failed = [omeda_id for omeda_id, player in new_ps.items() if not player.get('player_ps')]
+    DAILY_UPDATE_FAILURES.inc(len(failed))
+    DAILY_UPDATE_PLAYERS.inc(len(new_ps))
+
+    if failed:
+        logger.warning(
+            f"Ежедневное обновление: не удалось обновить {len(failed)} игроков: "
+            f"{', '.join(failed)}")
+
+    return len(failed)
+
+async def add_player_to_db(player_name: str, omeda_id: str, chat_id: int,
+    player_ps: float | None = None) -> None:
     """
     Добавляет нового игрока в базу данных. +парсит его PS
 
@@ -46,6 +158,8 @@ async def add_player_to_db(player_name: str, omeda_id: str, chat_id: int) -> Non
         player_name (str): Никнейм игрока (макс. 25 символов)
         omeda_id (str): Omeda ID игрока (макс. 40 символов)
         chat_id (int): ID чата, к которому привязан игрок
+        player_ps (float | None): PS, уже полученный при проверке omeda_id
+        (None - запросить из API)
 
     Returns:
         None: 
@@ -54,12 +168,16 @@ async def add_player_to_db(player_name: str, omeda_id: str, chat_id: int) -> Non
         ValueError: Если данные не соответствуют ограничениям
         Exeption: При прочих ошибках при добавлении в БД
     """
-    player_ps = await ps_parser.get_player_ps_from_api(omeda_id)
-    await uc.add_player(player_name, omeda_id, chat_id, player_ps)
+    if player_ps is None:
+        player_ps = await ps_parser.get_player_ps_from_api(omeda_id)
+    player = await uc.add_player(player_name, omeda_id, chat_id, player_ps)
+    report_cache.invalidate(chat_id)
+    if player['bd_id'] not in leaderboard:
+        leaderboard.set(player['bd_id'], omeda_id, player['player_ps_day'])
 
     return None
 
-def del_player_from_db(player_name: str, chat_id: int) -> None:
+async def del_player_from_db(player_name: str, chat_id: int) -> None:
     """
     Удаляет игрока из базы данных.
 
@@ -71,11 +189,14 @@ def del_player_from_db(player_name: str, chat_id: int) -> None:
     Raises:
         Exception: При ошибках во время удаления из БД
     """
-    uc.del_player_from_db(player_name, chat_id)
+    untracked = await uc.del_player_from_db(player_name, chat_id)
+    report_cache.invalidate(chat_id)
+    if untracked is not None:
+        leaderboard.remove(untracked)
     return None
     
 
-def get_team(chat_id: int) -> dict:
+async def get_team(chat_id: int) -> dict:
     """
     Возвращает словарь {name:{omeda_id},}
 
@@ -86,7 +207,7 @@ def get_team(chat_id: int) -> dict:
     Raises:
         Exception: Если не удалось импортировать игроков из БД
     """
-    return uc.get_users_and_omeda_id(chat_id)
+    return await uc.get_users_and_omeda_id(chat_id)
 
 
 async def get_team_ps(chat_id: int) -> dict:
@@ -103,10 +224,16 @@ async def get_team_ps(chat_id: int) -> dict:
     Raises:
         Exception: Если не удалось cпарсить данные с API omeda
     """
-    team = get_team(chat_id)
+    team = await get_team(chat_id)
 
     try:
-        team_ps_dict = await ps_parser.get_players_score_from_api(team)
+        # avg PS из API, PS последнего матча - из локально сохранённых матчей
+        # Если API не ответил, берутся последние известные значения (stale)
+        team_ps_dict, _ = await asyncio.gather(
+            ps_parser.get_players_score_from_api(
+                team, last_match_ps=False, stale_fallback=True),
+            match_ingestor.fill_last_match_ps(team),
+            )
         logger.debug(f"team_ps_dict: {team_ps_dict}")
         logger.info(f"chat_id: {chat_id}. Получили данные о PS игроков из БД")
         return team_ps_dict
@@ -159,52 +286,576 @@ async def get_start_and_end_users_dict_for_delta(chat_id:int
         Exception: При ошибках во время парсинга PS
     """
 
-    data_from_db = uc.get_users_and_omeda_id(chat_id)
+    data_from_db = await uc.get_users_and_omeda_id(chat_id)
     if is_chat_users_empty(data_from_db):
         return None
 
-    new_data_from_api = sort_players_by_score(await get_team_ps(chat_id))
+    team_ps = await get_team_ps(chat_id)
+    with phase("render"):
+        new_data_from_api = sort_players_by_score(team_ps)
 
     logger.debug(f"DELTA_START: {data_from_db}")
     logger.debug(f"DELTA_END: {new_data_from_api}")
 
     return (data_from_db, new_data_from_api)
 
-async def players_ps_delta(chat_id:int) -> str | None:
+async def players_ps_delta(chat_id: int, sort: str = 'avg', page: int = 0
+) -> tuple[str, int] | None:
     """
-    Возвращает строку с дельтой PS игроков
+    Возвращает страницу отчёта с дельтой PS игроков и возрастом данных.
+    Свежий отчёт отдаётся из report_cache без запросов к БД и API.
+
     Args:
         chat_id (int): Идентификатор чата.
+        sort (str): Порядок строк ('avg', 'delta', 'last')
+        page (int): Номер страницы (с 0)
     Returns:
-        str | None: Строка с дельтой PS игроков
+        tuple[str, int] | None: Страница отчёта и количество страниц,
+        None если в чате нет игроков
     Raises:
         Exception: При ошибках во время парсинга PS и/или в БД
     """
-    
-    delta = Analitic.difference_players_score_records(
-        *await get_start_and_end_users_dict_for_delta(chat_id))
-    
-    return delta
+    report = report_cache.get(chat_id)
 
-async def is_valid_omeda_id(omeda_id:str) -> bool:
+    if report is None:
+        report = await report_builds.do(
+            chat_id, lambda: build_delta_report(chat_id))
+
+    if report is None:
+        return None
+
+    return delta_report_page(report, sort, page)
+
+async def players_ps_delta_within(chat_id: int, deadline: float = DELTA_DEADLINE
+) -> tuple[tuple[str, int] | None, asyncio.Future | None]:
     """
-    Проверяет ответ omda API по заданному omeda_id.
+    Первая страница отчёта /delta не позже deadline секунд. Если отчёт не
+    собран к дедлайну, возвращается частичный отчёт (см. partial_delta_page)
+    и сборка полного, которая продолжает выполняться.
 
-    Arg:
-    omeda_id: str 
+    Args:
+        chat_id (int): Идентификатор чата.
+        deadline (float): Бюджет ответа (сек.)
+    Returns:
+        tuple: (страница и количество страниц или None, если в чате нет
+        игроков; сборка полного отчёта или None, если отчёт уже полный)
+    Raises:
+        Exception: При ошибках во время парсинга PS и/или в БД
+    """
+    report = report_cache.get(chat_id)
+    if report is not None:
+        return delta_report_page(report, 'avg', 0), None
+
+    build = asyncio.ensure_future(
+        report_builds.do(chat_id, lambda: build_delta_report(chat_id)))
+    done, _ = await asyncio.wait({build}, timeout=deadline)
+    if done:
+        report = build.result()
+        return (delta_report_page(report, 'avg', 0) if report is not None else None), None
+
+    DELTA_PARTIAL_REPLIES.inc(result="partial")
+    return await partial_delta_page(chat_id), build
+
+async def finish_delta(chat_id: int, build: asyncio.Future,
+    timeout: float = DELTA_HARD_TIMEOUT - DELTA_DEADLINE) -> tuple[str, int] | None:
+    """
+    Дожидается полного отчёта /delta после частичного ответа.
+    Если он не собран за timeout секунд, возвращает частичный отчёт, в котором
+    игроки без ответа API показаны с последними известными данными, а сборка
+    продолжается (её отчёт попадёт в report_cache).
 
-    Return: bool 
+    Args:
+        chat_id (int): Идентификатор чата.
+        build (asyncio.Future): Сборка отчёта (см. players_ps_delta_within)
+        timeout (float): Сколько ещё ждать сборку (сек.)
+    Returns:
+        tuple[str, int] | None: Страница отчёта и количество страниц,
+        None если в чате не осталось игроков
+    Raises:
+        Exception: При ошибках во время сборки отчёта
     """
+    try:
+        report = await asyncio.wait_for(asyncio.shield(build), max(timeout, 0.0))
+    except asyncio.TimeoutError:
+        # Ошибка сборки после таймаута уже никому не нужна
+        build.add_done_callback(lambda done: done.cancelled() or done.exception())
+        DELTA_PARTIAL_REPLIES.inc(result="timeout")
+        return await partial_delta_page(chat_id, timed_out=True)
+
+    DELTA_PARTIAL_REPLIES.inc(result="complete")
+    return delta_report_page(report, 'avg', 0) if report is not None else None
+
+async def partial_delta_page(chat_id: int, timed_out: bool = False
+) -> tuple[str, int] | None:
+    """
+    Первая страница отчёта /delta из уже полученных данных: avg PS из
+    свежих ответов в кэше API, PS последнего матча - из сохранённых матчей.
+    Игроки без ответа API показываются с последними известными данными и
+    помечаются как загружающиеся (или устаревшие, если timed_out).
 
-    if await ps_parser.fetch_api_data(omeda_id) is None:
-        return False
-    else:
-        return True
+    Args:
+        chat_id (int): Идентификатор чата.
+        timed_out (bool): Ответа больше не ждём (жёсткий таймаут)
+    Returns:
+        tuple[str, int] | None: Страница и количество страниц,
+        None если в чате нет игроков
+    """
+    data_start = await uc.get_users_and_omeda_id(chat_id)
+    if is_chat_users_empty(data_start):
+        return None
+
+    team = {name: dict(player) for name, player in data_start.items()}
+    last_match_ps = await uc.get_last_match_ps(
+        [player['omeda_id'] for player in team.values()])
+
+    with phase("render"):
+        not_ready = 0
+        for player in team.values():
+            player['last_match_ps'] = last_match_ps.get(player['omeda_id'], 0)
+            # peek: проверка кэша не считается обращением (метрики кэша)
+            cached = ps_parser.response_cache.peek(player['omeda_id'], 's')
+            if cached and cached.get(ps_parser.DATA_FOR_EXTRACTION) is not None:
+                player['player_ps'] = round(cached[ps_parser.DATA_FOR_EXTRACTION], 2)
+                continue
+
+            not_ready += 1
+            player['player_ps'] = ps_parser.get_stale_value(player, 'player_ps') or 0
+            player['stale' if timed_out else 'pending'] = True
+
+        pages = Analitic.paginate(
+            Analitic.delta_rows(data_start, sort_players_by_score(team)),
+            Analitic.delta_header())
+        footer = (Analitic.stale_line(not_ready) if timed_out
+            else Analitic.pending_line(not_ready))
+
+        return pages[0] + footer, len(pages)
+
+def cached_delta_page(chat_id: int, sort: str, page: int) -> tuple[str, int] | None:
+    """
+    Страница уже собранного отчёта /delta (листание), без запросов к БД и API.
+
+    Args:
+        chat_id (int): Идентификатор чата.
+        sort (str): Порядок строк ('avg', 'delta', 'last')
+        page (int): Номер страницы (с 0)
+    Returns:
+        tuple[str, int] | None: Страница отчёта и количество страниц,
+        None если отчёт чата сброшен
+    """
+    report = report_cache.peek(chat_id)
+    if report is None:
+        return None
+
+    return delta_report_page(report, sort, page)
+
+def delta_report_page(report: DeltaReport, sort: str, page: int) -> tuple[str, int]:
+    """
+    Страница отчёта с нужной сортировкой. Отчёт рендерится в страницы один
+    раз для каждой сортировки, номер страницы ограничивается их количеством.
+    """
+    pages = report.pages.get(sort)
+    if pages is None:
+        with phase("render"):
+            pages = Analitic.paginate(
+                Analitic.delta_rows(report.data_start, report.data_end, sort),
+                Analitic.delta_header())
+        report.pages[sort] = pages
+
+    page = max(0, min(page, len(pages) - 1))
+    return (pages[page] + Analitic.report_age_line(report.age())
+        + Analitic.stale_line(report.stale), len(pages))
+
+async def build_delta_report(chat_id: int) -> DeltaReport | None:
+    """
+    Собирает отчёт /delta для чата и кладёт его в report_cache.
+
+    Args:
+        chat_id (int): Идентификатор чата.
+    Returns:
+        DeltaReport | None: Отчёт, None если в чате нет игроков
+    """
+    version = report_cache.version(chat_id)
+    delta_data = await get_start_and_end_users_dict_for_delta(chat_id)
+    if delta_data is None:
+        return None
+
+    with phase("render"):
+        header = Analitic.delta_header()
+        rows = Analitic.delta_rows(*delta_data)
+        report = DeltaReport(header + "".join(rows), *delta_data)
+        report.pages['avg'] = Analitic.paginate(rows, header)
+    report_cache.set(chat_id, report, version)
+    logger.info(f"chat_id: {chat_id}. Отчёт /delta собран")
+
+    if report.stale and not ps_parser.circuit_breaker.closed:
+        stale_omeda_id = next(
+            player['omeda_id'] for player in report.data_end.values() if player.get('stale'))
+        schedule_revalidation(chat_id, stale_omeda_id)
+
+    return report
+
+def schedule_revalidation(chat_id: int, omeda_id: str) -> None:
+    """
+    Ставит отчёт чата на фоновое обновление после восстановления omeda.city.
+
+    Args:
+        chat_id (int): Идентификатор чата.
+        omeda_id (str): Игрок с устаревшими данными (для пробного запроса)
+    """
+    global _revalidation
+    _stale_reports[chat_id] = omeda_id
+    if _revalidation is None or _revalidation.done():
+        _revalidation = asyncio.create_task(revalidate_stale_reports())
+
+async def revalidate_stale_reports() -> None:
+    """
+    Фоновое обновление отчётов /delta, собранных из последних известных
+    данных. Ждёт полуоткрытия цепи, проверяет omeda.city пробным запросом и
+    после его успеха пересобирает отчёты чатов (ответы API - в кэше).
+    Пока пробный запрос неудачен, цепь снова размыкается и ожидание повторяется.
+    """
+    breaker = ps_parser.circuit_breaker
+
+    while _stale_reports:
+        # Не чаще раза в секунду: пробный запрос может выполнять другой хэндлер
+        await asyncio.sleep(max(breaker.retry_in(), 1.0))
+
+        chat_id, omeda_id = next(iter(_stale_reports.items()))
+        try:
+            await ps_parser.fetch_api_data(omeda_id, use_cache=False)
+        except Exception as e:
+            logger.info(f"Пробный запрос к omeda.city неудачен: {e!r}")
+            if breaker.closed:
+                # Ошибка этого игрока, а не недоступность API
+                _stale_reports.pop(chat_id, None)
+            continue
+
+        if not breaker.closed:
+            continue
+
+        for chat_id in list(_stale_reports):
+            _stale_reports.pop(chat_id, None)
+            try:
+                await report_builds.do(chat_id, lambda: build_delta_report(chat_id))
+            except Exception as e:
+                logger.error(f"chat_id: {chat_id}. Ошибка обновления отчёта /delta: {e}")
+                logger.error(traceback.format_exc())
+
+        logger.info("Отчёты /delta с устаревшими данными обновлены")
+
+async def player_ps_history(player_name: str, chat_id: int, days: int
+) -> str:
+    """
+    Возвращает строку с историей PS игрока за последние days дней.
+    Данные берутся только из БД, без запросов к API.
+
+    Args:
+        player_name (str): Имя игрока в чате
+        chat_id (int): ID чата
+        days (int): Глубина истории в днях (не более MAX_HISTORY_DAYS)
+    Returns:
+        str: Строка с историей PS
+    Raises:
+        NoResultFound: Если игрока с таким именем нет в чате
+    """
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+    since = int(time.time()) - days * 24 * 60 * 60
+
+    history = await uc.get_player_history(player_name, chat_id, since)
+
+    with phase("render"):
+        return Analitic.player_history_records(player_name, days, history)
+
+def invalidate_history_frame() -> None:
+    """
+    Сбрасывает загруженную историю PS (после записи новой истории)
+    """
+    global _history_frame, _history_generation
+    _history_frame = None
+    _history_generation += 1
+
+async def get_history_frame() -> "PsHistoryFrame":
+    """
+    История PS всех игроков за MAX_HISTORY_DAYS дней в массивах NumPy.
+    Загружается из БД одним запросом и переиспользуется всеми чатами.
+    """
+    cached = _history_frame
+    if cached is not None and time.monotonic() - cached[0] < HISTORY_FRAME_MAX_AGE:
+        return cached[1]
+
+    return await history_loads.do('all', _load_history_frame)
+
+async def _load_history_frame() -> "PsHistoryFrame":
+    from utils.ps_team_analytics import DAY, PsHistoryFrame
+
+    global _history_frame
+    generation = _history_generation
+    since = int(time.time()) - MAX_HISTORY_DAYS * DAY
+
+    columns = await uc.get_history_columns(since)
+    with phase("render"):
+        frame = await asyncio.to_thread(PsHistoryFrame.from_columns, *columns)
+
+    # История сброшена во время загрузки - загруженное уже неактуально
+    if generation == _history_generation:
+        _history_frame = (time.monotonic(), frame)
+    logger.info(f"История PS загружена: {len(frame)} игроков, {len(frame.days)} дн.")
+
+    return frame
+
+async def players_team_stats(chat_id: int, days: int) -> str | None:
+    """
+    Возвращает таблицу статистики игроков чата: место, средний PS,
+    изменение за days дней, перцентиль среди всех игроков бота, z-оценка
+    в команде и текущая серия роста/падения. Данные берутся только из
+    истории PS в БД, без запросов к API.
+
+    Args:
+        chat_id (int): Идентификатор чата.
+        days (int): Период изменения PS (не более MAX_HISTORY_DAYS)
+    Returns:
+        str | None: Таблица (первая страница), None если в чате нет игроков
+    """
+    team = await get_team(chat_id)
+    if not team:
+        return None
+
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+    frame = await get_history_frame()
+
+    from utils.ps_team_analytics import team_stats
+
+    with phase("render"):
+        players = [(name, player['omeda_id']) for name, player in team.items()]
+        stats = team_stats(frame, [player['bd_id'] for player in team.values()], days)
+
+        header = Analitic.team_stats_header(days)
+        pages = Analitic.paginate(Analitic.team_stats_rows(players, stats), header)
+        if len(pages) == 1:
+            return pages[0]
+
+        shown = pages[0].count("\n") - header.count("\n")
+        return pages[0] + f"\n<i>Показаны первые {shown} из {len(players)} игроков</i>"
+
+async def team_ps_trend(chat_id: int, days: int) -> str | None:
+    """
+    Возвращает средний PS команды по дням за последние days дней
+    со скользящим средним за TREND_WINDOW дней.
+
+    Args:
+        chat_id (int): Идентификатор чата.
+        days (int): Глубина в днях (не более MAX_HISTORY_DAYS)
+    Returns:
+        str | None: Строка с динамикой PS, None если в чате нет игроков
+    """
+    team = await get_team(chat_id)
+    if not team:
+        return None
+
+    days = max(1, min(days, MAX_HISTORY_DAYS))
+    frame = await get_history_frame()
+
+    from utils.ps_team_analytics import team_trend
+
+    with phase("render"):
+        trend = team_trend(
+            frame, [player['bd_id'] for player in team.values()], days, TREND_WINDOW)
+        return Analitic.team_trend_records(days, trend)
+
+async def load_leaderboard() -> int:
+    """
+    Строит общий рейтинг из БД за один потоковый проход. Вызывается при
+    запуске, до обработки апдейтов.
+
+    Returns:
+        int: Количество игроков в рейтинге
+    """
+    # Индекс строится в потоке БД, а подменяется здесь, в потоке event loop,
+    # поэтому top/set/remove не видят наполовину заменённый рейтинг
+    index = await uc.scan_player_scores(Leaderboard.build_index)
+    leaderboard.replace(index)
+    logger.info(f"Рейтинг игроков построен: {len(leaderboard)} игроков")
+
+    return len(leaderboard)
+
+async def rebuild_leaderboard_forever(interval: float = LEADERBOARD_REBUILD_INTERVAL) -> None:
+    """
+    Периодически перестраивает рейтинг из БД (для воркеров webhook-режима)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_leaderboard()
+        except Exception as e:
+            logger.error(f"Не удалось перестроить рейтинг игроков: {e}")
+
+async def top_players(limit: int, chat_id: int) -> str:
+    """
+    Возвращает первых limit игроков общего рейтинга всех чатов.
+    Рейтинг берётся из индекса в памяти, без запросов к API. Игроки чата
+    показываются под именами этого чата, остальные - по omeda_id: имена,
+    которые дали игроку другие чаты, не раскрываются.
+
+    Args:
+        limit (int): Количество игроков (не более TOP_LIMIT)
+        chat_id (int): Чат, запросивший рейтинг
+    Returns:
+        str: Таблица рейтинга
+    """
+    limit = max(1, min(limit, TOP_LIMIT))
+    top = leaderboard.top(limit)
+    chat_names = {
+        player['bd_id']: name for name, player in (await get_team(chat_id)).items()}
+
+    with phase("render"):
+        return Analitic.leaderboard_records(
+            [(place, omeda_id, chat_names.get(player_id), score)
+             for place, player_id, omeda_id, score in top],
+            len(leaderboard))
+
+async def player_rank(player_name: str, chat_id: int) -> str:
+    """
+    Возвращает место игрока чата в общем рейтинге.
+
+    Args:
+        player_name (str): Имя игрока в чате
+        chat_id (int): ID чата
+    Returns:
+        str: Строка с местом и PS игрока
+    Raises:
+        NoResultFound: Если игрока с таким именем нет в чате
+    """
+    player = (await get_team(chat_id)).get(player_name)
+    if player is None:
+        raise NoResultFound("Пользователь не найден")
+
+    rank = leaderboard.rank(player['bd_id'])
+    if rank is None:
+        return f"{player_name} ещё не в рейтинге"
+
+    return (
+        f"{player_name}: место {rank} из {len(leaderboard)} "
+        f"(PS {player['player_ps_day']:.2f})"
+        )
+
+def parse_import_rows(text: str) -> list[tuple[int, str, str | None]]:
+    """
+    Разбирает список игроков для /import: строка "имя,omeda_id" (CSV,
+    также через ";") или "имя omeda_id". Пустые строки, комментарии (#)
+    и заголовок "name,omeda_id" пропускаются.
+
+    Args:
+        text (str): Вставленный список или содержимое CSV-файла
+    Returns:
+        list[tuple[int, str, str | None]]: Список (номер строки, имя,
+        omeda_id); у строк неверного формата omeda_id - None
+    """
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        fields = line.rsplit(maxsplit=1)
+        for delimiter in (",", ";"):
+            parsed = next(csv.reader([line], delimiter=delimiter))
+            if len(parsed) == 2:
+                fields = parsed
+                break
+        fields = [field.strip() for field in fields]
+
+        if [field.lower() for field in fields] == ["name", "omeda_id"]:
+            continue
+        if len(fields) != 2 or not all(fields):
+            rows.append((line_no, line, None))
+            continue
+
+        rows.append((line_no, fields[0], fields[1]))
+
+    return rows
+
+async def import_players(text: str, chat_id: int) -> list[str]:
+    """
+    Добавляет в чат список игроков. Все omeda_id проверяются одновременно
+    (не более IMPORT_CONCURRENCY запросов), ответ проверки сразу даёт
+    начальный player_ps_day, прошедшие проверку игроки добавляются в БД
+    одной транзакцией.
+
+    Args:
+        text (str): Список игроков (см. parse_import_rows)
+        chat_id (int): ID чата
+    Returns:
+        list[str]: Страницы отчёта с результатом по каждой строке
+    Raises:
+        Exception: При ошибках записи в БД
+    """
+    rows = parse_import_rows(text)
+    statuses: dict[int, str] = {}
+    taken = set(await get_team(chat_id))
+    seen = set()
+    candidates = []
+
+    for index, (line_no, name, omeda_id) in enumerate(rows):
+        if index >= IMPORT_MAX_ROWS:
+            statuses[line_no] = f"❌ больше {IMPORT_MAX_ROWS} строк за раз"
+        elif omeda_id is None:
+            statuses[line_no] = "❌ нужен формат имя,omeda_id"
+        elif not is_valid_name(name):
+            statuses[line_no] = f"❌ имя длиннее {ChatMembershipModel.NAME_LEN} символов"
+        elif len(omeda_id) > PlayerModel.OMEDA_ID_LEN:
+            statuses[line_no] = "❌ некорректный Omeda ID"
+        elif name in taken:
+            statuses[line_no] = "❌ имя уже есть в чате"
+        elif name in seen:
+            statuses[line_no] = "❌ имя повторяется в списке"
+        else:
+            seen.add(name)
+            candidates.append((line_no, name, omeda_id))
+
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+
+    async def validate(omeda_id: str) -> float | None:
+        async with semaphore:
+            return await ps_parser.get_valid_player_ps(omeda_id)
+
+    checks = await asyncio.gather(
+        *(validate(omeda_id) for _, _, omeda_id in candidates), return_exceptions=True)
+
+    valid = []
+    for (line_no, name, omeda_id), player_ps in zip(candidates, checks):
+        if isinstance(player_ps, BaseException):
+            logger.error(f"import_players: {omeda_id}: {player_ps!r}")
+            statuses[line_no] = "❌ omeda.city не ответил, повторите позже"
+        elif player_ps is None:
+            statuses[line_no] = "❌ Omeda ID не найден"
+        else:
+            valid.append((line_no, name, omeda_id, player_ps))
+
+    if valid:
+        added = await uc.add_players(
+            chat_id, [(name, omeda_id, player_ps) for _, name, omeda_id, player_ps in valid])
+        report_cache.invalidate(chat_id)
+
+        for (line_no, name, omeda_id, _), player in zip(valid, added):
+            if player is None:
+                statuses[line_no] = "❌ имя уже есть в чате"
+                continue
+
+            statuses[line_no] = f"✅ добавлен, PS {player['player_ps_day']:.2f}"
+            if player['bd_id'] not in leaderboard:
+                leaderboard.set(player['bd_id'], omeda_id, player['player_ps_day'])
+
+    logger.info(f"chat_id: {chat_id}. Импорт: {len(valid)} из {len(rows)} строк")
+
+    with phase("render"):
+        header, lines = Analitic.import_summary(
+            [(line_no, name, statuses[line_no]) for line_no, name, _ in rows])
+        return Analitic.paginate(lines, header)
 
 def is_valid_name(name:str) -> bool:
     """
     Проверяет длинну введённого никнейма. Может быть не более 25 символов
-    (ограничение ДБ в UsersModel)
+    (ограничение ДБ в ChatMembershipModel)
 
     Arg:
     name:str 
@@ -212,7 +863,7 @@ def is_valid_name(name:str) -> bool:
     Return: bool
     """
 
-    if len(name) > UsersModel.NAME_LEN:
+    if len(name) > ChatMembershipModel.NAME_LEN:
         return False
     else:
         return True
@@ -0,0 +1,208 @@
+"""
+Планировщик запросов к omeda.city API.
+
+Все HTTP-запросы модуля ps_parser проходят через FetchScheduler, который
+ограничивает нагрузку на API:
+    Количество одновременных запросов (asyncio.Semaphore)
+    Количество запросов в секунду (token bucket)
+    Повтор запроса при ответах 429/503 с учётом заголовка Retry-After
+    Таймауты aiohttp.ClientTimeout на соединение, чтение и запрос целиком
+
+Пока API просит подождать (Retry-After), новые запросы не отправляются:
+пауза применяется ко всему token bucket, а не только к одному запросу.
+"""
+import asyncio
+import logging
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Класс ограничителя частоты запросов по алгоритму token bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        Args:
+            rate (float): Количество запросов в секунду. 0 - без ограничения
+            capacity (float | None): Размер "пачки" запросов. По умолчанию = rate
+        """
+        self.rate = rate
+        self.capacity = max(capacity if capacity is not None else rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def pause(self, delay: float) -> None:
+        """
+        Запрещает выдачу токенов на delay секунд (Retry-After).
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    async def acquire(self) -> None:
+        """
+        Ждёт, пока можно будет отправить очередной запрос.
+        """
+        if self.rate <= 0 and self._paused_until <= time.monotonic():
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                if self.rate <= 0:
+                    return
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Разбирает заголовок Retry-After (секунды или HTTP-дата).
+
+    Args:
+        value (str | None): Значение заголовка
+    Returns:
+        float | None: Задержка в секундах или None, если заголовок не разобран
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class FetchScheduler:
+    """
+    Класс планировщика HTTP-запросов с ограничением конкурентности и частоты.
+    """
+
+    def __init__(self,
+        max_concurrency: int = 10,
+        rate: float = 10.0,
+        burst: float | None = None,
+        max_retries: int = 3,
+        max_retry_after: float = 60.0,
+        backoff: float = 1.0,
+        timeout: aiohttp.ClientTimeout | None = None,
+        observer: Callable[[str, str, float], None] | None = None):
+        """
+        Args:
+            max_concurrency (int): Максимум одновременных запросов
+            rate (float): Запросов в секунду (0 - без ограничения)
+            burst (float | None): Размер token bucket
+            max_retries (int): Сколько раз повторять запрос после 429/503
+            max_retry_after (float): Верхняя граница ожидания по Retry-After (сек.)
+            backoff (float): Базовая задержка, если Retry-After не передан (сек.)
+            timeout (aiohttp.ClientTimeout | None): Таймауты запроса
+            observer (Callable | None): Вызывается после каждой попытки запроса
+            с (url, статус или "error", время попытки в сек.), например для метрик
+        """
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.backoff = backoff
+        self.timeout = timeout or aiohttp.ClientTimeout(total=15)
+        self.bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.observer = observer
+
+    def _retry_delay(self, response: aiohttp.ClientResponse, attempt: int) -> float:
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = self.backoff * (2 ** attempt)
+
+        return min(delay, self.max_retry_after)
+
+    async def get(self,
+        session: aiohttp.ClientSession,
+        url: str,
+        handler: Callable[[aiohttp.ClientResponse], Awaitable[Any]]) -> Any | None:
+        """
+        Выполняет GET-запрос с учётом ограничений.
+
+        Args:
+            session (aiohttp.ClientSession): Сессия для запроса
+            url (str): Адрес запроса
+            handler (Callable): Корутина, обрабатывающая ответ со статусом 200
+        Returns:
+            Any | None: Результат handler или None, если статус ответа отличен
+            от 200 (в т.ч. 429/503 после исчерпания повторов)
+        Raises:
+            aiohttp.ClientError при ошибках соединения
+            asyncio.TimeoutError при превышении таймаута
+        """
+        attempt = 0
+
+        while True:
+            retry_delay = None
+
+            async with self._semaphore:
+                await self.bucket.acquire()
+
+                started = time.perf_counter()
+                status = "error"
+                try:
+                    async with session.get(url, timeout=self.timeout) as response:
+                        logger.debug(f"Response URL: {url}")
+                        logger.debug(f"Response status: {response.status}")
+                        status = str(response.status)
+
+                        if response.status == 200:
+                            return await handler(response)
+
+                        if (response.status not in RETRY_STATUSES
+                                or attempt >= self.max_retries):
+                            logger.warning(f"{url}: статус ответа {response.status}")
+                            return None
+
+                        retry_delay = self._retry_delay(response, attempt)
+                finally:
+                    if self.observer is not None:
+                        self.observer(url, status, time.perf_counter() - started)
+
+            # Ждём вне семафора, чтобы не занимать слот
+            logger.warning(
+                f"{url}: статус {response.status}, повтор через {retry_delay:.1f} сек.")
+            self.bucket.pause(retry_delay)
+            await asyncio.sleep(retry_delay)
+            attempt += 1
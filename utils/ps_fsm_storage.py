@@ -0,0 +1,273 @@
+"""
+Хранилище состояний FSM aiogram в локальной базе SQLite.
+
+В отличие от MemoryStorage состояния диалогов (/add_player, /del_player)
+и их данные (messages, user_id, player_name) переживают перезапуск бота и
+доступны всем процессам-воркерам webhook-режима (SQLite в режиме WAL).
+
+Ключевые особенности:
+    Запись пачками: изменения состояния и данных, сделанные за
+    flush_interval секунд (обычно один шаг диалога: update_data + set_state),
+    пишутся одной транзакцией в потоке executor'а
+    Чтение видит ещё не записанные изменения своего процесса
+    Брошенные диалоги истекают через ttl секунд после последнего изменения
+    и периодически удаляются из БД
+
+Настройки (переменные окружения):
+    FSM_DB_URL: адрес БД (по умолчанию sqlite:///fsm_state.db)
+    FSM_TTL: время жизни неизменяемого состояния (сек.)
+    FSM_FLUSH_INTERVAL: окно накопления изменений перед записью (сек.)
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import (
+    create_engine, event, Column, Float, MetaData, String, Table, Text, delete, select
+    )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+logger = logging.getLogger(__name__)
+
+FSM_DB_URL = os.getenv("FSM_DB_URL", "sqlite:///fsm_state.db")
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.05"))
+
+metadata = MetaData()
+
+fsm_states = Table(
+    'fsm_states', metadata,
+    Column('key', String(255), primary_key=True),
+    Column('state', String(255), nullable=False),
+    # Unix time последнего изменения
+    Column('updated_at', Float, nullable=False, index=True),
+)
+
+fsm_data = Table(
+    'fsm_data', metadata,
+    Column('key', String(255), primary_key=True),
+    # JSON
+    Column('data', Text, nullable=False),
+    Column('updated_at', Float, nullable=False, index=True),
+)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Класс хранилища FSM в SQLite.
+    """
+
+    def __init__(self,
+        db_url: str = FSM_DB_URL,
+        ttl: float = FSM_TTL,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        purge_interval: float = 600.0,
+        key_builder: KeyBuilder | None = None):
+        """
+        Args:
+            db_url (str): Адрес БД SQLite
+            ttl (float): Время жизни состояния без изменений (сек.)
+            flush_interval (float): Окно накопления изменений перед записью (сек.)
+            purge_interval (float): Период удаления истёкших состояний (сек.)
+            key_builder (KeyBuilder | None): Построение ключа из StorageKey
+        """
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        # Engine и таблицы создаются при первом обращении к БД (в потоке
+        # executor'а), поэтому создание хранилища не трогает диск
+        self.db_url = db_url
+        self._engine = None
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-db")
+        # Изменения, ещё не переданные на запись: key -> {'state'/'data': value}
+        self._pending: dict[str, dict[str, str | None]] = {}
+        # Пачки, которые пишутся сейчас (от старых к новым)
+        self._in_flight: list[dict[str, dict[str, str | None]]] = []
+        self._flush_task: asyncio.Task | None = None
+        self._last_purge = 0.0
+        self._closed = False
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._open()
+        return self._engine
+
+    def _open(self, create_schema: bool = True) -> None:
+        # Все обращения к БД идут через однопоточный executor, поэтому
+        # повторное создание engine невозможно
+        if self._engine is None:
+            engine = self._create_engine()
+            if create_schema:
+                metadata.create_all(engine)
+            self._engine = engine
+
+    def _create_engine(self):
+        engine = create_engine(self.db_url, connect_args={'check_same_thread': False})
+        event.listen(engine, 'connect', _set_sqlite_pragma)
+        return engine
+
+    async def startup(self, create_schema: bool = True) -> None:
+        """
+        Явно открывает БД состояний (фаза запуска бота)
+
+        Args:
+            create_schema (bool): Создать таблицы. Воркеры webhook получают
+            готовую схему от фронтового процесса (см. create_schema)
+        """
+        await self._run(self._open, create_schema)
+
+    def create_schema(self) -> None:
+        """
+        Создаёт таблицы через отдельное соединение. В webhook-режиме
+        вызывается один раз во фронтовом процессе до запуска воркеров
+        """
+        engine = self._create_engine()
+        try:
+            metadata.create_all(engine)
+        finally:
+            engine.dispose()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    def _stage(self, key: StorageKey, field: str, value: str | None) -> None:
+        """
+        Ставит изменение в очередь на запись
+        """
+        self._pending.setdefault(self.key_builder.build(key), {})[field] = value
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def _overlay(self, key: str, field: str) -> tuple[bool, str | None]:
+        """
+        Последнее незаписанное изменение поля: (есть ли оно, значение)
+        """
+        for batch in (self._pending, *reversed(self._in_flight)):
+            entry = batch.get(key)
+            if entry is not None and field in entry:
+                return True, entry[field]
+
+        return False, None
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные изменения одной транзакцией
+        """
+        self._flush_task = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._in_flight.append(batch)
+        try:
+            await self._run(self._write, batch)
+        finally:
+            self._in_flight.remove(batch)
+
+    def _write(self, batch: dict[str, dict[str, str | None]]) -> None:
+        now = time.time()
+        rows = {'state': ([], []), 'data': ([], [])}
+        for key, entry in batch.items():
+            for field, value in entry.items():
+                upserts, deletes = rows[field]
+                if value is None:
+                    deletes.append(key)
+                else:
+                    upserts.append({'key': key, field: value, 'updated_at': now})
+
+        with self.engine.begin() as conn:
+            for field, table in (('state', fsm_states), ('data', fsm_data)):
+                upserts, deletes = rows[field]
+                if upserts:
+                    stmt = sqlite_insert(table)
+                    conn.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=['key'],
+                            set_={field: stmt.excluded[field], 'updated_at': stmt.excluded.updated_at},
+                            ),
+                        upserts,
+                        )
+                if deletes:
+                    conn.execute(delete(table).where(table.c.key.in_(deletes)))
+
+            if now - self._last_purge >= self.purge_interval:
+                self._last_purge = now
+                for table in (fsm_states, fsm_data):
+                    conn.execute(delete(table).where(table.c.updated_at < now - self.ttl))
+
+    def _read(self, table: Table, column, key: str) -> str | None:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(column).where(
+                    table.c.key == key,
+                    table.c.updated_at >= time.time() - self.ttl,
+                    )
+                ).scalar_one_or_none()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._stage(key, 'state', state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        storage_key = self.key_builder.build(key)
+        staged, state = self._overlay(storage_key, 'state')
+        if staged:
+            return state
+
+        return await self._run(self._read, fsm_states, fsm_states.c.state, storage_key)
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        # Сериализация сразу: ошибка видна в хэндлере, а не при записи пачки
+        self._stage(key, 'data', json.dumps(data) if data else None)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        storage_key = self.key_builder.build(key)
+        staged, data = self._overlay(storage_key, 'data')
+        if not staged:
+            data = await self._run(self._read, fsm_data, fsm_data.c.data, storage_key)
+
+        return json.loads(data) if data else {}
+
+    async def close(self) -> None:
+        """
+        Записывает накопленные изменения и закрывает соединения
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+        if self._engine is not None:
+            await self._run(self._engine.dispose)
+        self._executor.shutdown(wait=True)
+
+
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """
+    WAL позволяет воркерам читать состояния во время записи другим процессом
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
@@ -0,0 +1,102 @@
+"""
+Долгоживущий HTTP-клиент для запросов к omeda.city API.
+
+Вместо создания aiohttp.ClientSession на каждый запрос бот держит одну
+сессию с пулом соединений. Это убирает повторные TCP/TLS рукопожатия и
+DNS-резолв при массовых запросах (/delta, ежедневное обновление).
+
+Ключевые особенности:
+    Пул соединений с keep-alive
+    Ограничение количества соединений на один хост
+    Кэш DNS-ответов
+    Явный жизненный цикл: start() при запуске бота, close() при остановке
+
+Атрибуты:
+_instance (OmedaHttpClient): Единственный экземпляр класса (Singleton)
+_lock (threading.Lock): Блокировка для синхронизации потоков при создании Singleton
+"""
+import os
+import logging
+
+import aiohttp
+from threading import Lock
+
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит соединений в пуле
+POOL_LIMIT = int(os.getenv("OMEDA_POOL_LIMIT", "100"))
+# Лимит одновременных соединений к одному хосту
+POOL_LIMIT_PER_HOST = int(os.getenv("OMEDA_POOL_LIMIT_PER_HOST", "20"))
+# Время жизни записи в кэше DNS (сек.)
+DNS_CACHE_TTL = int(os.getenv("OMEDA_DNS_CACHE_TTL", "300"))
+# Сколько держать простаивающее соединение открытым (сек.)
+KEEPALIVE_TIMEOUT = float(os.getenv("OMEDA_KEEPALIVE_TIMEOUT", "30"))
+
+
+class OmedaHttpClient:
+    """
+    Класс-обёртка над общей aiohttp.ClientSession для omeda.city.
+    """
+    #Тут храним единственный инстанс класса
+    _instance = None
+    #Блокировка для создания синглтона
+    _lock = Lock()
+
+    def __new__(cls):
+        """
+        Проверка на существование объекта класса и создание синглтона
+        """
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = super().__new__(cls)
+                cls._instance._session = None
+
+        return cls._instance
+
+    async def start(self) -> aiohttp.ClientSession:
+        """
+        Создаёт сессию с пулом соединений, если она ещё не создана.
+
+        Returns:
+            aiohttp.ClientSession: Общая сессия
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                use_dns_cache=True,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            logger.info("Omeda HTTP client: session started")
+
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Закрывает сессию и все соединения пула.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Omeda HTTP client: session closed")
+
+        self._session = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую сессию. Если бот не вызвал start() (например,
+        при запуске модулей вне main.py), сессия создаётся при первом
+        обращении.
+
+        Returns:
+            aiohttp.ClientSession: Общая сессия
+        """
+        if self._session is None or self._session.closed:
+            return await self.start()
+
+        return self._session
+
+
+http_client = OmedaHttpClient()
@@ -0,0 +1,61 @@
+"""
+Разбор JSON-ответов omeda.city API с извлечением только нужных полей.
+
+Тело ответа декодируется быстрым декодером (orjson, если установлен, иначе
+стандартный json), после чего из документа сразу извлекаются нужные поля
+(extract), а полный документ отбрасывается. В кэш ответов и дальше по коду
+попадают только компактные проекции.
+
+Большие ответы (от OMEDA_JSON_OFFLOAD_BYTES байт) разбираются в отдельном
+потоке, чтобы не задерживать event loop.
+"""
+import os
+import json
+import asyncio
+
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+
+# Ответы больше этого размера (байт) разбираются вне event loop
+OFFLOAD_BYTES = int(os.getenv("OMEDA_JSON_OFFLOAD_BYTES", str(256 * 1024)))
+
+
+def loads(body: bytes) -> Any:
+    """
+    Декодирует JSON быстрым декодером, если он доступен
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _decode(body: bytes, extract: Callable[[Any], Any] | None) -> Any:
+    document = loads(body)
+    return extract(document) if extract is not None else document
+
+
+async def decode(body: bytes,
+    extract: Callable[[Any], Any] | None = None,
+    offload_bytes: int = OFFLOAD_BYTES) -> Any:
+    """
+    Декодирует тело ответа и извлекает из него нужные поля.
+
+    Args:
+        body (bytes): Тело ответа
+        extract (Callable | None): Извлечение полей из документа
+        (None - вернуть документ целиком)
+        offload_bytes (int): Начиная с какого размера разбирать в потоке
+    Returns:
+        Any: Результат extract или документ
+    Raises:
+        ValueError: Если тело ответа не JSON
+    """
+    if len(body) >= offload_bytes:
+        return await asyncio.to_thread(_decode, body, extract)
+
+    return _decode(body, extract)
@@ -0,0 +1,133 @@
+"""
+Общий рейтинг отслеживаемых игроков по PS (/top).
+
+Индекс хранится в памяти как отсортированный список ключей (-PS, id игрока)
+и поддерживается инкрементально: добавление и удаление игрока и изменение
+его PS - вставка/удаление по bisect, без пересортировки всего рейтинга на
+каждый запрос. Место игрока находится бинарным поиском за O(log n).
+
+Ключевые особенности:
+    Порядок при равном PS - по id игрока (стабильный рейтинг)
+    Имена игроков в индексе не хранятся: у каждого чата свои имена, и /top
+    показывает имена запросившего чата (см. ps_data_manager.top_players)
+    Пачка изменений больше REBUILD_FRACTION рейтинга (ежедневное
+    обновление) применяется одной сортировкой
+    Построение из БД за один потоковый проход (см. UsersController.scan_player_scores):
+    индекс строится в потоке БД, а подменяется в потоке event loop
+"""
+from bisect import bisect_left, insort
+from typing import Iterable
+
+
+class Leaderboard:
+    """
+    Класс упорядоченного индекса игроков по PS.
+    """
+
+    # Доля рейтинга, начиная с которой пачку дешевле применить пересортировкой
+    REBUILD_FRACTION = 0.25
+
+    def __init__(self):
+        # Ключи (-PS, id игрока) по возрастанию: первый - лучший
+        self._keys: list[tuple[float, int]] = []
+        # id игрока -> (PS, omeda_id)
+        self._players: dict[int, tuple[float, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._players
+
+    @staticmethod
+    def build_index(rows: Iterable[tuple[int, str, float]]
+    ) -> tuple[dict[int, tuple[float, str]], list[tuple[float, int]]]:
+        """
+        Строит индекс рейтинга за один проход по rows, не трогая текущий.
+        Выполняется в потоке БД (см. UsersController.scan_player_scores)
+
+        Args:
+            rows (Iterable): Записи (id игрока, omeda_id, PS)
+        Returns:
+            tuple: (игроки, отсортированные ключи) для replace
+        """
+        players = {player_id: (score, omeda_id) for player_id, omeda_id, score in rows}
+        keys = sorted((-score, player_id) for player_id, (score, _) in players.items())
+
+        return players, keys
+
+    def replace(self, index: tuple[dict[int, tuple[float, str]], list[tuple[float, int]]]
+    ) -> None:
+        """
+        Заменяет рейтинг индексом из build_index одним присваиванием.
+        Вызывается в потоке event loop, как и set/remove/top
+        """
+        self._players, self._keys = index
+
+    def set(self, player_id: int, omeda_id: str, score: float) -> None:
+        """
+        Добавляет игрока или обновляет его PS
+        """
+        self._discard_key(player_id)
+        self._players[player_id] = (score, omeda_id)
+        insort(self._keys, (-score, player_id))
+
+    def remove(self, player_id: int) -> None:
+        """
+        Удаляет игрока из рейтинга (если он там есть)
+        """
+        self._discard_key(player_id)
+        self._players.pop(player_id, None)
+
+    def update_scores(self, scores: dict[int, float]) -> None:
+        """
+        Обновляет PS игроков, уже находящихся в рейтинге.
+
+        Args:
+            scores (dict[int, float]): {id игрока: новый PS}
+        """
+        scores = {
+            player_id: score for player_id, score in scores.items()
+            if player_id in self._players}
+
+        if len(scores) > len(self._keys) * self.REBUILD_FRACTION:
+            for player_id, score in scores.items():
+                self._players[player_id] = (score, self._players[player_id][1])
+            self._keys = sorted(
+                (-score, player_id) for player_id, (score, _) in self._players.items())
+            return
+
+        for player_id, score in scores.items():
+            self.set(player_id, self._players[player_id][1], score)
+
+    def rank(self, player_id: int) -> int | None:
+        """
+        Место игрока в рейтинге (с 1), None - игрока нет в рейтинге
+        """
+        player = self._players.get(player_id)
+        if player is None:
+            return None
+
+        return bisect_left(self._keys, (-player[0], player_id)) + 1
+
+    def top(self, limit: int) -> list[tuple[int, int, str, float]]:
+        """
+        Первые limit игроков рейтинга.
+
+        Returns:
+            list[tuple]: Записи (место, id игрока, omeda_id, PS)
+        """
+        result = []
+        for place, (_, player_id) in enumerate(self._keys[:limit], start=1):
+            score, omeda_id = self._players[player_id]
+            result.append((place, player_id, omeda_id, score))
+
+        return result
+
+    def _discard_key(self, player_id: int) -> None:
+        player = self._players.get(player_id)
+        if player is None:
+            return
+
+        index = bisect_left(self._keys, (-player[0], player_id))
+        del self._keys[index]
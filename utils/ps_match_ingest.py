@@ -0,0 +1,192 @@
+"""
+Инкрементальная загрузка матчей игроков в локальную БД.
+
+Вместо запроса /matches.json?per_page=1 на каждый /delta матчи сохраняются
+в таблицы matches / match_players (по match_id), а PS последнего матча и
+прочая статистика по матчам берутся из БД.
+
+Ключевые особенности:
+    Лента матчей игрока читается постранично только до первого матча,
+    уже полученного при прошлой синхронизации этого игрока
+    Если лента не дочитана до него (ошибка API или лимит страниц), матчи
+    сохраняются, но отметка синхронизации не сдвигается: следующая
+    синхронизация продолжает чтение с недочитанной страницы
+    Сохраняются все участники матча: если несколько отслеживаемых игроков
+    играли вместе, матч хранится один раз
+    Синхронизация игрока не чаще, чем раз в sync_ttl секунд (кроме
+    ежедневного обновления, где она принудительная)
+    Одновременные синхронизации одного игрока объединяются
+"""
+import asyncio
+import logging
+import time
+
+import utils.ps_parser as ps_parser
+from utils.ps_circuit_breaker import CircuitOpenError
+from utils.ps_singleflight import SingleFlight
+from utils.users_manager import UsersController
+
+
+logger = logging.getLogger(__name__)
+
+
+class MatchIngestor:
+    """
+    Класс загрузки матчей игроков в локальную БД.
+    """
+
+    def __init__(self,
+        uc: UsersController,
+        sync_ttl: float = 600.0,
+        max_pages: int = 5,
+        per_page: int = ps_parser.MATCHES_PAGE_SIZE):
+        """
+        Args:
+            uc (UsersController): Контроллер БД
+            sync_ttl (float): Минимальный интервал между синхронизациями игрока (сек.)
+            max_pages (int): Максимум страниц за одну синхронизацию
+            per_page (int): Матчей на странице
+        """
+        self.uc = uc
+        self.sync_ttl = sync_ttl
+        self.max_pages = max_pages
+        self.per_page = per_page
+        self._syncs = SingleFlight()
+
+    async def sync_player(self,
+        omeda_id: str,
+        last_sync: dict[str, str | int | None] | None = None) -> int:
+        """
+        Загружает новые матчи игрока.
+
+        Args:
+            omeda_id (str): Идентификатор игрока
+            last_sync (dict | None): Отметка прошлой синхронизации
+            (см. UsersController.get_match_sync)
+        Returns:
+            int: Количество новых матчей
+        """
+        return await self._syncs.do(
+            omeda_id, lambda: self._sync_player(omeda_id, last_sync))
+
+    def _is_known(self, match: dict, last_sync: dict | None) -> bool:
+        """
+        Матч уже был получен прошлой синхронизацией игрока
+        """
+        if not last_sync or last_sync.get('last_match_id') is None:
+            return False
+
+        if match['match_id'] == last_sync['last_match_id']:
+            return True
+
+        return (match['ended_at'] is not None
+            and last_sync['last_ended_at'] is not None
+            and match['ended_at'] <= last_sync['last_ended_at'])
+
+    async def _sync_player(self,
+        omeda_id: str,
+        last_sync: dict[str, str | int | None] | None) -> int:
+        last_sync = last_sync or {}
+        resume_page = last_sync.get('resume_page')
+        first_page = page = resume_page or 1
+        new_matches = []
+        cursor = None
+        complete = failed = False
+
+        while page < first_page + self.max_pages:
+            api_data = await ps_parser.fetch_matches_page(
+                omeda_id, page, self.per_page, cursor)
+            if api_data is None:
+                failed = True
+                break
+
+            matches = ps_parser.extract_matches(api_data)
+            for match in matches:
+                if self._is_known(match, last_sync):
+                    complete = True
+                    break
+                new_matches.append(match)
+
+            cursor = api_data.get('cursor')
+            page += 1
+            if complete or len(matches) < self.per_page:
+                complete = True
+                break
+        else:
+            # Лимит страниц: без прошлой отметки более старые матчи не нужны
+            complete = (last_sync.get('last_match_id') is None
+                and last_sync.get('last_ended_at') is None)
+
+        if failed and not new_matches and resume_page is None:
+            # API не ответил - отметку синхронизации не двигаем
+            logger.warning(f"{omeda_id}: не удалось получить ленту матчей")
+            return 0
+
+        saved = await self.uc.save_matches(
+            omeda_id, new_matches, resume_page=None if complete else page)
+        if complete:
+            logger.info(f"{omeda_id}: синхронизация матчей, новых {saved}")
+        else:
+            logger.warning(
+                f"{omeda_id}: лента матчей прочитана не до конца (новых {saved}), "
+                f"продолжение со страницы {page}")
+
+        return saved
+
+    async def sync_players(self, omeda_ids: list[str], force: bool = False) -> None:
+        """
+        Синхронизирует матчи игроков, у которых синхронизация устарела.
+        Ошибки отдельных игроков логируются и не прерывают остальных.
+
+        Args:
+            omeda_ids (list[str]): Идентификаторы игроков
+            force (bool): Синхронизировать всех, независимо от sync_ttl
+        """
+        sync_marks = await self.uc.get_match_sync(omeda_ids)
+        now = time.time()
+
+        to_sync = [
+            omeda_id for omeda_id in dict.fromkeys(omeda_ids)
+            if force
+            or omeda_id not in sync_marks
+            or now - sync_marks[omeda_id]['synced_at'] >= self.sync_ttl
+        ]
+        if not to_sync:
+            return None
+
+        results = await asyncio.gather(
+            *(self.sync_player(omeda_id, sync_marks.get(omeda_id))
+              for omeda_id in to_sync),
+            return_exceptions=True)
+
+        for omeda_id, result in zip(to_sync, results):
+            if isinstance(result, CircuitOpenError):
+                # Последний матч берётся из уже сохранённых матчей
+                logger.info(f"{omeda_id}: синхронизация матчей отложена: {result}")
+            elif isinstance(result, BaseException):
+                logger.error(f"{omeda_id}: ошибка синхронизации матчей: {result!r}")
+
+        return None
+
+    async def fill_last_match_ps(self,
+        players_dict: dict[str, dict[str, str | int | float]],
+        force: bool = False) -> dict[str, dict[str, str | int | float]]:
+        """
+        Заполняет last_match_ps игроков из локально сохранённых матчей,
+        предварительно досинхронизировав устаревших игроков.
+
+        Args:
+            players_dict (dict): Словарь {key: {'omeda_id': str, ...}}
+            force (bool): Синхронизировать всех, независимо от sync_ttl
+        Returns:
+            dict: Тот же словарь с заполненным 'last_match_ps' (0 - нет матчей)
+        """
+        omeda_ids = [player['omeda_id'] for player in players_dict.values()]
+
+        await self.sync_players(omeda_ids, force)
+        last_match_ps = await self.uc.get_last_match_ps(omeda_ids)
+
+        for player in players_dict.values():
+            player['last_match_ps'] = last_match_ps.get(player['omeda_id'], 0)
+
+        return players_dict
@@ -0,0 +1,105 @@
+"""
+Middleware aiogram для наблюдения за обработкой апдейтов.
+
+HandlerMetricsMiddleware регистрируется как inner middleware событий
+(dp.message, dp.callback_query) и пишет время выполнения каждого
+обработчика (команды и шаги FSM) в гистограмму с меткой имени обработчика.
+
+ProfilingMiddleware регистрируется как outer middleware на dp.update и
+замеряет апдейт целиком с разбивкой на фазы (см. utils.ps_profiler).
+"""
+import time
+import asyncio
+
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+import utils.ps_profiler as profiler
+from utils.ps_metrics import registry
+
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_seconds",
+    "Время выполнения обработчика апдейта",
+    ("handler", "status"))
+HANDLERS_IN_FLIGHT = registry.gauge(
+    "bot_handlers_in_flight",
+    "Обработчики апдейтов в работе")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Класс middleware метрик обработчиков.
+    """
+
+    async def __call__(self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        profiler.set_handler(name)
+
+        status = "error"
+        started = time.perf_counter()
+        HANDLERS_IN_FLIGHT.inc()
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            HANDLERS_IN_FLIGHT.dec()
+            HANDLER_SECONDS.observe(
+                time.perf_counter() - started, handler=name, status=status)
+
+
+def _event_chat_id(update: Update) -> int | None:
+    event = update.event
+    chat = getattr(event, "chat", None) or getattr(
+        getattr(event, "message", None), "chat", None)
+    return getattr(chat, "id", None)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+    Класс outer middleware профилирования апдейтов.
+    """
+
+    def __init__(self, update_profiler: profiler.UpdateProfiler):
+        """
+        Args:
+            update_profiler (UpdateProfiler): Хранилище медленных апдейтов
+        """
+        self.profiler = update_profiler
+
+    async def __call__(self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]) -> Any:
+        is_update = isinstance(event, Update)
+        profile = profiler.UpdateProfile(
+            event.update_id if is_update else 0,
+            event.event_type if is_update else type(event).__name__,
+            _event_chat_id(event) if is_update else None,
+        )
+        token = profiler.start_update(profile)
+
+        # Стек корутины снимается, если апдейт не успел за порог
+        snapshot = asyncio.get_running_loop().call_later(
+            self.profiler.slow_threshold,
+            profiler.snapshot_stack, profile, asyncio.current_task())
+
+        cprofile = self.profiler.start_cprofile()
+        started = time.perf_counter()
+        try:
+            return await profiler.profile_steps(handler(event, data), cprofile)
+        finally:
+            profile.total = time.perf_counter() - started
+            stats = self.profiler.stop_cprofile(cprofile)
+            snapshot.cancel()
+            profiler.stop_update(token)
+
+            if profile.total >= self.profiler.slow_threshold:
+                await self.profiler.record(profile, stats)
@@ -5,39 +5,208 @@
 матчей с использованием асинхронных HTTP-запросов. Поддерживается получение средних
 performance scores и scores последнего матча для нескольких игроков.
 
+Ответы API кэшируются в памяти (utils.ps_cache.TTLCache) по ключу
+(omeda_id, endpoint), поэтому серия /delta в разных чатах по одним и тем же
+игрокам стоит одного запроса к API на игрока. Одновременные запросы по одному
+ключу объединяются (utils.ps_singleflight.SingleFlight), а сами запросы
+выполняются через utils.ps_fetch_scheduler.FetchScheduler.
+
+Из ответов сразу извлекаются только нужные поля (utils.ps_json): в кэш и
+дальше по коду попадают компактные проекции, а не документы целиком.
+
+Запросы к API идут через circuit breaker (utils.ps_circuit_breaker): при
+серии ошибок или медленных ответов запросы сразу завершаются
+CircuitOpenError, а /delta получает последние известные значения из кэша
+(в том числе устаревшие) или БД с пометкой 'stale'.
+
+Через OMEDA_CASSETTE_MODE ответы API можно записать в архив и затем
+воспроизводить без сети (utils.ps_cassette.Cassette).
+
 Ключевые функции:
     fetch_api_data: Получает JSON-данные из API Omeda для конкретного игрока
     get_player_ps_from_api: Извлекает средний performance score игрока
+    get_valid_player_ps: Проверяет omeda_id и возвращает PS игрока одним запросом
     get_players_score_from_api: Асинхронно получает performance scores для нескольких игроков
     get_last_match_ps_from_json: Извлекает performance score из последнего матча
+    get_stale_value: Последнее известное значение игрока при недоступности API
+    fetch_matches_page: Получает страницу ленты матчей игрока
+    extract_matches: Извлекает записи матчей для локального хранения
 
 Вызывает различные исключения, связанные с запросами к API, включая ошибки соединения и таймауты.
 """
-import requests
-
+import os
+import time
 import asyncio
 import aiohttp
 import logging
 import traceback
 
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable
+from urllib.parse import urlencode
+from utils.ps_cache import TTLCache
+from utils.ps_cassette import Cassette
+from utils.ps_circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.ps_fetch_scheduler import FetchScheduler
+from utils.ps_http_client import http_client
+from utils import ps_json
+from utils.ps_metrics import registry
+from utils.ps_profiler import phase
+from utils.ps_singleflight import SingleFlight
+
 
 logger = logging.getLogger(__name__)
-requests.adapters.DEFAULT_TIMEOUT = 10
 
 BASE_OMEDA_ADRESS = "https://omeda.city/players/"
 DATA_FOR_EXTRACTION = "avg_performance_score"
 
-async def fetch_api_data(omeda_id: str, target_json: str = "s"
-) -> dict:
+API_ENDPOINTS = {
+    's': "/statistics.json",
+    'm': "/matches.json?per_page=1",
+}
+
+def project_statistics(document: dict, omeda_id: str) -> dict:
+    """
+    Проекция /statistics.json: только DATA_FOR_EXTRACTION
+    """
+    if DATA_FOR_EXTRACTION not in document:
+        return {}
+    return {DATA_FOR_EXTRACTION: document[DATA_FOR_EXTRACTION]}
+
+def project_last_match(document: dict, omeda_id: str) -> dict:
+    """
+    Проекция /matches.json?per_page=1: PS игрока в последнем матче
+    ({'performance_score': None}, если матчей нет или игрока в матче нет)
+    """
+    for match in document.get('matches', [])[:1]:
+        for player in match.get('players', []):
+            if player.get('id') == omeda_id:
+                return {'performance_score': player.get('performance_score')}
+
+    return {'performance_score': None}
+
+def project_matches_page(document: dict) -> dict:
+    """
+    Проекция страницы ленты матчей: поля, нужные extract_matches, и курсор
+    """
+    projected = {'matches': [
+        {
+            'id': match.get('id'),
+            'end_time': match.get('end_time'),
+            'start_time': match.get('start_time'),
+            'players': [
+                {'id': player.get('id'), 'performance_score': player.get('performance_score')}
+                for player in match.get('players', [])
+            ],
+        }
+        for match in document.get('matches', [])
+    ]}
+    if document.get('cursor'):
+        projected['cursor'] = document['cursor']
+
+    return projected
+
+API_PROJECTIONS = {
+    's': project_statistics,
+    'm': project_last_match,
+}
+
+# Время жизни ответа в кэше (сек.) для каждого endpoint
+CACHE_TTL = {
+    's': float(os.getenv("OMEDA_CACHE_TTL_STATISTICS", "300")),
+    'm': float(os.getenv("OMEDA_CACHE_TTL_MATCHES", "120")),
+}
+CACHE_MAXSIZE = int(os.getenv("OMEDA_CACHE_MAXSIZE", "5000"))
+
+# Матчей на странице при синхронизации ленты матчей игрока
+MATCHES_PAGE_SIZE = int(os.getenv("OMEDA_MATCHES_PAGE_SIZE", "10"))
+
+CACHE_EVENTS = registry.counter(
+    "omeda_cache_events_total",
+    "События кэша ответов API: hit, miss, expired, eviction, store",
+    ("endpoint", "event"))
+CACHE_ENTRIES = registry.gauge(
+    "omeda_cache_entries",
+    "Записей в кэше ответов API")
+
+def _observe_cache(event: str, endpoint: str) -> None:
+    CACHE_EVENTS.inc(endpoint=endpoint, event=event)
+    if event in ('store', 'eviction'):
+        CACHE_ENTRIES.set(len(response_cache))
+
+response_cache = TTLCache(CACHE_MAXSIZE, CACHE_TTL, observer=_observe_cache)
+inflight_requests = SingleFlight()
+
+API_LATENCY = registry.histogram(
+    "omeda_api_request_seconds",
+    "Время HTTP-запроса к omeda.city API (одна попытка)",
+    ("endpoint", "status"))
+API_IN_FLIGHT = registry.gauge(
+    "omeda_api_requests_in_flight",
+    "Запросы к omeda.city API в работе (включая ожидание в планировщике)",
+    ("endpoint",))
+
+API_CIRCUIT_STATE = registry.gauge(
+    "omeda_api_circuit_state",
+    "Состояние circuit breaker omeda.city API (0 - closed, 1 - half_open, 2 - open)")
+CIRCUIT_STATES = {
+    CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+STALE_VALUES = registry.counter(
+    "omeda_api_stale_values_total",
+    "Значения, отданные из кэша или БД вместо ответа API",
+    ("key",))
+
+# Размыкается после OMEDA_BREAKER_FAILURES неудачных попыток подряд (ошибка,
+# 5xx или ответ дольше OMEDA_BREAKER_SLOW_CALL сек.), пробный запрос - через
+# OMEDA_BREAKER_RESET сек.
+circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("OMEDA_BREAKER_FAILURES", "5")),
+    slow_call_threshold=float(os.getenv("OMEDA_BREAKER_SLOW_CALL", "5")),
+    reset_timeout=float(os.getenv("OMEDA_BREAKER_RESET", "30")),
+    on_state_change=lambda state: API_CIRCUIT_STATE.set(CIRCUIT_STATES[state]),
+)
+
+# Запрос текущей задачи - пробный запрос полуоткрытой цепи
+_probe_request: ContextVar[bool] = ContextVar("omeda_probe_request", default=False)
+
+def _observe_request(url: str, status: str, elapsed: float) -> None:
+    API_LATENCY.observe(elapsed, endpoint=_endpoint_label(url), status=status)
+    if status != "replay":
+        # 4xx (например, неизвестный omeda_id) и 429 - API доступен
+        circuit_breaker.record(
+            status.isdigit() and int(status) < 500, elapsed, probe=_probe_request.get())
+
+# Все запросы к API идут через планировщик: лимит одновременных запросов,
+# лимит запросов в секунду, повторы на 429/503 и таймауты aiohttp
+fetch_scheduler = FetchScheduler(
+    max_concurrency=int(os.getenv("OMEDA_MAX_CONCURRENCY", "10")),
+    rate=float(os.getenv("OMEDA_RATE_LIMIT", "10")),
+    max_retries=int(os.getenv("OMEDA_MAX_RETRIES", "3")),
+    timeout=aiohttp.ClientTimeout(
+        total=float(os.getenv("OMEDA_TIMEOUT_TOTAL", "15")),
+        connect=float(os.getenv("OMEDA_TIMEOUT_CONNECT", "5")),
+        sock_read=float(os.getenv("OMEDA_TIMEOUT_READ", "10")),
+    ),
+    observer=_observe_request,
+)
+
+# Запись/воспроизведение ответов API, None - обычный режим
+cassette = Cassette.from_env()
+
+async def fetch_api_data(omeda_id: str, target_json: str = "s",
+    use_cache: bool = True) -> dict:
     """
     Получение json файлов из omeda.ciy API.
 
     Arg:
         omeda_id: str. Идентификатор игрока
         json: str. "s" - /statistics.json, "m" - /matches.json
+        use_cache: bool. Отдавать ответ из кэша, если он не устарел
 
     Return:
-        dict json-ответ от API.
+        dict: Проекция json-ответа API (см. project_statistics,
+        project_last_match)
         
     Raises:
         aiohttp.ClierntResposeError ответ сервера отличен от 200
@@ -45,27 +214,112 @@ async def fetch_api_data(omeda_id: str, target_json: str = "s"
         aiohttp.TimeoutError при превышении таймаута
         Exeption: При прочих ошибках при получении данных
     """
-    API_ENDPOINTS = {
-        's': "/statistics.json",
-        'm': "/matches.json?per_page=1",
-    }
+    if use_cache:
+        cached = response_cache.get(omeda_id, target_json)
+        if cached is not None:
+            logger.debug(f"Cache hit for {omeda_id}, {target_json}")
+            return cached
+
+    # Одновременные вызовы с тем же (omeda_id, endpoint) ждут один запрос
+    return await inflight_requests.do(
+        (omeda_id, target_json),
+        lambda: _request_api_data(omeda_id, target_json)
+        )
+
+async def _request_api_data(omeda_id: str, target_json: str) -> dict | None:
+    """
+    Выполняет запрос к omeda.city API и кладёт успешный ответ в кэш.
+
+    Arg:
+        omeda_id: str. Идентификатор игрока
+        target_json: str. Ключ endpoint из API_ENDPOINTS
+
+    Return:
+        dict | None: Проекция json-ответа API, None если статус ответа отличен от 200
+    """
     url = f"{BASE_OMEDA_ADRESS}{omeda_id}{API_ENDPOINTS[target_json]}"
+    project = API_PROJECTIONS[target_json]
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                logger.debug(f"Response URL: {url}")
-                logger.debug(f"Response status type: {type(response.status)}")
-                logger.debug(f"Response status: {response.status}")
-
-                if response.status == 200:
-                    logger.info(f"Get API response for {omeda_id}: Success")
-                    return await response.json()
-
-    except Exception as e:
-        logger.error(f"Ошибка парсинга: {e}")
-        logger.error(traceback.format_exc())
-        raise
+    api_data = await _get_json(url, lambda document: project(document, omeda_id))
+    if api_data is not None:
+        logger.info(f"Get API response for {omeda_id}: Success")
+        response_cache.set(omeda_id, target_json, api_data)
+
+    return api_data
+
+async def _get_json(url: str,
+    extract: Callable[[Any], Any] | None = None) -> Any | None:
+    """
+    GET-запрос к API через общую сессию и планировщик запросов.
+    В режиме replay ответ берётся из cassette, в режиме record - записывается в неё.
+
+    Arg:
+        url: str. Адрес запроса
+        extract: Callable | None. Извлечение нужных полей из json-ответа
+
+    Return:
+        Any | None: Результат extract (json-ответ от API, если extract не
+        передан), None если статус ответа отличен от 200
+    """
+    with API_IN_FLIGHT.track_inprogress(endpoint=_endpoint_label(url)), phase("api"):
+        try:
+            if cassette is not None and cassette.mode == "replay":
+                started = time.perf_counter()
+                body = await cassette.replay(*_split_url(url))
+                _observe_request(url, "replay", time.perf_counter() - started)
+                return await ps_json.decode(body, extract) if body is not None else None
+
+            if not circuit_breaker.allow():
+                raise CircuitOpenError(
+                    f"omeda.city недоступен, повтор через {circuit_breaker.retry_in():.0f} сек.")
+
+            # allow при незамкнутой цепи пропускает только пробный запрос.
+            # Он освобождается и при отмене или ошибке до ответа API
+            probe = not circuit_breaker.closed
+            token = _probe_request.set(probe)
+            try:
+                # Общая сессия с пулом соединений (см. utils.ps_http_client)
+                session = await http_client.get_session()
+                started = time.perf_counter()
+                body = await fetch_scheduler.get(session, url, _read_body)
+            finally:
+                _probe_request.reset(token)
+                if probe:
+                    circuit_breaker.release_probe()
+
+            if body is None:
+                return None
+
+            if cassette is not None:
+                cassette.record(*_split_url(url), body, time.perf_counter() - started)
+
+            return await ps_json.decode(body, extract)
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка парсинга: {e}")
+            logger.error(traceback.format_exc())
+            raise
+
+async def _read_body(response: aiohttp.ClientResponse) -> bytes:
+    """
+    Читает тело ответа API
+    """
+    return await response.read()
+
+def _split_url(url: str) -> tuple[str, str]:
+    """
+    (omeda_id, endpoint с параметрами) запроса, ключ для cassette
+    """
+    omeda_id, _, endpoint = url.removeprefix(BASE_OMEDA_ADRESS).partition("/")
+    return omeda_id, "/" + endpoint
+
+def _endpoint_label(url: str) -> str:
+    """
+    Endpoint запроса без параметров, метка для метрик
+    """
+    return _split_url(url)[1].partition("?")[0]
     
 async def get_player_ps_from_api(omeda_id: str) -> float:
     """
@@ -85,16 +339,39 @@ async def get_player_ps_from_api(omeda_id: str) -> float:
     player_ps = round(api_data[DATA_FOR_EXTRACTION], 2)
     return player_ps
 
+async def get_valid_player_ps(omeda_id: str) -> float | None:
+    """
+    Проверка omeda_id и получение среднего PS игрока одним запросом:
+    ответ проверки сразу даёт начальный player_ps_day.
+
+    Args:
+        omeda_id: str. Идентификатор игрока
+    Returns:
+        float | None: Среднее значение ps игрока, None если игрок не найден
+    Raises:
+        Exeption: При ошибках соединения и прочих ошибках (fetch_api_data)
+    """
+    api_data = await fetch_api_data(omeda_id)
+    if not api_data or api_data.get(DATA_FOR_EXTRACTION) is None:
+        return None
+
+    return round(api_data[DATA_FOR_EXTRACTION], 2)
+
 #Ассинхронный парсинг для получения ps игроков из API
 async def get_players_score_from_api(
     users_dict: dict[str, dict[str, str]],
-    last_match_ps=True) -> dict[str, dict[str, str | float]]:
+    last_match_ps=True,
+    stale_fallback=False) -> dict[str, dict[str, str | float]]:
     """
     Получение среднего значения ps для игроков из API и возврат в виде
     сортированного словаря.
 
     Args:
         users_dict: dict[name:{'omeda_id':str}].
+        stale_fallback: bool. Если API не ответил (в т.ч. цепь разомкнута),
+        брать последнее известное значение (см. get_stale_value) и помечать
+        игрока 'stale': True. Не для ежедневного обновления: устаревшее
+        значение не должно попасть в историю PS
 
     Returns:
         dict: {name : {'omeda_id':str, 'player_ps': float}}.
@@ -116,51 +393,76 @@ async def get_players_score_from_api(
     # порядок: ответ от API /statistics.json для среднего значения ps (float), 
     # затем ответ от API /matches.json для последнего матча игрока (float), и так
     # для каждого игрока
+    # Каждая задача помечена ключом, в который пишется её результат
     if last_match_ps:
         for player, player_info in users_dict.items():
             task = get_player_ps_from_api(player_info['omeda_id'])
-            tasks.append((player, task))
+            tasks.append((player, 'player_ps', task))
             task = get_last_match_ps_from_json(player_info['omeda_id'])
-            tasks.append((player, task))
-    #Для ежедневного обновления ps в базе данных
+            tasks.append((player, 'last_match_ps', task))
+    #Для ежедневного обновления ps в базе данных и /delta c last_match_ps
+    #из локально сохранённых матчей (см. utils.ps_match_ingest)
     else:
         for player, player_info in users_dict.items():
             task = get_player_ps_from_api(player_info['omeda_id'])
-            tasks.append((player, task))
+            tasks.append((player, 'player_ps', task))
 
-    # Запускаем задачи асинхронно
-    fetch_results = await asyncio.gather(*(task for _, task in tasks))
+    # Запускаем задачи асинхронно. Ошибка одного игрока не должна ронять
+    # весь запрос: такой игрок получит 0, как и при пустом ответе API
+    fetch_results = await asyncio.gather(
+        *(task for _, _, task in tasks), return_exceptions=True)
     logger.debug(f"fetch_results: {fetch_results}")
 
-    i = 0
-    for (player, _), response in zip(tasks, fetch_results):
-        
-            if i == 0 or i % 2 == 0:
-                if response is not None:
-                    player_ps = response
-                    users_dict[player]['player_ps'] = player_ps
-                    logger.debug(f"{__name__}, API data for {player}:\n{response}")
-                    logger.info(f"Get API data for {player}: Success")
-                else:
-                    logger.info(f"Data extraction failed for {player}. Setting player_ps to 0.")
-                    users_dict[player]['player_ps'] = 0
-
-            else:
-                if response is not None:
-                    last_match_ps = response
-                    users_dict[player]['last_match_ps'] = last_match_ps
-                    logger.debug(f"{__name__}, API data for {player}:\n{response}")
-                    logger.info(f"last_match_ps API data for {player}: Success")
-                else:
-                    logger.info(f"Data extraction failed for {player}. Setting last_match_ps to 0.")
-                    users_dict[player]['last_match_ps'] = 0
-            i += 1
+    for (player, key, _), response in zip(tasks, fetch_results):
+        if isinstance(response, CircuitOpenError):
+            logger.debug(f"Data extraction skipped for {player}: {response}")
+            response = None
+        elif isinstance(response, BaseException):
+            logger.error(f"Data extraction error for {player}: {response!r}")
+            response = None
+
+        if response is None and stale_fallback:
+            response = get_stale_value(users_dict[player], key)
+            if response is not None:
+                users_dict[player]['stale'] = True
+                STALE_VALUES.inc(key=key)
+
+        if response is not None:
+            users_dict[player][key] = response
+            logger.debug(f"{__name__}, API data for {player}:\n{response}")
+            logger.info(f"{key} API data for {player}: Success")
+        else:
+            logger.info(f"Data extraction failed for {player}. Setting {key} to 0.")
+            users_dict[player][key] = 0
             
     logger.debug(f"Team_dict(get_players_score_from_api()): {users_dict}")
     logger.info("Парсинг информации из API: Success")
 
     return users_dict
 
+def get_stale_value(player: dict[str, str | float], key: str) -> float | None:
+    """
+    Последнее известное значение key игрока, когда API не ответил: ответ
+    из кэша (даже устаревший), для 'player_ps' - иначе player_ps_day из БД.
+
+    Arg:
+        player: dict. {'omeda_id': str, 'player_ps_day': float, ...}
+        key: str. 'player_ps' или 'last_match_ps'
+
+    Return:
+        float | None: Значение, None если его неоткуда взять
+    """
+    if key == 'player_ps':
+        cached = response_cache.get_stale(player['omeda_id'], 's')
+        if cached and cached.get(DATA_FOR_EXTRACTION) is not None:
+            return round(cached[DATA_FOR_EXTRACTION], 2)
+        return player.get('player_ps_day')
+
+    cached = response_cache.get_stale(player['omeda_id'], 'm')
+    if cached and cached.get('performance_score') is not None:
+        return round(cached['performance_score'], 2)
+    return None
+
 async def get_last_match_ps_from_json(omeda_id: str) -> float:
     """
     Возвращает last_match_ps для перерданного omeda_id
@@ -168,29 +470,90 @@ async def get_last_match_ps_from_json(omeda_id: str) -> float:
         omeda_id: str
 
     Return:
-        last_match_ps: float
+        last_match_ps: float. 0, если у игрока нет матчей, он не найден в
+        последнем матче или API не ответил
     """
-    response = await fetch_api_data(omeda_id, "m")
-    api_data = response
+    api_data = await fetch_api_data(omeda_id, "m")
     logger.debug(f"get_last_match_ps_from_json, api_data: {api_data}")
 
-    try:
-        for match in api_data.get('matches', []):
-            for player in match.get('players', []):
-                if player.get('id') == omeda_id:
-                    last_game_performance_score = round(
-                        player.get('performance_score'), 2)
-                    logger.debug(f"{get_last_match_ps_from_json.__name__} last_game_performance_score: {last_game_performance_score}")
-                    return last_game_performance_score
-
-    except Exception as e:
-        logger.error(f"{get_last_match_ps_from_json.__name__} ошибка!: {e}")
-        last_game_performance_score = 0
-        raise
-
-    finally:
-        return last_game_performance_score
+    last_game_performance_score = (api_data or {}).get('performance_score')
+    if last_game_performance_score is None:
+        return 0
+
+    return round(last_game_performance_score, 2)
+
 
+async def fetch_matches_page(omeda_id: str,
+    page: int = 1,
+    per_page: int = MATCHES_PAGE_SIZE,
+    cursor: str | None = None) -> dict | None:
+    """
+    Получение страницы ленты матчей игрока (без кэша ответов).
+
+    Arg:
+        omeda_id: str. Идентификатор игрока
+        page: int. Номер страницы (с 1)
+        per_page: int. Матчей на странице
+        cursor: str | None. Курсор следующей страницы, если API его вернул
+
+    Return:
+        dict | None: Проекция json-ответа API (см. project_matches_page)
+    """
+    params = {'per_page': per_page}
+    if cursor:
+        params['cursor'] = cursor
+    else:
+        params['page'] = page
+    query = urlencode(params)
+    url = f"{BASE_OMEDA_ADRESS}{omeda_id}/matches.json?{query}"
+
+    return await inflight_requests.do(
+        (omeda_id, 'matches_page', query),
+        lambda: _get_json(url, project_matches_page))
+
+def extract_matches(api_data: dict | None) -> list[dict]:
+    """
+    Извлекает из ответа /matches.json записи матчей для локального хранения.
+
+    Arg:
+        api_data: dict | None. json-ответ от API
+
+    Return:
+        list[dict]: Матчи в порядке ответа API: {'match_id': str,
+        'ended_at': int | None, 'players': list[tuple[str, float | None]]}
+    """
+    if not api_data:
+        return []
+
+    matches = []
+    for match in api_data.get('matches', []):
+        match_id = match.get('id')
+        if not match_id:
+            continue
+
+        matches.append({
+            'match_id': str(match_id),
+            'ended_at': _parse_time(match.get('end_time') or match.get('start_time')),
+            'players': [
+                (player['id'], player.get('performance_score'))
+                for player in match.get('players', [])
+                if player.get('id')
+            ],
+        })
+
+    return matches
+
+def _parse_time(value: str | None) -> int | None:
+    """
+    Переводит время из ответа API (ISO 8601) в unix time
+    """
+    if not value:
+        return None
+
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return None
 
 def main():
     pass
@@ -0,0 +1,329 @@
+"""
+Профилирование обработки апдейтов Telegram.
+
+ProfilingMiddleware (utils.ps_middlewares) регистрируется как outer
+middleware на dp.update и измеряет время обработки каждого апдейта целиком,
+разбивая его на фазы:
+    api: ожидание ответов omeda.city (utils.ps_parser)
+    db: ожидание запросов к БД (UsersController._run)
+    render: построение текста ответа (сортировка, Analitic)
+Фаза учитывается по "стене" времени: параллельные запросы к API внутри одного
+апдейта считаются один раз, пока выполняется хотя бы один из них.
+
+Для апдейтов, обрабатывающихся дольше порога:
+    Снимается стек корутины апдейта в момент превышения порога
+    Если апдейт попал в выборку (sample_rate), прикладывается cProfile
+    Отчёт пишется в каталог профилей с ротацией по количеству файлов
+    Запись попадает в список медленных апдейтов (команда /slow)
+
+cProfile выключен по умолчанию (sample_rate = 0): заранее неизвестно, будет ли
+апдейт медленным, а профилирование замедляет обработку. Фазы замеряются
+всегда. Если cProfile включён, он работает только во время шагов корутины
+апдейта (см. profile_steps), поэтому код других апдейтов, выполняющийся между
+её await, в профиль не попадает. Это не изоляция по задачам: задачи,
+запущенные апдейтом (gather, ensure_future), тоже не профилируются, а
+одновременно профилируется не более одного апдейта.
+
+Настройки (переменные окружения):
+    PROFILE_SLOW_THRESHOLD: порог медленного апдейта (сек.)
+    PROFILE_SAMPLE_RATE: доля апдейтов, запускаемых под cProfile (0 - выключено)
+    PROFILE_DIR: каталог отчётов
+    PROFILE_MAX_FILES: сколько отчётов хранить
+    PROFILE_KEEP: сколько медленных апдейтов хранить в памяти
+"""
+import os
+import io
+import time
+import random
+import asyncio
+import cProfile
+import itertools
+import logging
+import pstats
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Generator, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("api", "db", "render")
+
+_current_profile: ContextVar["UpdateProfile | None"] = ContextVar(
+    "current_update_profile", default=None)
+
+
+class UpdateProfile:
+    """
+    Класс замера обработки одного апдейта.
+    """
+    __slots__ = (
+        "update_id", "update_type", "chat_id", "handler", "started_at",
+        "total", "phases", "_active", "_phase_started", "stack", "profile_path",
+    )
+
+    def __init__(self, update_id: int, update_type: str, chat_id: int | None):
+        self.update_id = update_id
+        self.update_type = update_type
+        self.chat_id = chat_id
+        self.handler: str | None = None
+        self.started_at = time.time()
+        self.total = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        # Количество незавершённых операций фазы и начало текущего интервала
+        self._active = dict.fromkeys(PHASES, 0)
+        self._phase_started = dict.fromkeys(PHASES, 0.0)
+        self.stack: str | None = None
+        self.profile_path: str | None = None
+
+    def enter(self, name: str) -> None:
+        if self._active[name] == 0:
+            self._phase_started[name] = time.perf_counter()
+        self._active[name] += 1
+
+    def exit(self, name: str) -> None:
+        self._active[name] -= 1
+        if self._active[name] == 0:
+            self.phases[name] += time.perf_counter() - self._phase_started[name]
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name}={value * 1000:.0f}ms" for name, value in self.phases.items())
+        return (f"update {self.update_id} ({self.update_type}, chat {self.chat_id}, "
+                f"handler {self.handler}): {self.total * 1000:.0f}ms [{phases}]")
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Относит время выполнения блока к фазе name текущего апдейта.
+    Вне обработки апдейта (ежедневное обновление) ничего не делает.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit(name)
+
+
+def start_update(profile: "UpdateProfile"):
+    """
+    Делает profile текущим замером (до stop_update)
+    """
+    return _current_profile.set(profile)
+
+
+def stop_update(token) -> None:
+    _current_profile.reset(token)
+
+
+def snapshot_stack(profile: "UpdateProfile", task: asyncio.Task) -> None:
+    """
+    Сохраняет стек ещё не завершённой корутины апдейта
+    """
+    if task.done():
+        return
+
+    stream = io.StringIO()
+    task.print_stack(limit=30, file=stream)
+    profile.stack = stream.getvalue()
+
+
+def set_handler(name: str) -> None:
+    """
+    Запоминает имя обработчика текущего апдейта
+    """
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.handler = name
+
+
+class _StepProfiled:
+    """
+    Awaitable, выполняющий корутину и включающий cProfile только на время
+    её шагов (от возобновления до следующего await).
+    """
+    __slots__ = ("_coro", "_profiler")
+
+    def __init__(self, coro, cprofile: cProfile.Profile):
+        self._coro = coro
+        self._profiler = cprofile
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        value, error = None, None
+        while True:
+            try:
+                self._profiler.enable()
+                enabled = True
+            except ValueError:
+                # Уже включён другой профилировщик: шаг выполняется без профиля
+                enabled = False
+            try:
+                if error is not None:
+                    yielded = self._coro.throw(error)
+                else:
+                    yielded = self._coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if enabled:
+                    self._profiler.disable()
+
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+def profile_steps(coro: Awaitable, cprofile: cProfile.Profile | None) -> Awaitable:
+    """
+    Ограничивает cProfile шагами корутины апдейта. Без профилировщика
+    возвращает coro как есть.
+
+    Args:
+        coro (Awaitable): Корутина обработки апдейта
+        cprofile (cProfile.Profile | None): Профилировщик из start_cprofile
+    """
+    if cprofile is None or not asyncio.iscoroutine(coro):
+        return coro
+
+    return _StepProfiled(coro, cprofile)
+
+
+class UpdateProfiler:
+    """
+    Класс хранилища медленных апдейтов и отчётов профилирования.
+    """
+
+    def __init__(self,
+        slow_threshold: float = 1.0,
+        sample_rate: float = 0.0,
+        profile_dir: str = "profiles",
+        max_files: int = 50,
+        keep: int = 100):
+        """
+        Args:
+            slow_threshold (float): Порог медленного апдейта (сек.)
+            sample_rate (float): Доля апдейтов, запускаемых под cProfile
+            (0 - cProfile выключен, замеряются только фазы)
+            profile_dir (str): Каталог отчётов
+            max_files (int): Сколько отчётов хранить на диске
+            keep (int): Сколько медленных апдейтов хранить в памяти
+        """
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.profile_dir = Path(profile_dir)
+        self.max_files = max_files
+        self.slow_updates: deque[UpdateProfile] = deque(maxlen=keep)
+        self._profiling = False
+        # Номер отчёта в имени файла: апдейты одной секунды не перезаписывают друг друга
+        self._report_numbers = itertools.count(1)
+        # Отчёты на диске от старых к новым, None - каталог ещё не прочитан
+        self._reports: deque[Path] | None = None
+
+    @classmethod
+    def from_env(cls) -> "UpdateProfiler":
+        return cls(
+            slow_threshold=float(os.getenv("PROFILE_SLOW_THRESHOLD", "1.0")),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            profile_dir=os.getenv("PROFILE_DIR", "profiles"),
+            max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+            keep=int(os.getenv("PROFILE_KEEP", "100")),
+        )
+
+    def slowest(self, limit: int = 10) -> list[UpdateProfile]:
+        """
+        Самые медленные из последних медленных апдейтов
+        """
+        return sorted(self.slow_updates, key=lambda p: p.total, reverse=True)[:limit]
+
+    def start_cprofile(self) -> cProfile.Profile | None:
+        """
+        Профилировщик для апдейта, если он попал в выборку. Включается
+        только на шагах корутины апдейта (см. profile_steps)
+        """
+        if self.sample_rate <= 0 or self._profiling or random.random() >= self.sample_rate:
+            return None
+
+        self._profiling = True
+        return cProfile.Profile()
+
+    def stop_cprofile(self, profiler: cProfile.Profile | None) -> str | None:
+        if profiler is None:
+            return None
+
+        self._profiling = False
+        if not profiler.getstats():
+            return None
+
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+        return stream.getvalue()
+
+    def _write_report(self, profile: UpdateProfile, stats: str | None) -> str:
+        """
+        Пишет отчёт медленного апдейта и удаляет самые старые отчёты
+        """
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / (
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(profile.started_at))}"
+            f"-{profile.update_id}-{next(self._report_numbers)}.txt")
+
+        parts = [profile.summary()]
+        if profile.stack:
+            parts += ["", "Стек при превышении порога:", profile.stack]
+        if stats:
+            parts += ["", "cProfile:", stats]
+        path.write_text("\n".join(parts), encoding="utf-8")
+
+        if self._reports is None:
+            # Отчёты прошлых запусков
+            self._reports = deque(sorted(
+                (report for report in self.profile_dir.glob("*.txt") if report != path),
+                key=lambda report: report.stat().st_mtime))
+        self._reports.append(path)
+
+        while len(self._reports) > self.max_files:
+            self._reports.popleft().unlink(missing_ok=True)
+
+        return str(path)
+
+    async def record(self, profile: UpdateProfile, stats: str | None) -> None:
+        """
+        Сохраняет медленный апдейт в память и на диск
+        """
+        self.slow_updates.append(profile)
+        logger.warning(f"Медленный апдейт: {profile.summary()}")
+
+        try:
+            profile.profile_path = await asyncio.to_thread(
+                self._write_report, profile, stats)
+        except OSError as e:
+            logger.error(f"Не удалось записать профиль апдейта: {e}")
+
+
+def format_slow_updates(profiles: list[UpdateProfile]) -> str:
+    """
+    Текст ответа на /slow
+    """
+    if not profiles:
+        return "Медленных апдейтов нет"
+
+    lines = ["Самые медленные апдейты:"]
+    for profile in profiles:
+        when = time.strftime("%d.%m %H:%M:%S", time.localtime(profile.started_at))
+        lines.append(f"{when} {profile.summary()}")
+        if profile.profile_path:
+            lines.append(f"    {profile.profile_path}")
+
+    return "\n".join(lines)
+
+
+update_profiler = UpdateProfiler.from_env()
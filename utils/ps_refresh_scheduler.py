@@ -0,0 +1,203 @@
+"""
+Планировщик ежедневного обновления PS игроков.
+
+Заменяет cron-задачу: гарантирует ровно один успешный запуск в день и
+переживает перезапуск бота.
+
+Ключевые особенности:
+    Состояние запуска хранится в БД (таблица refresh_runs): после перезапуска
+    завершённый запуск не повторяется, а пропущенный - выполняется сразу
+    Обновлённые в текущем запуске игроки определяются по ps_history, поэтому
+    недоделанный запуск продолжается только для необновлённых игроков
+    Запросы к API распределяются пачками по окну времени со случайным
+    смещением (jitter), а не одним залпом
+    Игроки, которых не удалось обновить, повторяются через retry_delay, но
+    не более max_attempts проходов за запуск: затем запуск завершается, а
+    необновлённые игроки записываются в refresh_runs.failed
+"""
+import asyncio
+import logging
+import random
+import traceback
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from utils.ps_metrics import registry
+from utils.users_manager import UsersController
+
+
+logger = logging.getLogger(__name__)
+
+DAILY_UPDATE_SECONDS = registry.histogram(
+    "ps_daily_update_seconds",
+    "Длительность ежедневного обновления PS (запуск за дату целиком)",
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0))
+
+
+class DailyRefreshScheduler:
+    """
+    Класс планировщика ежедневного обновления PS.
+    """
+
+    def __init__(self,
+        uc: UsersController,
+        refresh: Callable[[dict], Awaitable[int]],
+        run_hour: int = 4,
+        window: float = 1800.0,
+        batch_size: int = 20,
+        jitter: float = 0.2,
+        retry_delay: float = 600.0,
+        max_attempts: int = 3):
+        """
+        Args:
+            uc (UsersController): Контроллер БД
+            refresh (Callable): Корутина обновления пачки игроков
+            (см. ps_data_manager.player_ps_day_db_update)
+            run_hour (int): Час запуска по локальному времени
+            window (float): Окно (сек.), по которому распределяются пачки
+            batch_size (int): Игроков в одной пачке
+            jitter (float): Случайное смещение паузы между пачками (доля паузы)
+            retry_delay (float): Пауза перед повтором для необновлённых игроков (сек.)
+            max_attempts (int): Максимум проходов по необновлённым игрокам за запуск
+        """
+        self.uc = uc
+        self.refresh = refresh
+        self.run_hour = run_hour
+        self.window = window
+        self.batch_size = batch_size
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+
+    def _run_time(self, day: datetime) -> datetime:
+        return day.replace(hour=self.run_hour, minute=0, second=0, microsecond=0)
+
+    def due_run_date(self, now: datetime | None = None) -> str:
+        """
+        Возвращает дату последнего запуска, который уже должен был произойти.
+
+        Args:
+            now (datetime | None): Текущее время
+        Returns:
+            str: Дата запуска (YYYY-MM-DD)
+        """
+        now = now or datetime.now()
+        run_time = self._run_time(now)
+        if now < run_time:
+            run_time -= timedelta(days=1)
+
+        return run_time.strftime("%Y-%m-%d")
+
+    def seconds_until_next_run(self, now: datetime | None = None) -> float:
+        """
+        Возвращает количество секунд до следующего запуска.
+        """
+        now = now or datetime.now()
+        run_time = self._run_time(now)
+        if now >= run_time:
+            run_time += timedelta(days=1)
+
+        return (run_time - now).total_seconds()
+
+    async def run_forever(self) -> None:
+        """
+        Основной цикл: выполняет пропущенный/недоделанный запуск и ждёт
+        следующего.
+        """
+        while True:
+            finished = True
+
+            try:
+                run_date = self.due_run_date()
+                run = await self.uc.get_refresh_run(run_date)
+
+                if run is None or run['finished_at'] is None:
+                    finished = await self.run_once(run_date)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                finished = False
+                logger.error(f"DailyRefreshScheduler.run_forever(): {e}")
+                logger.error(traceback.format_exc())
+
+            delay = self.seconds_until_next_run()
+            if not finished:
+                # Недоделанный запуск продолжаем раньше следующего дня
+                delay = min(delay, self.retry_delay)
+
+            await asyncio.sleep(delay)
+
+    async def run_once(self, run_date: str) -> bool:
+        """
+        Выполняет (или продолжает) запуск обновления за дату.
+
+        Проходы считаются в refresh_runs.attempts, поэтому перезапуск бота
+        продолжает счёт. После max_attempts проходов запуск завершается, а
+        необновлённые игроки записываются в refresh_runs.failed и в лог.
+
+        Args:
+            run_date (str): Дата запуска (YYYY-MM-DD)
+        Returns:
+            bool: True, если запуск завершён (в том числе с необновлёнными
+            игроками после max_attempts проходов)
+        """
+        with DAILY_UPDATE_SECONDS.time():
+            return await self._run_once(run_date)
+
+    async def _run_once(self, run_date: str) -> bool:
+        run = await self.uc.start_refresh_run(run_date)
+        logger.info(f"Ежедневное обновление {run_date}: старт")
+
+        attempts = run['attempts']
+        pending = await self.uc.get_players_pending_refresh(run['started_at'])
+
+        while pending and attempts < self.max_attempts:
+            if attempts:
+                logger.warning(
+                    f"Ежедневное обновление {run_date}: повтор для "
+                    f"{len(pending)} игроков через {self.retry_delay:.0f} сек.")
+                await asyncio.sleep(self.retry_delay)
+
+            attempts = await self.uc.add_refresh_attempt(run_date)
+            await self._refresh_staggered(pending)
+            pending = await self.uc.get_players_pending_refresh(run['started_at'])
+
+        await self.uc.finish_refresh_run(run_date, failed=len(pending))
+        if pending:
+            logger.error(
+                f"Ежедневное обновление {run_date}: после {attempts} проходов не "
+                f"обновлены {len(pending)} игроков: {', '.join(pending)}")
+        else:
+            logger.info(f"Ежедневное обновление {run_date}: Success")
+
+        return True
+
+    def _batches(self, players: dict) -> list[dict]:
+        items = list(players.items())
+        return [
+            dict(items[i:i + self.batch_size])
+            for i in range(0, len(items), self.batch_size)
+        ]
+
+    async def _refresh_staggered(self, players: dict) -> None:
+        """
+        Обновляет игроков пачками, распределёнными по окну window.
+        """
+        batches = self._batches(players)
+        interval = self.window / len(batches) if batches else 0
+
+        for i, batch in enumerate(batches):
+            if i and interval:
+                delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                await asyncio.sleep(delay)
+
+            try:
+                await self.refresh(batch)
+
+            except Exception as e:
+                # Игроки пачки останутся необновлёнными и будут повторены
+                logger.error(f"Ежедневное обновление, пачка {i}: {e}")
+                logger.error(traceback.format_exc())
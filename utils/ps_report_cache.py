@@ -0,0 +1,132 @@
+"""
+Кэш готовых отчётов /delta по чатам.
+
+Отчёт хранит отрендеренный HTML, данные, из которых он собран, и уже
+разбитые на страницы варианты таблицы для каждого порядка сортировки.
+Повторный /delta в пределах окна свежести отвечает из кэша за миллисекунды,
+без запросов к БД и API, а листание страниц берёт готовые страницы отчёта.
+
+Отчёт чата сбрасывается:
+    При изменении состава игроков чата (add_player_to_db / del_player_from_db)
+    После ежедневного обновления PS (для всех чатов)
+    По истечении окна свежести max_age
+
+Отчёт, в котором есть игроки с последними известными значениями вместо
+ответа API (omeda.city недоступен, см. ps_parser.get_stale_value), помнит их
+количество (stale) и пересобирается фоновым обновлением после восстановления
+API (ps_data_manager.revalidate_stale_reports).
+
+Каждый сброс увеличивает версию чата: отчёт, сборка которого началась до
+сброса, в кэш не попадёт.
+"""
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeltaReport:
+    """
+    Класс готового отчёта /delta.
+    """
+    __slots__ = ('html', 'data_start', 'data_end', 'built_at', 'pages', 'stale')
+
+    def __init__(self,
+        html: str,
+        data_start: dict[str, dict[str, str | int | float]],
+        data_end: dict[str, dict[str, str | int | float]],
+        built_at: float | None = None):
+        """
+        Args:
+            html (str): Отрендеренный отчёт
+            data_start (dict): Данные PS из БД
+            data_end (dict): Данные PS из API
+            built_at (float | None): Время сборки (unix time)
+        """
+        self.html = html
+        self.data_start = data_start
+        self.data_end = data_end
+        self.built_at = built_at if built_at is not None else time.time()
+        # Страницы отчёта по порядку сортировки, заполняются при первом запросе
+        self.pages: dict[str, list[str]] = {}
+        # Игроков с устаревшими данными (API не ответил)
+        self.stale = sum(1 for player in data_end.values() if player.get('stale'))
+
+    def age(self) -> float:
+        """
+        Возвращает возраст отчёта в секундах
+        """
+        return max(time.time() - self.built_at, 0.0)
+
+
+class DeltaReportCache:
+    """
+    Класс кэша отчётов /delta по chat_id.
+    """
+
+    def __init__(self, max_age: float):
+        """
+        Args:
+            max_age (float): Окно свежести отчёта (сек.)
+        """
+        self.max_age = max_age
+        self._reports: dict[int, DeltaReport] = {}
+        self._versions: dict[int, int] = {}
+        self._generation = 0
+
+    def version(self, chat_id: int) -> tuple[int, int]:
+        """
+        Возвращает версию данных чата. Передаётся в set(), чтобы не
+        сохранить отчёт, устаревший во время сборки.
+        """
+        return (self._generation, self._versions.get(chat_id, 0))
+
+    def get(self, chat_id: int) -> DeltaReport | None:
+        """
+        Возвращает свежий отчёт чата или None.
+        """
+        report = self._reports.get(chat_id)
+        if report is None:
+            return None
+
+        if report.age() > self.max_age:
+            del self._reports[chat_id]
+            return None
+
+        return report
+
+    def peek(self, chat_id: int) -> DeltaReport | None:
+        """
+        Возвращает отчёт чата независимо от его возраста (листание страниц
+        уже отправленного отчёта). None, если отчёт сброшен.
+        """
+        return self._reports.get(chat_id)
+
+    def set(self,
+        chat_id: int,
+        report: DeltaReport,
+        version: tuple[int, int] | None = None) -> None:
+        """
+        Сохраняет отчёт чата, если с начала сборки (version) чат не сбрасывался.
+        """
+        if version is not None and version != self.version(chat_id):
+            logger.debug(f"chat_id: {chat_id}. Отчёт /delta устарел при сборке")
+            return
+
+        self._reports[chat_id] = report
+
+    def invalidate(self, chat_id: int) -> None:
+        """
+        Сбрасывает отчёт чата (например, после изменения состава игроков).
+        """
+        self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+        if self._reports.pop(chat_id, None) is not None:
+            logger.debug(f"chat_id: {chat_id}. Отчёт /delta сброшен")
+
+    def clear(self) -> None:
+        """
+        Сбрасывает отчёты всех чатов.
+        """
+        self._generation += 1
+        self._reports.clear()
@@ -0,0 +1,74 @@
+"""
+Объединение одновременных одинаковых запросов (single-flight).
+
+Если несколько корутин одновременно запрашивают данные по одному ключу
+(например, (omeda_id, endpoint)), реальный запрос выполняется один раз,
+а остальные ждут его результат.
+
+Ключевые особенности:
+    Все ожидающие получают один и тот же результат или одно и то же исключение
+    Отмена одного ожидающего не отменяет общий запрос
+    После завершения запроса ключ освобождается, следующий вызов делает новый запрос
+"""
+import asyncio
+import logging
+
+from functools import partial
+from typing import Any, Awaitable, Callable, Hashable
+
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Класс для объединения одновременных запросов по ключу.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self,
+        key: Hashable,
+        coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет coro_factory() или присоединяется к уже идущему вызову
+        с тем же ключом.
+
+        Args:
+            key (Hashable): Ключ запроса
+            coro_factory (Callable[[], Awaitable[Any]]): Фабрика корутины запроса
+        Returns:
+            Any: Результат общего запроса
+        Raises:
+            Exception: Исключение общего запроса (получает каждый ожидающий)
+        """
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._forget, key))
+        else:
+            logger.debug(f"SingleFlight: joined in-flight request {key}")
+
+        # shield: отмена ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        """
+        Освобождает ключ после завершения запроса.
+        """
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # Помечаем исключение как полученное, даже если все ожидающие
+        # были отменены, чтобы не засорять лог asyncio
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """
+        Возвращает количество выполняющихся запросов.
+        """
+        return len(self._inflight)
@@ -0,0 +1,273 @@
+"""
+Векторизованная аналитика PS игроков на NumPy.
+
+История PS (таблица ps_history) один раз загружается в матрицы
+игрок x день, после чего ранги, перцентили, z-оценки, скользящие средние,
+серии роста/падения и средние по команде считаются операциями над
+массивами, без циклов по игрокам. Статистика чата - это выборка строк
+общей матрицы, поэтому перцентиль игрока считается сразу среди всех
+игроков бота.
+
+Пропуски (игрок не обновлялся в какой-то день) хранятся как NaN и
+учитываются nan-функциями NumPy.
+"""
+import warnings
+
+import numpy as np
+
+
+DAY = 24 * 60 * 60
+
+
+class PsHistoryFrame:
+    """
+    Класс матриц истории PS: строка - игрок, столбец - день.
+    """
+    __slots__ = ('player_ids', 'days', 'avg', 'last')
+
+    def __init__(self,
+        player_ids: np.ndarray,
+        days: np.ndarray,
+        avg: np.ndarray,
+        last: np.ndarray):
+        """
+        Args:
+            player_ids (np.ndarray): id игроков (players.id), по строкам
+            days (np.ndarray): Номера дней (unix time // DAY), по столбцам
+            avg (np.ndarray): Средний PS, NaN - нет записи
+            last (np.ndarray): PS последнего матча, NaN - нет записи
+        """
+        self.player_ids = player_ids
+        self.days = days
+        self.avg = avg
+        self.last = last
+
+    @classmethod
+    def from_columns(cls,
+        player_ids: list[int],
+        recorded_at: list[int],
+        avg_ps: list[float],
+        last_match_ps: list[float | None]) -> "PsHistoryFrame":
+        """
+        Строит матрицы из столбцов истории, отсортированных по времени
+        (из нескольких записей игрока за день остаётся последняя).
+        """
+        ids, rows = np.unique(np.asarray(player_ids, dtype=np.int64), return_inverse=True)
+        days, columns = np.unique(
+            np.asarray(recorded_at, dtype=np.int64) // DAY, return_inverse=True)
+
+        avg = np.full((len(ids), len(days)), np.nan)
+        last = np.full((len(ids), len(days)), np.nan)
+        avg[rows, columns] = np.asarray(avg_ps, dtype=np.float64)
+        last[rows, columns] = np.asarray(last_match_ps, dtype=np.float64)
+
+        return cls(ids, days, avg, last)
+
+    def __len__(self) -> int:
+        return len(self.player_ids)
+
+    def rows_of(self, player_ids: list[int]) -> np.ndarray:
+        """
+        Номера строк игроков, -1 для игроков без истории
+        """
+        wanted = np.asarray(player_ids, dtype=np.int64)
+        if not len(self.player_ids):
+            return np.full(len(wanted), -1, dtype=np.int64)
+
+        rows = np.minimum(np.searchsorted(self.player_ids, wanted), len(self.player_ids) - 1)
+        return np.where(self.player_ids[rows] == wanted, rows, -1)
+
+    def subset(self, rows: np.ndarray) -> "PsHistoryFrame":
+        """
+        Матрицы для части игроков (например, одного чата)
+        """
+        return PsHistoryFrame(self.player_ids[rows], self.days, self.avg[rows], self.last[rows])
+
+    def latest(self) -> np.ndarray:
+        """
+        Последний известный средний PS каждого игрока (NaN - нет истории)
+        """
+        return _last_valid(self.avg)
+
+    def change(self, days: int) -> np.ndarray:
+        """
+        Изменение среднего PS за последние days дней: от последнего
+        известного значения на начало периода (или первого в периоде,
+        если раньше записей нет) до последнего известного
+        """
+        if not len(self.days):
+            return np.full(len(self), np.nan)
+
+        start = np.searchsorted(self.days, self.days[-1] - days, side="right")
+        before = _last_valid(self.avg[:, :start])
+        before = np.where(np.isnan(before), _first_valid(self.avg), before)
+        return self.latest() - before
+
+    def team_mean(self) -> np.ndarray:
+        """
+        Средний PS команды по дням (NaN - в этот день записей не было)
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            return np.nanmean(self.avg, axis=0)
+
+    def streaks(self) -> np.ndarray:
+        """
+        Текущая серия каждого игрока: +N - средний PS рос N обновлений
+        подряд, -N - падал, 0 - не менялся или мало данных
+        """
+        if self.avg.shape[1] < 2:
+            return np.zeros(len(self), dtype=np.int64)
+
+        signs = np.sign(np.diff(self.avg, axis=1))
+        signs = np.nan_to_num(signs, nan=0.0)
+        current = signs[:, -1:]
+
+        # Длина хвоста, совпадающего по знаку с последним изменением
+        same = (signs == current)[:, ::-1]
+        lengths = np.where(same.all(axis=1), same.shape[1], np.argmin(same, axis=1))
+
+        return (lengths * current[:, 0]).astype(np.int64)
+
+
+def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    Скользящее среднее по строкам матрицы за window столбцов с пропуском NaN
+    (NaN, если в окне нет ни одного значения)
+    """
+    valid = ~np.isnan(matrix)
+    sums = np.cumsum(np.where(valid, matrix, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    counts[:, window:] = counts[:, window:] - counts[:, :-window]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def ranks(values: np.ndarray) -> np.ndarray:
+    """
+    Место по убыванию значения (1 - лучший), NaN - в конце
+    """
+    order = np.argsort(np.where(np.isnan(values), np.inf, -values), kind="stable")
+    result = np.empty(len(values), dtype=np.int64)
+    result[order] = np.arange(1, len(values) + 1)
+    return result
+
+
+def percentiles(values: np.ndarray, population: np.ndarray) -> np.ndarray:
+    """
+    Доля population (в %), у которой значение меньше, чем у каждого из values
+    """
+    population = np.sort(population[~np.isnan(population)])
+    if not len(population):
+        return np.full(len(values), np.nan)
+
+    below = np.searchsorted(population, values, side="left")
+    return np.where(np.isnan(values), np.nan, below / len(population) * 100)
+
+
+def zscores(values: np.ndarray) -> np.ndarray:
+    """
+    Отклонение от среднего в стандартных отклонениях (0, если разброса нет)
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(values)
+        std = np.nanstd(values)
+
+    if not std or np.isnan(std):
+        return np.where(np.isnan(values), np.nan, 0.0)
+
+    return (values - mean) / std
+
+
+def team_stats(frame: PsHistoryFrame, player_ids: list[int], days: int
+) -> dict[str, np.ndarray]:
+    """
+    Статистика игроков команды по последним известным значениям PS.
+
+    Args:
+        frame (PsHistoryFrame): История всех игроков
+        player_ids (list[int]): id игроков команды
+        days (int): Период изменения PS (дней)
+    Returns:
+        dict[str, np.ndarray]: Массивы в порядке player_ids:
+        'avg' - последний средний PS (NaN - нет истории),
+        'rank' - место в команде, 'percentile' - перцентиль среди всех
+        игроков, 'zscore' - z-оценка в команде, 'change' - изменение за
+        days дней, 'streak' - текущая серия (см. PsHistoryFrame.streaks)
+    """
+    rows = frame.rows_of(player_ids)
+    known = rows >= 0
+    team = frame.subset(rows[known])
+
+    avg = np.full(len(rows), np.nan)
+    change = np.full(len(rows), np.nan)
+    streak = np.zeros(len(rows), dtype=np.int64)
+    if len(team):
+        avg[known] = team.latest()
+        change[known] = team.change(days)
+        streak[known] = team.streaks()
+
+    return {
+        'avg': avg,
+        'rank': ranks(avg),
+        'percentile': percentiles(avg, frame.latest()),
+        'zscore': zscores(avg),
+        'change': change,
+        'streak': streak,
+    }
+
+
+def team_trend(frame: PsHistoryFrame, player_ids: list[int], days: int, window: int = 7
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Средний PS команды по дням за последние days дней.
+
+    Args:
+        frame (PsHistoryFrame): История всех игроков
+        player_ids (list[int]): id игроков команды
+        days (int): Глубина (дней)
+        window (int): Окно скользящего среднего (дней с записями)
+    Returns:
+        tuple: (номера дней, средний PS команды, скользящее среднее);
+        скользящее среднее считается и по дням до начала периода
+    """
+    rows = frame.rows_of(player_ids)
+    team = frame.subset(rows[rows >= 0])
+
+    mean = team.team_mean()
+    rolling = rolling_mean(mean[np.newaxis, :], window)[0]
+    # Дни без записей ни у кого из команды не выводятся
+    shown = ~np.isnan(mean)
+    if len(frame.days):
+        shown &= frame.days > frame.days[-1] - days
+
+    return frame.days[shown], mean[shown], rolling[shown]
+
+
+def _first_valid(matrix: np.ndarray) -> np.ndarray:
+    """
+    Первое не-NaN значение каждой строки (NaN, если таких нет)
+    """
+    if matrix.shape[1] == 0:
+        return np.full(matrix.shape[0], np.nan)
+
+    valid = ~np.isnan(matrix)
+    values = matrix[np.arange(matrix.shape[0]), np.argmax(valid, axis=1)]
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+def _last_valid(matrix: np.ndarray) -> np.ndarray:
+    """
+    Последнее не-NaN значение каждой строки (NaN, если таких нет)
+    """
+    if matrix.shape[1] == 0:
+        return np.full(matrix.shape[0], np.nan)
+
+    valid = ~np.isnan(matrix)
+    index = matrix.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    values = matrix[np.arange(matrix.shape[0]), index]
+    return np.where(valid.any(axis=1), values, np.nan)
@@ -0,0 +1,116 @@
+"""
+Буфер отложенной записи (write-behind) для изменений в БД.
+
+Изменения (добавление и удаление игроков) накапливаются в памяти и
+передаются в поток БД одной пачкой: по истечении flush_interval после
+первого изменения пачки или сразу при max_batch изменениях. Пачка пишется
+одной транзакцией, поэтому серия команд разных чатов стоит одного commit
+(и одного fsync) вместо commit на каждую команду.
+
+Ключевые особенности:
+    Каждое изменение получает Future подтверждения: он завершается
+    результатом после commit пачки (или исключением этого изменения)
+    Пачка передаётся в тот же однопоточный executor, что и запросы, поэтому
+    запрос, отправленный после kick(), видит все изменения пачки
+"""
+import asyncio
+import logging
+
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Класс буфера отложенной записи с подтверждениями.
+    """
+
+    def __init__(self,
+        executor: Executor,
+        apply_batch: Callable[[list[tuple]], list[Any]],
+        flush_interval: float = 0.05,
+        max_batch: int = 100):
+        """
+        Args:
+            executor (Executor): Однопоточный executor БД
+            apply_batch (Callable): Запись пачки изменений в потоке БД;
+            возвращает результат или исключение для каждого изменения
+            flush_interval (float): Максимальное ожидание пачки (сек.)
+            max_batch (int): Размер пачки, при котором она пишется сразу
+        """
+        self.executor = executor
+        self.apply_batch = apply_batch
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._in_flight: set[asyncio.Future] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, operation: tuple) -> asyncio.Future:
+        """
+        Ставит изменение в очередь.
+
+        Args:
+            operation (tuple): Изменение в формате apply_batch
+        Returns:
+            asyncio.Future: Подтверждение записи (результат изменения)
+        """
+        loop = asyncio.get_running_loop()
+        ack = loop.create_future()
+        self._pending.append((operation, ack))
+
+        if len(self._pending) >= self.max_batch:
+            self.kick()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self.kick)
+
+        return ack
+
+    def kick(self) -> None:
+        """
+        Передаёт накопленные изменения в поток БД, не дожидаясь записи
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        done = asyncio.get_running_loop().run_in_executor(
+            self.executor, self.apply_batch, [operation for operation, _ in batch])
+        self._in_flight.add(done)
+        done.add_done_callback(partial(self._resolve, batch))
+
+    async def flush(self) -> None:
+        """
+        Записывает накопленные изменения и дожидается всех записей
+        """
+        self.kick()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def _resolve(self, batch: list[tuple[tuple, asyncio.Future]], done: asyncio.Future) -> None:
+        self._in_flight.discard(done)
+
+        if done.cancelled() or done.exception() is not None:
+            error = asyncio.CancelledError() if done.cancelled() else done.exception()
+            results = [error] * len(batch)
+        else:
+            results = done.result()
+
+        for (_, ack), result in zip(batch, results):
+            if ack.done():
+                continue
+            if isinstance(result, BaseException):
+                ack.set_exception(result)
+            else:
+                ack.set_result(result)
@@ -4,49 +4,186 @@
 Этот класс реализует шаблон Singleton для операций с базой данных, связанных с пользователями,
 и предоставляет методы для добавления, удаления, получения и обновления информации о пользователях.
 
+Все публичные методы асинхронные: запросы к SQLite выполняются в отдельном
+потоке (ThreadPoolExecutor с одним воркером), поэтому медленный диск не
+блокирует event loop и обработку апдейтов других чатов. Один поток также
+сериализует запись в SQLite без конкуренции за блокировку файла.
+
+Схема БД нормализована: таблица players хранит одну запись на omeda_id с общим
+состоянием PS, а таблица chat_memberships связывает чат с игроком и хранит
+отображаемое в чате имя. Один и тот же игрок, отслеживаемый в нескольких
+чатах, обновляется один раз. Каждое ежедневное обновление дописывает строки
+в таблицу ps_history (append-only), индексированную по (player_id, recorded_at).
+Старая таблица users переносится в новую схему
+при первом запуске и переименовывается в users_legacy.
+
 Ключевые особенности:
     Потокобезопасная реализация Singleton
+    Неблокирующий доступ к БД через выделенный поток
+    Ленивое создание БД при первом обращении (или в фазе запуска, startup())
     Операции создания, чтения и удаления записей пользователей
-    Поддержка хранения данных пользователя: имя, Omeda ID, ID чата и показатели эффективности
+    Поддержка хранения данных игрока: Omeda ID и показатели эффективности
+    Поддержка хранения участия игрока в чате: ID чата и имя игрока в чате
+    Миграция со старой таблицы users
+    История PS игроков с выборкой по диапазону времени
+    Хранение состояния ежедневного обновления (refresh_runs)
+    Локальное хранение матчей (matches, match_players) с отметкой
+    синхронизации по игроку (match_sync)
+    Необязательный буфер отложенной записи (DB_WRITE_BEHIND): добавления и
+    удаления игроков пишутся пачками одной транзакцией
     Логирование и обработка ошибок при работе с базой данных
 
 Атрибуты:
 _instance (UsersController): Единственный экземпляр класса (Singleton)
 _lock (threading.Lock): Блокировка для синхронизации потоков при создании Singleton
 """
+import os
+import time
+import asyncio
 import logging
 import traceback
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Iterable
 from sqlalchemy import (
-    create_engine, Column, BigInteger, Integer, Float, String, Index,
-    select, delete, update, bindparam
+    create_engine, event, inspect, text, Column, BigInteger, Integer, Float,
+    String, Index, ForeignKey, select, delete, update, insert, exists, func, literal_column
     )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker, declarative_base
 from threading import Lock
 from sqlalchemy.orm.exc import NoResultFound
+from utils.ps_metrics import registry
+from utils.ps_profiler import phase
+from utils.ps_write_buffer import WriteBehindBuffer
 
 
 logger = logging.getLogger(__name__)
 
+DB_URL = os.getenv("PS_DATA_DB_URL", "sqlite:///ps_data.db")
+# Буфер отложенной записи: добавления и удаления игроков пишутся пачками
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+DB_WRITE_FLUSH_INTERVAL = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "0.05"))
+DB_WRITE_MAX_BATCH = int(os.getenv("DB_WRITE_MAX_BATCH", "100"))
+
+DB_CALL_SECONDS = registry.histogram(
+    "ps_db_call_seconds",
+    "Время выполнения метода UsersController в потоке БД",
+    ("method",))
+DB_QUERY_SECONDS = registry.histogram(
+    "ps_db_query_seconds",
+    "Время выполнения SQL-запроса",
+    ("statement",))
+DB_COMMIT_SECONDS = registry.histogram(
+    "ps_db_commit_seconds",
+    "Время commit транзакции")
+
 Base = declarative_base()
 
-# Модель для создания таблицы пользователей
-class UsersModel(Base):
-    NAME_LEN = 25
+# Модель игрока: одна запись на omeda_id, общая для всех чатов
+class PlayerModel(Base):
     OMEDA_ID_LEN = 40
-    
-    __tablename__ = 'users'
+
+    __tablename__ = 'players'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    omeda_id = Column(String(OMEDA_ID_LEN), nullable=False, unique=True)
+    player_ps_day = Column(Float, nullable=False)
+
+
+# Модель участия игрока в чате
+class ChatMembershipModel(Base):
+    NAME_LEN = 25
+
+    __tablename__ = 'chat_memberships'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     chat_id = Column(BigInteger, nullable=False, index=True)
+    player_id = Column(
+        Integer, ForeignKey('players.id'), nullable=False, index=True)
     name = Column(String(NAME_LEN), nullable=False)
-    omeda_id = Column(String(OMEDA_ID_LEN), nullable=False)
-    player_ps_day = Column(Float, nullable=False)
     __table_args__ = (
-        Index('idx_chat_id_name', 'chat_id', 'name'),
+        Index('idx_membership_chat_id_name', 'chat_id', 'name'),
+    )
+
+
+# Модель истории PS: строка на игрока за каждое ежедневное обновление
+class PsHistoryModel(Base):
+    __tablename__ = 'ps_history'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    player_id = Column(Integer, ForeignKey('players.id'), nullable=False)
+    # Unix time (UTC, сек.)
+    recorded_at = Column(Integer, nullable=False)
+    avg_ps = Column(Float, nullable=False)
+    last_match_ps = Column(Float, nullable=True)
+    __table_args__ = (
+        # Выборка истории игрока за период - диапазон по индексу
+        Index('idx_ps_history_player_time', 'player_id', 'recorded_at'),
+    )
+
+
+# Модель запуска ежедневного обновления: одна строка на день
+class RefreshRunModel(Base):
+    __tablename__ = 'refresh_runs'
+
+    # Дата запуска в формате YYYY-MM-DD
+    run_date = Column(String(10), primary_key=True)
+    # Unix time (сек.)
+    started_at = Column(Integer, nullable=False)
+    finished_at = Column(Integer, nullable=True)
+    # Выполнено проходов обновления за дату (учитываются и после перезапуска)
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    # Игроков, не обновлённых за все проходы (заполняется при завершении)
+    failed = Column(Integer, nullable=True)
+
+
+# Модель матча: одна строка на match_id
+class MatchModel(Base):
+    MATCH_ID_LEN = 40
+
+    __tablename__ = 'matches'
+
+    match_id = Column(String(MATCH_ID_LEN), primary_key=True)
+    # Unix time (сек.)
+    ended_at = Column(Integer, nullable=True)
+
+
+# Модель участника матча: PS каждого игрока матча
+class MatchPlayerModel(Base):
+    __tablename__ = 'match_players'
+
+    match_id = Column(
+        String(MatchModel.MATCH_ID_LEN), ForeignKey('matches.match_id'),
+        primary_key=True)
+    omeda_id = Column(String(PlayerModel.OMEDA_ID_LEN), primary_key=True)
+    performance_score = Column(Float, nullable=True)
+    # Копия matches.ended_at: последний матч игрока берётся по индексу
+    ended_at = Column(Integer, nullable=True)
+    __table_args__ = (
+        Index('idx_match_players_omeda_time', 'omeda_id', 'ended_at'),
     )
 
 
+# Модель отметки синхронизации матчей игрока
+class MatchSyncModel(Base):
+    __tablename__ = 'match_sync'
+
+    omeda_id = Column(String(PlayerModel.OMEDA_ID_LEN), primary_key=True)
+    # Unix time последней синхронизации
+    synced_at = Column(Integer, nullable=False)
+    # Самый новый матч, полученный из ленты матчей этого игрока
+    last_match_id = Column(String(MatchModel.MATCH_ID_LEN), nullable=True)
+    last_ended_at = Column(Integer, nullable=True)
+    # Лента прочитана не до отметки last_match_id (ошибка API или лимит
+    # страниц): страница, с которой продолжить, и самый новый матч
+    # недочитанного участка - он станет отметкой, когда участок будет прочитан
+    resume_page = Column(Integer, nullable=True)
+    pending_match_id = Column(String(MatchModel.MATCH_ID_LEN), nullable=True)
+    pending_ended_at = Column(Integer, nullable=True)
+
+
 # Контроллер для CRD пользователей в БД
 class UsersController:
     """
@@ -57,7 +194,7 @@ class UsersController:
     #Блокировка для создания синглтона
     _lock = Lock()
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         """
         Проверка на существование объекта класса и создание синглтона
         """
@@ -72,21 +209,281 @@ class UsersController:
 
         return cls._instance
 
-    def __init__(self):
+    def __init__(self,
+        db_url: str = DB_URL,
+        write_behind: bool = DB_WRITE_BEHIND,
+        flush_interval: float = DB_WRITE_FLUSH_INTERVAL,
+        max_batch: int = DB_WRITE_MAX_BATCH):
+        """
+        Создание потока для работы с БД. Engine, таблицы и sessionmaker
+        создаются при первом обращении к БД (см. _setup), поэтому импорт
+        модуля не трогает диск
+
+        Args:
+            db_url (str): Адрес БД
+            write_behind (bool): Включить буфер отложенной записи для
+            добавления и удаления игроков
+            flush_interval (float): Максимальное ожидание пачки изменений (сек.)
+            max_batch (int): Размер пачки, при котором она пишется сразу
+        """
+        if getattr(self, '_initialized', False):
+            return
+
+        self.db_url = db_url
+        self._engine = None
+        self._Session = None
+        self._setup_lock = Lock()
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="users-db")
+        self._write_buffer = None
+        if write_behind:
+            self._write_buffer = WriteBehindBuffer(
+                self._executor,
+                partial(_timed_call, self._apply_writes),
+                flush_interval=flush_interval,
+                max_batch=max_batch,
+                )
+        self._initialized = True
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._setup()
+        return self._engine
+
+    @property
+    def Session(self):
+        if self._Session is None:
+            self._setup()
+        return self._Session
+
+    def _setup(self, create_schema: bool = True) -> None:
+        """
+        Создаёт engine и sessionmaker. Выполняется один раз, при первом
+        обращении к БД
+
+        Args:
+            create_schema (bool): Создать таблицы и мигрировать старую схему.
+            Воркеры webhook получают готовую схему от фронтового процесса
+            (см. create_schema) и только открывают соединения
+        """
+        with self._setup_lock:
+            if self._Session is not None:
+                return
+
+            engine = self._create_engine()
+            if create_schema:
+                self._create_schema(engine)
+            self._engine = engine
+
+            Session = sessionmaker(bind=engine)
+            event.listen(Session, 'before_commit', _before_commit)
+            event.listen(Session, 'after_commit', _after_commit)
+            self._Session = Session
+
+    def _create_engine(self):
+        # Соединения создаются в потоке, где произошло первое обращение,
+        # а используются в потоке executor'а, поэтому check_same_thread отключён
+        engine = create_engine(
+            self.db_url, connect_args={'check_same_thread': False})
+        event.listen(engine, 'connect', _set_sqlite_pragma)
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        return engine
+
+    async def startup(self, create_schema: bool = True) -> None:
+        """
+        Явная инициализация БД в потоке БД (фаза запуска бота)
+
+        Args:
+            create_schema (bool): Создать таблицы и мигрировать старую схему
+        """
+        await self._run(self._setup, create_schema)
+
+    def create_schema(self) -> None:
+        """
+        Создаёт таблицы и мигрирует старую схему через отдельное соединение.
+        В webhook-режиме вызывается один раз во фронтовом процессе до запуска
+        воркеров, чтобы они не выполняли create_all и миграции одновременно
+        """
+        engine = self._create_engine()
+        try:
+            self._create_schema(engine)
+        finally:
+            engine.dispose()
+
+    def _create_schema(self, engine) -> None:
         """
-        Создание базы данных и sessionmaker
+        Создаёт таблицы и выполняет миграции в одной транзакции.
+        BEGIN IMMEDIATE сразу берёт блокировку записи SQLite, поэтому
+        проверки существующих таблиц и колонок видят итог чужой миграции,
+        а не состояние до неё
         """
+        with engine.connect() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            Base.metadata.create_all(conn)
+            self._migrate_legacy_users(conn)
+            self._migrate_refresh_runs(conn)
+            self._migrate_match_sync(conn)
+            conn.commit()
 
-        self.engine = create_engine('sqlite:///ps_data.db')
-        Base.metadata.create_all(self.engine)
         logger.info("Users base creation: Success")
-        self.Session = sessionmaker(bind=self.engine)
+
+    def _migrate_refresh_runs(self, conn) -> None:
+        """
+        Добавляет в таблицу refresh_runs, созданную до учёта проходов,
+        колонки attempts и failed
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+        """
+        columns = {column['name'] for column in inspect(conn).get_columns('refresh_runs')}
+
+        if 'attempts' not in columns:
+            conn.execute(text(
+                "ALTER TABLE refresh_runs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"))
+        if 'failed' not in columns:
+            conn.execute(text("ALTER TABLE refresh_runs ADD COLUMN failed INTEGER"))
+
+    def _migrate_match_sync(self, conn) -> None:
+        """
+        Добавляет в таблицу match_sync, созданную до продолжения недочитанной
+        ленты матчей, колонки resume_page, pending_match_id и pending_ended_at
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+        """
+        columns = {column['name'] for column in inspect(conn).get_columns('match_sync')}
+
+        for name, column_type in (
+                ('resume_page', "INTEGER"),
+                ('pending_match_id', f"VARCHAR({MatchModel.MATCH_ID_LEN})"),
+                ('pending_ended_at', "INTEGER")):
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE match_sync ADD COLUMN {name} {column_type}"))
+
+    def _migrate_legacy_users(self, conn) -> None:
+        """
+        Переносит записи из старой таблицы users (одна строка на пару
+        чат-игрок) в таблицы players и chat_memberships.
+
+        Для omeda_id, встречающегося в нескольких чатах, player_ps_day берётся
+        из самой поздней записи. После переноса таблица переименовывается в
+        users_legacy, поэтому миграция выполняется один раз.
+
+        Args:
+            conn (Connection): Соединение с открытой транзакцией
+        """
+        if not inspect(conn).has_table('users'):
+            return
+
+        rows = conn.execute(text(
+            "SELECT chat_id, name, omeda_id, player_ps_day "
+            "FROM users ORDER BY id"
+            )).all()
+
+        player_ids: dict[str, int] = {}
+        for row in rows:
+            if row.omeda_id in player_ids:
+                conn.execute(
+                    update(PlayerModel)
+                    .where(PlayerModel.id == player_ids[row.omeda_id])
+                    .values(player_ps_day=row.player_ps_day)
+                    )
+            else:
+                result = conn.execute(
+                    PlayerModel.__table__.insert().values(
+                        omeda_id=row.omeda_id,
+                        player_ps_day=row.player_ps_day,
+                        )
+                    )
+                player_ids[row.omeda_id] = result.inserted_primary_key[0]
+
+            conn.execute(
+                ChatMembershipModel.__table__.insert().values(
+                    chat_id=row.chat_id,
+                    player_id=player_ids[row.omeda_id],
+                    name=row.name,
+                    )
+                )
+
+        conn.execute(text("ALTER TABLE users RENAME TO users_legacy"))
+
+        logger.info(
+            f"Миграция users: перенесено {len(rows)} записей, "
+            f"{len(player_ids)} уникальных игроков")
+
+    async def _run(self, func, *args, **kwargs):
+        """
+        Выполняет синхронную функцию работы с БД в потоке executor'а
+        """
+        loop = asyncio.get_running_loop()
+        if self._write_buffer is not None:
+            # Накопленные изменения уходят в поток БД раньше запроса,
+            # поэтому запрос их видит (например, /delta сразу после /add_player)
+            self._write_buffer.kick()
+        with phase("db"):
+            return await loop.run_in_executor(
+                self._executor, partial(_timed_call, func, *args, **kwargs))
+
+    async def _acknowledge(self, ack: asyncio.Future, durable: bool) -> Any:
+        """
+        Ждёт подтверждения записи изменения или возвращает его без ожидания
+        """
+        if durable:
+            with phase("db"):
+                return await ack
+
+        ack.add_done_callback(_log_write_error)
+        return ack
+
+    async def flush(self) -> None:
+        """
+        Записывает изменения из буфера отложенной записи и ждёт commit
+        """
+        if self._write_buffer is not None:
+            await self._write_buffer.flush()
+
+    async def close(self) -> None:
+        """
+        Дожидается завершения запросов к БД и закрывает соединения.
+        Следующий вызов UsersController() создаёт новый контроллер
+        """
+        await self.flush()
+        if self._engine is not None:
+            await self._run(self._engine.dispose)
+        self._executor.shutdown(wait=True)
+        self._initialized = False
+        with UsersController._lock:
+            if UsersController._instance is self:
+                UsersController._instance = None
 
     async def add_player(self,
         name: str, 
         omeda_id: str, 
         chat_id: int,
-        player_ps: float) -> None: 
+        player_ps: float,
+        durable: bool = True) -> dict[str, str | int | float] | asyncio.Future:
+        """
+        Добавляет нового игрока в базу данных (см. _add_player).
+        С буфером отложенной записи при durable=False не ждёт commit и
+        возвращает Future подтверждения записи.
+        """
+        if self._write_buffer is None:
+            return await self._run(
+                self._add_player, name, omeda_id, chat_id, player_ps)
+
+        # Ошибка валидации - сразу вызывающему, а не при записи пачки
+        self._validate_player(name, omeda_id)
+        return await self._acknowledge(
+            self._write_buffer.submit(('add', name, omeda_id, chat_id, player_ps)), durable)
+
+    def _add_player(self,
+        name: str, 
+        omeda_id: str, 
+        chat_id: int,
+        player_ps: float) -> dict[str, str | int | float]:
         """
         Добавляет нового игрока в базу данных. +парсит его PS
         
@@ -97,7 +494,9 @@ class UsersController:
             player_ps (float): PS игрока
             
         Returns:
-            Users: Созданный объект пользователя
+            dict[str, str | int | float]: Общая запись игрока {'bd_id': int,
+            'omeda_id': str, 'player_ps_day': float} (у игрока, уже
+            отслеживаемого в другом чате, player_ps_day прежний)
             
         Raises:
             ValueError: Если данные не соответствуют ограничениям
@@ -107,59 +506,193 @@ class UsersController:
             aiohttp.ClientResponseError ответ сервера отличен от 200 (fetch_api_data)
             aiohttp.TimeoutError при превышении таймаута (fetch_api_data)
         """
+        self._validate_player(name, omeda_id)
+
+        with self.Session() as session:
+            try:
+                player_dict = self._add_player_in(session, name, omeda_id, chat_id, player_ps)
+                session.commit()
+
+                return player_dict
+
+            except Exception as e:
+                logger.error(f"Добавить пользователя в базу данных не удалось: {e}")
+                session.rollback()
+                raise
+
+    @staticmethod
+    def _validate_player(name: str, omeda_id: str) -> None:
+        """
+        Проверяет длину имени и omeda_id (ограничения БД)
 
-        # Валидация
-        if len(name) > UsersModel.NAME_LEN:
-            raise ValueError(f"Имя должно быть не более {UsersModel.NAME_LEN} символов")
-        if len(omeda_id) > UsersModel.OMEDA_ID_LEN:
-            raise ValueError(f"Omeda_id должен быть не более {UsersModel.OMEDA_ID_LEN} символов")
-       
-        session = self.Session()
+        Raises:
+            ValueError: Если данные не соответствуют ограничениям
+        """
+        if len(name) > ChatMembershipModel.NAME_LEN:
+            raise ValueError(
+                f"Имя должно быть не более {ChatMembershipModel.NAME_LEN} символов")
+        if len(omeda_id) > PlayerModel.OMEDA_ID_LEN:
+            raise ValueError(
+                f"Omeda_id должен быть не более {PlayerModel.OMEDA_ID_LEN} символов")
 
-        try:
-            new_user = UsersModel(
-                name=name,
-                omeda_id=omeda_id,
-                chat_id=chat_id,
-                player_ps_day=player_ps,
-            )
+    def _add_player_in(self,
+        session,
+        name: str,
+        omeda_id: str,
+        chat_id: int,
+        player_ps: float) -> dict[str, str | int | float]:
+        """
+        Добавляет игрока в рамках транзакции session, без commit (см. _add_player)
+        """
+        self._validate_player(name, omeda_id)
 
-            session.add(new_user)
-            session.commit()
+        # Игрок уже может отслеживаться в другом чате: тогда его общий
+        # player_ps_day не трогаем, а только добавляем участие в чате
+        player = session.execute(
+            select(PlayerModel).where(PlayerModel.omeda_id == omeda_id)
+            ).scalar_one_or_none()
 
-            return new_user
+        if player is None:
+            player = PlayerModel(omeda_id=omeda_id, player_ps_day=player_ps)
+            session.add(player)
+            session.flush()
 
-        except Exception as e:
-            logger.error(f"Добавить пользователя в базу данных не удалось: {e}")
-            session.rollback()
-            raise
+        session.add(ChatMembershipModel(
+            chat_id=chat_id,
+            player_id=player.id,
+            name=name,
+        ))
 
-        finally:
-            session.close()
-    
-    def del_player_from_db(self, 
+        return {
+            'bd_id': player.id,
+            'omeda_id': player.omeda_id,
+            'player_ps_day': player.player_ps_day,
+        }
+
+    async def add_players(self,
+        chat_id: int,
+        players: list[tuple[str, str, float]]) -> list[dict[str, str | int | float] | None]:
+        """
+        Добавляет список игроков в чат одной транзакцией (см. _add_players)
+        """
+        return await self._run(self._add_players, chat_id, players)
+
+    def _add_players(self,
+        chat_id: int,
+        players: list[tuple[str, str, float]]) -> list[dict[str, str | int | float] | None]:
+        """
+        Добавляет список игроков в чат одной транзакцией: недостающие
+        записи players создаются одним INSERT, участия в чате - другим.
+        Игроки, чьё имя уже занято в чате, пропускаются.
+
+        Args:
+            chat_id (int): ID чата
+            players (list[tuple[str, str, float]]): Список (имя, omeda_id, PS)
+            с уникальными именами
+        Returns:
+            list[dict | None]: Для каждого игрока общая запись {'bd_id': int,
+            'omeda_id': str, 'player_ps_day': float} (см. _add_player),
+            None если имя уже занято в чате
+        Raises:
+            ValueError: Если данные не соответствуют ограничениям
+            Exeption: При прочих ошибках при добавлении в БД
+        """
+        for name, omeda_id, _ in players:
+            self._validate_player(name, omeda_id)
+
+        with self.Session() as session:
+            try:
+                taken = set(session.execute(
+                    select(ChatMembershipModel.name).where(
+                        ChatMembershipModel.chat_id == chat_id,
+                        ChatMembershipModel.name.in_([name for name, _, _ in players]),
+                        )
+                    ).scalars())
+                new_players = [player for player in players if player[0] not in taken]
+
+                omeda_ids = {omeda_id for _, omeda_id, _ in new_players}
+                existing = {
+                    row.omeda_id: row for row in session.execute(
+                        select(PlayerModel.id, PlayerModel.omeda_id, PlayerModel.player_ps_day)
+                        .where(PlayerModel.omeda_id.in_(list(omeda_ids))))
+                    }
+
+                # Игрок уже может отслеживаться в другом чате: его player_ps_day не трогаем
+                missing = {}
+                for _, omeda_id, player_ps in new_players:
+                    if omeda_id not in existing:
+                        missing.setdefault(omeda_id, player_ps)
+                if missing:
+                    session.execute(insert(PlayerModel), [
+                        {'omeda_id': omeda_id, 'player_ps_day': player_ps}
+                        for omeda_id, player_ps in missing.items()])
+                    existing.update({
+                        row.omeda_id: row for row in session.execute(
+                            select(PlayerModel.id, PlayerModel.omeda_id, PlayerModel.player_ps_day)
+                            .where(PlayerModel.omeda_id.in_(list(missing))))
+                        })
+
+                if new_players:
+                    session.execute(insert(ChatMembershipModel), [
+                        {'chat_id': chat_id, 'player_id': existing[omeda_id].id, 'name': name}
+                        for name, omeda_id, _ in new_players])
+                session.commit()
+
+            except Exception as e:
+                logger.error(f"Добавить игроков в базу данных не удалось: {e}")
+                session.rollback()
+                raise
+
+        return [
+            None if name in taken else {
+                'bd_id': existing[omeda_id].id,
+                'omeda_id': omeda_id,
+                'player_ps_day': existing[omeda_id].player_ps_day,
+            }
+            for name, omeda_id, _ in players]
+
+    async def del_player_from_db(self,
+        player_name: str,
+        chat_id: int,
+        durable: bool = True) -> int | None | asyncio.Future:
+        """
+        Удаляет игрока из базы данных (см. _del_player_from_db).
+        С буфером отложенной записи при durable=False не ждёт commit и
+        возвращает Future подтверждения записи.
+        """
+        if self._write_buffer is None:
+            return await self._run(self._del_player_from_db, player_name, chat_id)
+
+        return await self._acknowledge(
+            self._write_buffer.submit(('del', player_name, chat_id)), durable)
+
+    def _del_player_from_db(self, 
         player_name: str, 
-        chat_id: int) -> None:
+        chat_id: int) -> int | None:
         """
-        Удаляет игрока из базы данных.
+        Удаляет игрока из чата. Запись в players остаётся: игрок может
+        отслеживаться в других чатах.
 
         Args:
             player_name (str): Имя игрока
             chat_id (int): ID чата, к которому привязан игрок
         Returns:
-            None:
+            int | None: id игрока (players.id), если он больше не
+            отслеживается ни в одном чате, иначе None
         Raises:
-            ValueError: Если данные не соответствуют ограничениям
+            NoResultFound: Если игрока с таким именем нет в чате
             Exeption: При прочих ошибках при удалении из БД
         """
         with self.Session() as session:
             try:
-                stmt = delete(UsersModel).where(
-                    UsersModel.name == player_name, 
-                    UsersModel.chat_id == chat_id
-                    )
-                result = session.execute(stmt)
-                session.commit()           
+                untracked = self._del_player_in(session, player_name, chat_id)
+                session.commit()
+
+                return untracked
+
+            except NoResultFound:
+                logger.error("Пользователь не найден")
+                raise
 
             except Exception as e:
                 logger.error(f"Удалить пользователя не удалось: {e}")
@@ -167,23 +700,93 @@ class UsersController:
                 session.rollback()
                 raise
 
-            if result.rowcount == 0:
-                logger.error("Пользователь не найден")
-                raise NoResultFound("Пользователь не найден")
+    def _del_player_in(self, session, player_name: str, chat_id: int) -> int | None:
+        """
+        Удаляет игрока из чата в рамках транзакции session, без commit
+        (см. _del_player_from_db)
+        """
+        player_ids = session.execute(
+            delete(ChatMembershipModel)
+            .where(
+                ChatMembershipModel.name == player_name, 
+                ChatMembershipModel.chat_id == chat_id
+                )
+            .returning(ChatMembershipModel.player_id)
+            ).scalars().all()
+
+        if not player_ids:
+            raise NoResultFound("Пользователь не найден")
+
+        if session.execute(
+                select(exists().where(ChatMembershipModel.player_id == player_ids[0]))
+                ).scalar():
+            return None
+
+        return player_ids[0]
+
+    def _apply_writes(self, operations: list[tuple]) -> list[Any]:
+        """
+        Записывает пачку изменений из буфера отложенной записи одной
+        транзакцией. Ошибки отдельных изменений (игрок не найден, неверные
+        данные) не мешают остальным; при прочих ошибках пачка откатывается
+        и изменения записываются по одному, чтобы ошибку получило только
+        своё изменение.
+
+        Args:
+            operations (list[tuple]): Изменения ('add', name, omeda_id,
+            chat_id, player_ps) и ('del', name, chat_id) в порядке поступления
+        Returns:
+            list[Any]: Результат или исключение для каждого изменения
+        """
+        handlers = {'add': self._add_player_in, 'del': self._del_player_in}
+
+        with self.Session() as session:
+            try:
+                results = []
+                for kind, *args in operations:
+                    try:
+                        results.append(handlers[kind](session, *args))
+                    except (NoResultFound, ValueError) as e:
+                        # Такие ошибки возникают до изменений в БД
+                        results.append(e)
+                session.commit()
+
+                return results
+
+            except Exception as e:
+                session.rollback()
+                if len(operations) == 1:
+                    return [e]
+                logger.warning(f"Пачка из {len(operations)} изменений не записана: {e}")
+
+        results = []
+        for operation in operations:
+            try:
+                results.extend(self._apply_writes([operation]))
+            except Exception as e:
+                results.append(e)
 
-    def get_users_and_omeda_id(self, chat_id: int = 0
+        return results
+
+    async def get_users_and_omeda_id(self, chat_id: int
     ) -> dict[str, dict[str, str| int]]:
         """
-        Возвращает словарь пользователей указанного чата, либо для всех
-        пользователей если чат не указан
+        Возвращает словарь пользователей чата (см. _get_users_and_omeda_id)
+        """
+        return await self._run(self._get_users_and_omeda_id, chat_id)
+
+    def _get_users_and_omeda_id(self, chat_id: int
+    ) -> dict[str, dict[str, str| int]]:
+        """
+        Возвращает словарь пользователей указанного чата
 
         Args:
             chat_id (int): Идентификатор чата.
 
         Returns:
             dict[str, dict[str, str| int]]: Словарь, где ключом является имя 
-            пользователя, а значением — словарь со следующими ключами:
-            bd_id(в БД)
+            пользователя в чате, а значением — словарь со следующими ключами:
+            bd_id(id игрока в таблице players)
             Omeda ID пользователя
             player_ps_day
 
@@ -193,15 +796,17 @@ class UsersController:
         
         with self.Session() as session:
             try:
-                stmt = select(
-                    UsersModel.name, 
-                    UsersModel.omeda_id, 
-                    UsersModel.id,
-                    UsersModel.player_ps_day
+                stmt = (
+                    select(
+                        ChatMembershipModel.name, 
+                        PlayerModel.omeda_id, 
+                        PlayerModel.id,
+                        PlayerModel.player_ps_day
+                    )
+                    .join(PlayerModel,
+                        PlayerModel.id == ChatMembershipModel.player_id)
+                    .where(ChatMembershipModel.chat_id == chat_id)
                 )
-
-                if chat_id != 0:
-                    stmt = stmt.where(UsersModel.chat_id == chat_id)
             
                 users = session.execute(stmt)
 
@@ -222,14 +827,106 @@ class UsersController:
                 logger.error(traceback.format_exc())
                 raise
 
+    async def get_tracked_players(self) -> dict[str, dict[str, str | int | float]]:
+        """
+        Возвращает игроков, отслеживаемых хотя бы в одном чате
+        (см. _get_tracked_players)
+        """
+        return await self._run(self._get_tracked_players)
+
+    def _get_tracked_players(self) -> dict[str, dict[str, str | int | float]]:
+        """
+        Возвращает уникальных игроков, отслеживаемых хотя бы в одном чате.
+        Используется ежедневным обновлением: каждый omeda_id попадает в
+        словарь один раз, сколько бы чатов его ни отслеживало.
+
+        Returns:
+            dict[str, dict[str, str | int | float]]: Словарь {omeda_id: {
+            'bd_id': int, 'omeda_id': str, 'player_ps_day': float}}
+
+        Raises:
+            Exception: Если не удалось получить данные игроков из БД.
+        """
+        with self.Session() as session:
+            try:
+                tracked = select(ChatMembershipModel.player_id)
+                stmt = (
+                    select(
+                        PlayerModel.id,
+                        PlayerModel.omeda_id,
+                        PlayerModel.player_ps_day
+                    )
+                    .where(PlayerModel.id.in_(tracked))
+                )
+
+                players_dict = {
+                    player.omeda_id: {
+                        'bd_id': player.id,
+                        'omeda_id': player.omeda_id,
+                        'player_ps_day': player.player_ps_day
+                        } for player in session.execute(stmt)}
+
+                logger.info(f"Получили {len(players_dict)} игроков из БД")
+
+                return players_dict
+
+            except Exception as e:
+                logger.error(f"Не удалось получть данные игроков из БД: {e}")
+                logger.error(traceback.format_exc())
+                raise
+
+    async def scan_player_scores(self, consumer: Callable[[Iterable[tuple]], Any]
+    ) -> Any:
+        """
+        Передаёт отслеживаемых игроков потоком в consumer (см. _scan_player_scores)
+        """
+        return await self._run(self._scan_player_scores, consumer)
+
+    def _scan_player_scores(self, consumer: Callable[[Iterable[tuple]], Any]
+    ) -> Any:
+        """
+        Читает игроков, отслеживаемых хотя бы в одном чате, пачками
+        (yield_per) и передаёт их в consumer за один проход, не собирая
+        весь результат в памяти. consumer выполняется в потоке БД.
+
+        Args:
+            consumer (Callable): Получает итератор записей (id игрока,
+            omeda_id, player_ps_day). Имён нет: они у каждого чата свои
+        Returns:
+            Any: Результат consumer
+        Raises:
+            Exception: Если не удалось получить данные игроков из БД.
+        """
+        with self.Session() as session:
+            try:
+                stmt = (
+                    select(
+                        PlayerModel.id,
+                        PlayerModel.omeda_id,
+                        PlayerModel.player_ps_day,
+                    )
+                    .where(exists().where(
+                        ChatMembershipModel.player_id == PlayerModel.id))
+                    .execution_options(yield_per=1000)
+                )
+
+                return consumer(tuple(row) for row in session.execute(stmt))
+
+            except Exception as e:
+                logger.error(f"Не удалось получть данные игроков из БД: {e}")
+                logger.error(traceback.format_exc())
+                raise
+
     def _make_users_to_update_list(self,
     users_dict: dict[str, dict[str, int | float]]
     ) -> list[dict[str, int | float]]:
         """
-        Создает словарь для обновления данных в БД
+        Создает словарь для обновления данных в БД. Игроки, для которых
+        не удалось получить свежий PS (player_ps отсутствует или равен 0),
+        пропускаются, чтобы не затереть player_ps_day нулём.
 
         Args:
-            users_dict (dict[str, dict[str, int | float]]): Словарь пользователей
+            users_dict (dict[str, dict[str, int | float]]): Словарь игроков
 
         Returns:
             list[dict[str, int | float]]: Список словарей для обновления данных в БД
@@ -237,32 +934,71 @@ class UsersController:
         users_to_update = [
             {
                 'id': user_data['bd_id'],
-                'player_ps_day': user_data['player_ps_day']
+                'player_ps_day': user_data['player_ps']
             }
             for user_data in users_dict.values()
+            if user_data.get('player_ps')
         ]
 
         logger.debug(f"users_to_update: {users_to_update}")
 
         return users_to_update
 
-    async def update_player_ps_day(self, 
-    users_dict: dict[str, dict[str, int | float]]):
+    def _make_history_rows(self,
+    users_dict: dict[str, dict[str, int | float]],
+    recorded_at: int
+    ) -> list[dict[str, int | float | None]]:
+        """
+        Создает список строк истории PS для bulk insert
+
+        Args:
+            users_dict (dict[str, dict[str, int | float]]): Словарь игроков
+            recorded_at (int): Время обновления (unix time)
+
+        Returns:
+            list[dict[str, int | float | None]]: Строки для таблицы ps_history
+        """
+        return [
+            {
+                'player_id': user_data['bd_id'],
+                'recorded_at': recorded_at,
+                'avg_ps': user_data['player_ps'],
+                'last_match_ps': user_data.get('last_match_ps') or None,
+            }
+            for user_data in users_dict.values()
+            if user_data.get('player_ps')
+        ]
+
+    async def update_player_ps_day(self,
+    users_dict: dict[str, dict[str, int | float]],
+    recorded_at: int | None = None):
+        """
+        Заменяем значения столбца player_ps_day в БД (см. _update_player_ps_day)
+        """
+        return await self._run(
+            self._update_player_ps_day, users_dict, recorded_at)
+
+    def _update_player_ps_day(self, 
+    users_dict: dict[str, dict[str, int | float]],
+    recorded_at: int | None = None):
         """
-        Заменяем значения столбца player_ps_day в БД ps_data.db
-        Вид принимаемого аргумента - name : {'bd_id':int, 'player_ps': float}
+        Заменяем значения столбца player_ps_day в таблице players и дописываем
+        строки в ps_history. Всё в одной транзакции, история - одним bulk insert.
+        Вид принимаемого аргумента - omeda_id : {'bd_id':int, 'player_ps': float,
+        'last_match_ps': float}
         """
         users_to_update = self._make_users_to_update_list(users_dict)
+        history_rows = self._make_history_rows(
+            users_dict, recorded_at or int(time.time()))
 
         with self.Session() as session:
             try:
-                stmt = (
-                    update(UsersModel)
-                    .where(UsersModel.id == bindparam('id'))
-                    .values(player_ps_day=bindparam('player_ps_day'))
-                )
+                if not users_to_update:
+                    return None
 
-                session.execute(stmt, users_to_update)
+                # ORM bulk UPDATE по первичному ключу (id в каждом словаре)
+                session.execute(update(PlayerModel), users_to_update)
+                session.execute(insert(PsHistoryModel), history_rows)
                 session.commit()
             
             except Exception as e:
@@ -272,6 +1008,513 @@ class UsersController:
         
         return None
 
+    async def get_refresh_run(self, run_date: str) -> dict[str, int | None] | None:
+        """
+        Возвращает состояние ежедневного обновления (см. _get_refresh_run)
+        """
+        return await self._run(self._get_refresh_run, run_date)
+
+    def _get_refresh_run(self, run_date: str) -> dict[str, int | None] | None:
+        """
+        Возвращает состояние ежедневного обновления за дату.
+
+        Args:
+            run_date (str): Дата запуска (YYYY-MM-DD)
+        Returns:
+            dict[str, int | None] | None: {'started_at': int, 'finished_at':
+            int | None, 'attempts': int, 'failed': int | None}, None если
+            обновление за эту дату не запускалось
+        """
+        with self.Session() as session:
+            run = session.get(RefreshRunModel, run_date)
+            if run is None:
+                return None
+
+            return _refresh_run_dict(run)
+
+    async def start_refresh_run(self, run_date: str) -> dict[str, int | None]:
+        """
+        Начинает или продолжает ежедневное обновление (см. _start_refresh_run)
+        """
+        return await self._run(self._start_refresh_run, run_date)
+
+    def _start_refresh_run(self, run_date: str) -> dict[str, int | None]:
+        """
+        Создаёт запись о запуске обновления за дату. Если запись уже есть
+        (бот перезапустился посреди обновления), возвращает её без изменений.
+
+        Args:
+            run_date (str): Дата запуска (YYYY-MM-DD)
+        Returns:
+            dict[str, int | None]: {'started_at': int, 'finished_at': int | None,
+            'attempts': int, 'failed': int | None}
+        """
+        with self.Session() as session:
+            try:
+                run = session.get(RefreshRunModel, run_date)
+                if run is None:
+                    run = RefreshRunModel(
+                        run_date=run_date, started_at=int(time.time()), attempts=0)
+                    session.add(run)
+                    session.commit()
+
+                return _refresh_run_dict(run)
+
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Не удалось сохранить запуск обновления: {e}")
+                raise
+
+    async def add_refresh_attempt(self, run_date: str) -> int:
+        """
+        Учитывает проход обновления за дату (см. _add_refresh_attempt)
+        """
+        return await self._run(self._add_refresh_attempt, run_date)
+
+    def _add_refresh_attempt(self, run_date: str) -> int:
+        """
+        Увеличивает счётчик проходов ежедневного обновления за дату.
+
+        Args:
+            run_date (str): Дата запуска (YYYY-MM-DD)
+        Returns:
+            int: Количество проходов с учётом нового
+        """
+        with self.Session() as session:
+            try:
+                attempts = session.execute(
+                    update(RefreshRunModel)
+                    .where(RefreshRunModel.run_date == run_date)
+                    .values(attempts=RefreshRunModel.attempts + 1)
+                    .returning(RefreshRunModel.attempts)
+                    ).scalar_one()
+                session.commit()
+                return attempts
+
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Не удалось сохранить проход обновления: {e}")
+                raise
+
+    async def finish_refresh_run(self, run_date: str, failed: int = 0) -> None:
+        """
+        Отмечает обновление завершённым (см. _finish_refresh_run)
+        """
+        return await self._run(self._finish_refresh_run, run_date, failed)
+
+    def _finish_refresh_run(self, run_date: str, failed: int = 0) -> None:
+        """
+        Отмечает ежедневное обновление за дату завершённым.
+
+        Args:
+            run_date (str): Дата запуска (YYYY-MM-DD)
+            failed (int): Игроков, которых не удалось обновить за все проходы
+        """
+        with self.Session() as session:
+            try:
+                session.execute(
+                    update(RefreshRunModel)
+                    .where(RefreshRunModel.run_date == run_date)
+                    .values(finished_at=int(time.time()), failed=failed)
+                    )
+                session.commit()
+
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Не удалось завершить запуск обновления: {e}")
+                raise
+
+    async def get_players_pending_refresh(self, since: int
+    ) -> dict[str, dict[str, str | int | float]]:
+        """
+        Возвращает игроков, не обновлённых с момента since
+        (см. _get_players_pending_refresh)
+        """
+        return await self._run(self._get_players_pending_refresh, since)
+
+    def _get_players_pending_refresh(self, since: int
+    ) -> dict[str, dict[str, str | int | float]]:
+        """
+        Возвращает отслеживаемых игроков, для которых с момента since нет
+        записи в ps_history, т.е. не обновлённых в текущем запуске.
+
+        Args:
+            since (int): Начало запуска обновления (unix time)
+        Returns:
+            dict[str, dict[str, str | int | float]]: Словарь {omeda_id: {
+            'bd_id': int, 'omeda_id': str, 'player_ps_day': float}}
+        """
+        with self.Session() as session:
+            tracked = select(ChatMembershipModel.player_id)
+            # Коррелированный подзапрос идёт по индексу (player_id, recorded_at)
+            refreshed = exists().where(
+                PsHistoryModel.player_id == PlayerModel.id,
+                PsHistoryModel.recorded_at >= since,
+                )
+            stmt = (
+                select(
+                    PlayerModel.id,
+                    PlayerModel.omeda_id,
+                    PlayerModel.player_ps_day
+                )
+                .where(
+                    PlayerModel.id.in_(tracked),
+                    ~refreshed,
+                )
+            )
+
+            return {
+                player.omeda_id: {
+                    'bd_id': player.id,
+                    'omeda_id': player.omeda_id,
+                    'player_ps_day': player.player_ps_day
+                    } for player in session.execute(stmt)}
+
+    async def get_match_sync(self, omeda_ids: list[str]
+    ) -> dict[str, dict[str, str | int | None]]:
+        """
+        Возвращает отметки синхронизации матчей (см. _get_match_sync)
+        """
+        return await self._run(self._get_match_sync, omeda_ids)
+
+    def _get_match_sync(self, omeda_ids: list[str]
+    ) -> dict[str, dict[str, str | int | None]]:
+        """
+        Возвращает отметки синхронизации матчей игроков.
+
+        Args:
+            omeda_ids (list[str]): Идентификаторы игроков
+        Returns:
+            dict[str, dict[str, str | int | None]]: {omeda_id: {'synced_at': int,
+            'last_match_id': str | None, 'last_ended_at': int | None,
+            'resume_page': int | None}}. Игроки без синхронизации в словарь
+            не попадают
+        """
+        with self.Session() as session:
+            stmt = select(MatchSyncModel).where(
+                MatchSyncModel.omeda_id.in_(omeda_ids))
+
+            return {
+                sync.omeda_id: {
+                    'synced_at': sync.synced_at,
+                    'last_match_id': sync.last_match_id,
+                    'last_ended_at': sync.last_ended_at,
+                    'resume_page': sync.resume_page,
+                    } for sync in session.execute(stmt).scalars()}
+
+    async def save_matches(self,
+        omeda_id: str,
+        matches: list[dict],
+        synced_at: int | None = None,
+        resume_page: int | None = None) -> int:
+        """
+        Сохраняет матчи и отметку синхронизации игрока (см. _save_matches)
+        """
+        return await self._run(
+            self._save_matches, omeda_id, matches, synced_at, resume_page)
+
+    def _save_matches(self,
+        omeda_id: str,
+        matches: list[dict],
+        synced_at: int | None = None,
+        resume_page: int | None = None) -> int:
+        """
+        Сохраняет матчи (уже известные match_id пропускаются) и обновляет
+        отметку синхронизации игрока. Всё в одной транзакции.
+
+        Отметка last_match_id сдвигается, только если лента прочитана до
+        неё (или до конца). Иначе запоминается resume_page и самый новый
+        матч недочитанного участка: следующая синхронизация продолжит чтение
+        с resume_page, а отметкой станет этот матч.
+
+        Args:
+            omeda_id (str): Игрок, чья лента матчей синхронизирована
+            matches (list[dict]): Матчи от новых к старым: {'match_id': str,
+            'ended_at': int | None, 'players': list[tuple[str, float | None]]}
+            synced_at (int | None): Время синхронизации (unix time)
+            resume_page (int | None): Страница, с которой продолжить чтение
+            ленты, None - лента прочитана до отметки
+        Returns:
+            int: Количество новых матчей
+        """
+        synced_at = synced_at or int(time.time())
+
+        with self.Session() as session:
+            try:
+                new_matches = 0
+
+                if matches:
+                    known = set(session.execute(
+                        select(MatchModel.match_id).where(MatchModel.match_id.in_(
+                            [match['match_id'] for match in matches]))
+                        ).scalars())
+                    new_matches = len(
+                        {match['match_id'] for match in matches} - known)
+
+                    session.execute(
+                        sqlite_insert(MatchModel).on_conflict_do_nothing(),
+                        [{'match_id': match['match_id'],
+                          'ended_at': match['ended_at']} for match in matches]
+                        )
+
+                    # От старых к новым: без ended_at последний матч игрока -
+                    # последняя вставленная запись (см. _get_last_match_ps)
+                    match_players = [
+                        {
+                            'match_id': match['match_id'],
+                            'omeda_id': player_id,
+                            'performance_score': performance_score,
+                            'ended_at': match['ended_at'],
+                        }
+                        for match in reversed(matches)
+                        for player_id, performance_score in match['players']
+                    ]
+                    if match_players:
+                        session.execute(
+                            sqlite_insert(MatchPlayerModel).on_conflict_do_nothing(),
+                            match_players)
+
+                sync = session.get(MatchSyncModel, omeda_id)
+                if sync is not None and sync.pending_match_id is not None:
+                    newest = (sync.pending_match_id, sync.pending_ended_at)
+                elif matches:
+                    newest = (matches[0]['match_id'], matches[0]['ended_at'])
+                else:
+                    newest = None
+
+                sync_values = {
+                    'omeda_id': omeda_id,
+                    'synced_at': synced_at,
+                    'resume_page': resume_page,
+                    'pending_match_id': None,
+                    'pending_ended_at': None,
+                    }
+                if newest is not None and resume_page is None:
+                    sync_values['last_match_id'], sync_values['last_ended_at'] = newest
+                elif newest is not None:
+                    sync_values['pending_match_id'], sync_values['pending_ended_at'] = newest
+
+                stmt = sqlite_insert(MatchSyncModel).values(**sync_values)
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=[MatchSyncModel.omeda_id],
+                    set_={key: stmt.excluded[key]
+                          for key in sync_values if key != 'omeda_id'},
+                    ))
+                session.commit()
+
+                return new_matches
+
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Не удалось сохранить матчи {omeda_id}: {e}")
+                raise
+
+    async def get_last_match_ps(self, omeda_ids: list[str]) -> dict[str, float]:
+        """
+        Возвращает PS последнего матча игроков (см. _get_last_match_ps)
+        """
+        return await self._run(self._get_last_match_ps, omeda_ids)
+
+    def _get_last_match_ps(self, omeda_ids: list[str]) -> dict[str, float]:
+        """
+        Возвращает PS последнего сохранённого матча для каждого игрока.
+
+        Args:
+            omeda_ids (list[str]): Идентификаторы игроков
+        Returns:
+            dict[str, float]: {omeda_id: performance_score}. Игроки без
+            сохранённых матчей в словарь не попадают
+        """
+        with self.Session() as session:
+            # Самый поздний матч по ended_at, матчи без времени - после них,
+            # среди них последний вставленный (rowid)
+            ranked = (
+                select(
+                    MatchPlayerModel.omeda_id,
+                    MatchPlayerModel.performance_score,
+                    func.row_number().over(
+                        partition_by=MatchPlayerModel.omeda_id,
+                        order_by=(
+                            MatchPlayerModel.ended_at.is_(None),
+                            MatchPlayerModel.ended_at.desc(),
+                            literal_column('match_players.rowid').desc(),
+                        ),
+                    ).label('place'),
+                )
+                .where(MatchPlayerModel.omeda_id.in_(omeda_ids))
+                .subquery()
+            )
+            stmt = (
+                select(ranked.c.omeda_id, ranked.c.performance_score)
+                .where(ranked.c.place == 1)
+            )
+
+            return {
+                row.omeda_id: round(row.performance_score or 0, 2)
+                for row in session.execute(stmt)}
+
+    async def get_player_history(self,
+        player_name: str,
+        chat_id: int,
+        since: int) -> list[tuple[int, float, float | None]]:
+        """
+        Возвращает историю PS игрока чата (см. _get_player_history)
+        """
+        return await self._run(
+            self._get_player_history, player_name, chat_id, since)
+
+    def _get_player_history(self,
+        player_name: str,
+        chat_id: int,
+        since: int) -> list[tuple[int, float, float | None]]:
+        """
+        Возвращает историю PS игрока начиная с момента since.
+        Запрос идёт по индексу (player_id, recorded_at) и не зависит от
+        общего объёма истории.
+
+        Args:
+            player_name (str): Имя игрока в чате
+            chat_id (int): ID чата
+            since (int): Начало периода (unix time)
+        Returns:
+            list[tuple[int, float, float | None]]: Список
+            (recorded_at, avg_ps, last_match_ps), отсортированный по времени
+        Raises:
+            NoResultFound: Если игрока с таким именем нет в чате
+            Exception: При прочих ошибках при чтении из БД
+        """
+        with self.Session() as session:
+            try:
+                player_id = session.execute(
+                    select(ChatMembershipModel.player_id).where(
+                        ChatMembershipModel.chat_id == chat_id,
+                        ChatMembershipModel.name == player_name,
+                        ).limit(1)
+                    ).scalar()
+
+                if player_id is None:
+                    raise NoResultFound("Пользователь не найден")
+
+                stmt = (
+                    select(
+                        PsHistoryModel.recorded_at,
+                        PsHistoryModel.avg_ps,
+                        PsHistoryModel.last_match_ps,
+                    )
+                    .where(
+                        PsHistoryModel.player_id == player_id,
+                        PsHistoryModel.recorded_at >= since,
+                    )
+                    .order_by(PsHistoryModel.recorded_at)
+                )
+
+                return [tuple(row) for row in session.execute(stmt)]
+
+            except NoResultFound:
+                raise
+
+            except Exception as e:
+                logger.error(f"Не удалось получить историю PS из БД: {e}")
+                logger.error(traceback.format_exc())
+                raise
+
+    async def get_history_columns(self, since: int
+    ) -> tuple[list[int], list[int], list[float], list[float | None]]:
+        """
+        Возвращает историю PS всех игроков по столбцам (см. _get_history_columns)
+        """
+        return await self._run(self._get_history_columns, since)
+
+    def _get_history_columns(self, since: int
+    ) -> tuple[list[int], list[int], list[float], list[float | None]]:
+        """
+        Возвращает историю PS всех игроков начиная с момента since одним
+        запросом, по столбцам - для загрузки в массивы NumPy.
+
+        Args:
+            since (int): Начало периода (unix time)
+        Returns:
+            tuple: Списки (player_id, recorded_at, avg_ps, last_match_ps)
+            одинаковой длины, отсортированные по времени
+        Raises:
+            Exception: При ошибках при чтении из БД
+        """
+        with self.Session() as session:
+            try:
+                stmt = (
+                    select(
+                        PsHistoryModel.player_id,
+                        PsHistoryModel.recorded_at,
+                        PsHistoryModel.avg_ps,
+                        PsHistoryModel.last_match_ps,
+                    )
+                    .where(PsHistoryModel.recorded_at >= since)
+                    .order_by(PsHistoryModel.recorded_at)
+                )
+
+                rows = session.execute(stmt).tuples().all()
+                if not rows:
+                    return [], [], [], []
+
+                player_ids, recorded_at, avg_ps, last_match_ps = zip(*rows)
+                return list(player_ids), list(recorded_at), list(avg_ps), list(last_match_ps)
+
+            except Exception as e:
+                logger.error(f"Не удалось получить историю PS из БД: {e}")
+                logger.error(traceback.format_exc())
+                raise
+
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """
+    WAL позволяет читать БД во время записи, synchronous=NORMAL убирает
+    лишние fsync на каждый commit
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def _refresh_run_dict(run: RefreshRunModel) -> dict[str, int | None]:
+    """
+    Состояние ежедневного обновления из записи refresh_runs
+    """
+    return {
+        'started_at': run.started_at,
+        'finished_at': run.finished_at,
+        'attempts': run.attempts or 0,
+        'failed': run.failed,
+    }
+
+def _log_write_error(ack: asyncio.Future) -> None:
+    """
+    Ошибка изменения, подтверждение которого никто не ждёт, попадает в лог
+    """
+    if not ack.cancelled() and ack.exception() is not None:
+        logger.error(f"Отложенная запись не удалась: {ack.exception()!r}")
+
+def _timed_call(func, *args, **kwargs):
+    with DB_CALL_SECONDS.time(method=func.__name__):
+        return func(*args, **kwargs)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    if started is None:
+        return
+    DB_QUERY_SECONDS.observe(
+        time.perf_counter() - started,
+        statement=statement.lstrip().split(None, 1)[0].upper())
+
+def _before_commit(session):
+    session.info['commit_started'] = time.perf_counter()
+
+def _after_commit(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
 def __main__():
     pass
 
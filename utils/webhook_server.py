@@ -0,0 +1,154 @@
+"""
+Приём апдейтов Telegram через webhook с распределением по процессам-воркерам.
+
+Фронтовой процесс поднимает aiohttp-сервер, проверяет секрет webhook и
+раскладывает сырые апдейты по очередям воркеров (multiprocessing.Queue).
+Состояния FSM хранятся в общей SQLite (см. ps_fsm_storage) и доступны любому
+воркеру. Воркер выбирается по chat_id апдейта, чтобы апдейты одного чата
+попадали в один процесс и пользовались его локальными кэшами (ответы API,
+отчёты /delta). Каждый воркер - отдельный процесс со своим event loop,
+который передаёт апдейты в Dispatcher.feed_raw_update.
+
+Ключевые особенности:
+    Ответ Telegram сразу после постановки апдейта в очередь
+    503, если очередь воркера переполнена или воркер не работает:
+    Telegram повторит доставку апдейта позже
+    Остановка воркера по None в очереди после обработки поставленных апдейтов
+"""
+import asyncio
+import hmac
+import logging
+import queue as queue_module
+
+from typing import Any, Awaitable, Callable, Protocol
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Маркер пустой очереди при ожидании с таймаутом
+_EMPTY = object()
+
+
+class _Worker(Protocol):
+    def is_alive(self) -> bool: ...
+
+
+def extract_chat_id(update: dict[str, Any]) -> int:
+    """
+    chat_id апдейта (для апдейтов без чата - id пользователя, иначе 0).
+
+    Args:
+        update (dict): Сырой апдейт Telegram
+    Returns:
+        int: Ключ распределения апдейта по воркерам
+    """
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        if "id" in (event.get("from") or {}):
+            return event["from"]["id"]
+
+    return 0
+
+
+class UpdateRouter:
+    """
+    Класс распределения апдейтов по очередям воркеров.
+    """
+
+    def __init__(self,
+        queues: list,
+        workers: list[_Worker] | None = None,
+        secret: str | None = None):
+        """
+        Args:
+            queues (list): Очереди воркеров (multiprocessing.Queue)
+            workers (list | None): Процессы воркеров, в том же порядке
+            secret (str | None): Секрет webhook (secret_token в setWebhook)
+        """
+        self.queues = queues
+        self.workers = workers
+        self.secret = secret
+
+    def route(self, update: dict[str, Any]) -> int:
+        """
+        Номер воркера для апдейта
+        """
+        return extract_chat_id(update) % len(self.queues)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        index = self.route(update)
+        if self.workers is not None and not self.workers[index].is_alive():
+            logger.error(f"Воркер {index} не работает, апдейт {update.get('update_id')} отклонён")
+            return web.Response(status=503)
+
+        try:
+            self.queues[index].put_nowait(update)
+        except queue_module.Full:
+            logger.warning(f"Очередь воркера {index} переполнена")
+            return web.Response(status=503)
+
+        return web.Response()
+
+
+def make_app(router: UpdateRouter, path: str) -> web.Application:
+    """
+    Создаёт aiohttp-приложение приёма webhook.
+    """
+    app = web.Application()
+    app.router.add_post(path, router.handle)
+    return app
+
+
+async def consume_updates(
+    updates_queue,
+    feed: Callable[[dict[str, Any]], Awaitable[Any]],
+    poll_interval: float = 1.0) -> None:
+    """
+    Читает апдейты из очереди воркера и обрабатывает их задачами.
+    Завершается, получив None, после обработки уже принятых апдейтов.
+
+    Args:
+        updates_queue: Очередь воркера (multiprocessing.Queue)
+        feed (Callable): Обработчик сырого апдейта (Dispatcher.feed_raw_update)
+        poll_interval (float): Период ожидания очереди в потоке (сек.)
+    """
+    loop = asyncio.get_running_loop()
+    pending: set[asyncio.Task] = set()
+
+    def _get():
+        try:
+            return updates_queue.get(timeout=poll_interval)
+        except queue_module.Empty:
+            return _EMPTY
+
+    while True:
+        update = await loop.run_in_executor(None, _get)
+        if update is _EMPTY:
+            continue
+        if update is None:
+            break
+
+        task = asyncio.create_task(feed(update))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)